@@ -0,0 +1,7 @@
+'''
+Shared helpers for the course scripts working with the NHANES 2015-2016 data.
+
+The week scripts add the course directory to sys.path and import the modules they need, e.g.
+
+    from nhanes.subsampling import mean_difference
+'''
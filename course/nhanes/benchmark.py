@@ -0,0 +1,420 @@
+'''
+Benchmarks of the hot paths of the course scripts.
+
+Each case is a real workload from one of the scripts: loading the CSV, the FinalSamlingDistributions.py
+mean-difference and correlation subsampling at m=100 and m=400, the 5000-sample loop of
+SamplingFromBiasedPopulation.py, the ECDF of EmpiricalDistribution.py and the crosstab/proportion tables of
+AnalysisOfMultivariateData.py. Every case runs at one or more scale factors: the NHANES rows (or, for the
+simulated cases, the population and observation counts) are replicated 10x/100x/1000x. Setup happens outside the
+timed region.
+
+Every case also has a baseline: the original code of the script (the da.sample loops, np.random.choice loops,
+statsmodels ECDF, groupby/unstack/apply chains) run on the same inputs, as the scripts read them with
+pd.read_csv. The report shows the speedup of the case over its baseline, and a case slower than its baseline
+counts as a regression. Baselines are slow at large scales, so they are timed `baseline_repeat` times (default
+once) and can be skipped with --no-baseline.
+
+For each case and scale the harness records the best and median wall time over `repeat` runs and the peak
+traced allocation of one extra run under tracemalloc (numpy and pandas buffers are included). A run is appended
+as one JSON line to .benchmarks/history.jsonl, together with the git commit and library versions, and is compared
+with the previous record of the same case and scale so regressions show up in the report.
+
+    python -m nhanes.benchmark                          # from the course directory, every case at scale 1
+    python -m nhanes.benchmark -s 1 10 100 -k subsampling
+    python -m nhanes.benchmark --list
+'''
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from nhanes.loader import COURSE_DIR, DATA_PATH, load
+from nhanes.mixture import Component, MixturePopulation
+from nhanes.simulate import StdlibCompat
+from nhanes.sketch import QuantileSketch
+from nhanes.stratified import proportions, table
+from nhanes.subsampling import correlation_difference, mean_difference
+
+try:
+    from statsmodels.distributions.empirical_distribution import ECDF
+except ImportError:  # the ECDF baseline is skipped without statsmodels
+    ECDF = None
+
+BENCH_DIR = os.path.join(COURSE_DIR, ".benchmarks")
+HISTORY_PATH = os.path.join(BENCH_DIR, "history.jsonl")
+
+# A case is slower than its previous record when its best time grew by more than this factor
+REGRESSION = 1.2
+
+Case = namedtuple("Case", ["name", "setup", "baseline"])
+Timing = namedtuple("Timing", ["case", "scale", "best", "median", "repeat", "peak_bytes", "baseline"])
+
+CASES = {}
+
+
+def case(name, baseline=None):
+    '''
+    Register a benchmark case.
+
+    The decorated function receives the Workload of one scale factor, does all the setup and returns a
+    zero-argument callable: only that callable is timed. `baseline` is a setup function of the same form for
+    the original script code; it may return None when the original cannot run here.
+    '''
+    def register(setup):
+        CASES[name] = Case(name, setup, baseline)
+        return setup
+    return register
+
+
+class Workload:
+    '''Inputs of the cases at one scale factor, built on first use and shared by every case.'''
+
+    def __init__(self, scale, path=DATA_PATH, workdir=BENCH_DIR):
+        self.scale = scale
+        self.path = path
+        self.workdir = workdir
+
+    @cached_property
+    def frame(self):
+        '''The dataset with its rows replicated `scale` times.'''
+        da = load(path=self.path)
+        if self.scale == 1:
+            return da
+        return da.iloc[np.tile(np.arange(len(da)), self.scale)].reset_index(drop=True)
+
+    @cached_property
+    def raw(self):
+        '''The scaled dataset as the original scripts read it, with pd.read_csv.'''
+        return pd.read_csv(self.csv)
+
+    @cached_property
+    def csv(self):
+        '''Path of a CSV holding the scaled dataset (the original file at scale 1), written once and reused.'''
+        if self.scale == 1:
+            return self.path
+        target = os.path.join(self.workdir, "data", "nhanes-x%d.csv" % self.scale)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            raw = pd.read_csv(self.path)
+            scaled = raw.iloc[np.tile(np.arange(len(raw)), self.scale)]
+            tmp = target + ".tmp"
+            scaled.to_csv(tmp, index=False)
+            os.replace(tmp, target)
+        return target
+
+    def column(self, name):
+        return np.asarray(self.frame[name], dtype=np.float64)
+
+
+def _read_csv(w):
+    path = w.csv
+    return lambda: pd.read_csv(path)
+
+
+@case("load.cached", baseline=_read_csv)
+def _load_cached(w):
+    path = w.csv
+    load(path=path)  # builds the columnar cache outside the timed region
+    return lambda: load(path=path, mmap=False)
+
+
+def _mean_difference(m):
+    def setup(w):
+        sbp = w.column("BPXSY1")
+        return lambda: mean_difference(sbp, m, replicates=1000, seed=0)
+    return setup
+
+
+def _mean_difference_loop(m):
+    def setup(w):
+        da = w.raw
+
+        def run():
+            sbp_diff = []
+            for i in range(1000):
+                dx = da.sample(2 * m)
+                dx1 = dx.iloc[0:m, :]
+                dx2 = dx.iloc[m:, :]
+                sbp_diff.append(dx1.BPXSY1.mean() - dx2.BPXSY1.mean())
+            return sbp_diff
+        return run
+    return setup
+
+
+def _correlation_difference(m):
+    def setup(w):
+        sbp, dbp = w.column("BPXSY1"), w.column("BPXDI1")
+        return lambda: correlation_difference(sbp, dbp, m, replicates=1000, seed=0)
+    return setup
+
+
+def _correlation_difference_loop(m):
+    def setup(w):
+        da = w.raw
+
+        def run():
+            sbp_diff = []
+            for i in range(1000):
+                dx = da.sample(2 * m)
+                dx1 = dx.iloc[0:m, :]
+                dx2 = dx.iloc[m:, :]
+                r1 = np.corrcoef(dx1.loc[:, ["BPXSY1", "BPXDI1"]].dropna().T)
+                r2 = np.corrcoef(dx2.loc[:, ["BPXSY1", "BPXDI1"]].dropna().T)
+                sbp_diff.append(r1 - r2)
+            return sbp_diff
+        return run
+    return setup
+
+
+for _m in (100, 400):
+    case("subsampling.mean_difference.m%d" % _m, _mean_difference_loop(_m))(_mean_difference(_m))
+    case("subsampling.correlation_difference.m%d" % _m, _correlation_difference_loop(_m))(
+        _correlation_difference(_m))
+
+
+def _population(w):
+    return MixturePopulation([Component("UofM", 0.7, "normal", (155, 5)),
+                              Component("Gym", 0.3, "normal", (185, 5))], 40000 * w.scale, seed=0)
+
+
+def _biased_population_loop(w):
+    population = _population(w).materialize()
+
+    def run():
+        mean_distribution = np.empty(5000)
+        for i in range(5000):
+            random_students = np.random.choice(population, 50)
+            mean_distribution[i] = np.mean(random_students)
+        return mean_distribution
+    return run
+
+
+@case("biased_population.sample_means", baseline=_biased_population_loop)
+def _biased_population(w):
+    students = _population(w)
+    return lambda: students.sample_means(50, 5000, rng=0)
+
+
+def _observations(w):
+    return StdlibCompat(1738).normalvariate(7, 1.7, 100000 * w.scale)
+
+
+def _ecdf_statsmodels(w):
+    if ECDF is None:
+        return None
+    observations = _observations(w).tolist()  # the script keeps its observations in a list
+    return lambda: (ECDF(observations), pd.Series(observations).describe())
+
+
+@case("ecdf.sketch", baseline=_ecdf_statsmodels)
+def _ecdf(w):
+    observations = _observations(w)
+    return lambda: QuantileSketch(seed=0).update(observations).describe()
+
+
+def _tables_frame(w):
+    da = w.frame
+    return da.loc[(da.DMDEDUC2 != "Don't know") & (da.DMDMARTL != "Refused"), :]
+
+
+def _raw_tables_frame(w):
+    '''The labelled and filtered frame of AnalysisOfMultivariateData.py, built the way the script builds it.'''
+    da = w.raw.copy()
+    da["RIAGENDRx"] = da.RIAGENDR.replace({1: "Male", 2: "Female"})
+    da["DMDEDUC2x"] = da.DMDEDUC2.replace({1: "<9", 2: "9-11", 3: "HS/GED", 4: "Some college/AA", 5: "College",
+                                           7: "Refused", 9: "Don't know"})
+    da["DMDMARTLx"] = da.DMDMARTL.replace({1: "Married", 2: "Widowed", 3: "Divorced", 4: "Separated",
+                                           5: "Never married", 6: "Living w/partner", 77: "Refused"})
+    return da.loc[(da.DMDEDUC2x != "Don't know") & (da.DMDMARTLx != "Refused"), :]
+
+
+def _crosstab_pandas(w):
+    db = _raw_tables_frame(w)
+    return lambda: pd.crosstab(db.DMDEDUC2x, db.DMDMARTLx)
+
+
+@case("tables.crosstab", baseline=_crosstab_pandas)
+def _crosstab(w):
+    db = _tables_frame(w)
+    return lambda: table(db, "DMDEDUC2", "DMDMARTL").counts
+
+
+def _proportions_groupby(w):
+    db = _raw_tables_frame(w)
+
+    def run():
+        out = []
+        for lo, hi in (40, 50), (50, 60):
+            dx = db.loc[(db.RIDAGEYR >= lo) & (db.RIDAGEYR < hi)]
+            out.append(dx.groupby(["RIAGENDRx", "DMDEDUC2x", "DMDMARTLx"]).size().unstack().fillna(0)
+                       .apply(lambda x: x / x.sum(), axis=1))
+        return out
+    return run
+
+
+@case("tables.proportions", baseline=_proportions_groupby)
+def _proportions(w):
+    db = _tables_frame(w)
+    return lambda: proportions(db, ["RIAGENDR", "DMDEDUC2"], "DMDMARTL", bins={"RIDAGEYR": [40, 50, 60]})
+
+
+def _times(fn, repeat, warm_up=True):
+    if warm_up:
+        fn()  # first-touch page faults, lazy imports and caches
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def measure(name, workload, repeat=5, baseline_repeat=1):
+    '''
+    Time one case at the workload's scale and trace its peak allocation; returns a Timing.
+
+    Timing.baseline is the best time of the original code over `baseline_repeat` runs, None when the case has
+    no runnable baseline or baseline_repeat is 0.
+    '''
+    c = CASES[name]
+    original_best = None
+    if c.baseline is not None and baseline_repeat:
+        original = c.baseline(workload)
+        if original is not None:
+            # The original loops run long enough that a warm-up run would only double their cost
+            original_best = min(_times(original, baseline_repeat, warm_up=False))
+            del original
+
+    fn = c.setup(workload)
+    times = _times(fn, repeat)
+
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    if not tracing:
+        tracemalloc.stop()
+
+    return Timing(name, workload.scale, min(times), float(np.median(times)), repeat, peak, original_best)
+
+
+def select(patterns=None):
+    '''Names of the registered cases matching any of the glob or substring `patterns` (all when empty).'''
+    if not patterns:
+        return list(CASES)
+    return [n for n in CASES if any(p in n or fnmatch.fnmatch(n, p) for p in patterns)]
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=COURSE_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "pandas": pd.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def read_history(path=HISTORY_PATH):
+    '''All recorded runs, oldest first.'''
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous(history):
+    '''{(case, scale): timing record} of the latest record of every case and scale in `history`.'''
+    last = {}
+    for run in history:
+        for t in run["results"]:
+            last[(t["case"], t["scale"])] = t
+    return last
+
+
+def speedup(t):
+    '''Baseline time over case time; None without a baseline.'''
+    return t.baseline / t.best if t.baseline else None
+
+
+def regressions(results, last):
+    '''
+    Timings in `results` slower than their previous record in `last` (see previous()) by more than REGRESSION,
+    or slower than their baseline.
+    '''
+    return [t for t in results
+            if ((t.case, t.scale) in last and t.best > REGRESSION * last[(t.case, t.scale)]["best"])
+            or (t.baseline is not None and t.best > t.baseline)]
+
+
+def run(names=None, scales=(1,), repeat=5, history_path=HISTORY_PATH, save=True, report=print, baseline_repeat=1):
+    '''Run the cases in `names` (all by default) at every scale, append the run to the history, return Timings.'''
+    names = names or list(CASES)
+    last = previous(read_history(history_path))
+    results = []
+    for scale in scales:
+        workload = Workload(scale)
+        for name in names:
+            t = measure(name, workload, repeat, baseline_repeat)
+            results.append(t)
+            if report:
+                old = last.get((name, scale))
+                change = ""
+                if old:
+                    ratio = t.best / old["best"]
+                    change = "%+6.1f%%%s" % (100 * (ratio - 1), "  REGRESSION" if ratio > REGRESSION else "")
+                if t.baseline is not None and t.best > t.baseline:
+                    change += "  SLOWER THAN BASELINE"
+                base = "%10.4fs %8.1fx" % (t.baseline, speedup(t)) if t.baseline is not None else "%21s" % "-"
+                report("%-42s x%-5d %10.4fs %10.4fs %9.1f MiB %s  %s"
+                       % (name, scale, t.best, t.median, t.peak_bytes / 2 ** 20, base, change))
+    if save:
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        with open(history_path, "a") as f:
+            f.write(json.dumps({"env": environment(), "results": [t._asdict() for t in results]}) + "\n")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the course scripts.")
+    parser.add_argument("-k", "--cases", nargs="*", help="case names, substrings or glob patterns")
+    parser.add_argument("-s", "--scale", nargs="*", type=int, default=[1], help="row replication factors")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--baseline-repeat", type=int, default=1, help="timed runs of the original code per case")
+    parser.add_argument("--no-baseline", action="store_true", help="do not run the original code")
+    parser.add_argument("--history", default=HISTORY_PATH, help="JSON lines history file")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    names = select(args.cases)
+    if args.list:
+        print("\n".join(names))
+        return 0
+    if not names:
+        parser.error("no case matches %s" % " ".join(args.cases))
+    last = previous(read_history(args.history))
+    print("%-42s %-6s %11s %11s %13s %11s %9s" % ("case", "scale", "best", "median", "peak", "baseline", "speedup"))
+    results = run(names, args.scale, args.repeat, args.history, not args.no_save,
+                  baseline_repeat=0 if args.no_baseline else args.baseline_repeat)
+    return 1 if regressions(results, last) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+'''
+Bootstrap and subsampling distributions of arbitrary statistics, spread over a process pool.
+
+Replicates are cut into fixed-size tasks and each task gets its own child of a numpy SeedSequence, so the
+replicate values depend only on the seed and never on how many workers ran them: a 1-worker run and an
+N-worker run return bit-identical arrays.
+
+The statistic has to be picklable (a module level function such as np.nanmean) when workers > 1. It receives one
+resample at a time as an array of shape (size,) for a single column or (size, columns) otherwise. With
+vectorized=True it instead receives a whole batch of shape (replicates, size[, columns]) and must reduce along
+axis 1, returning one value per replicate.
+'''
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import norm
+
+from nhanes.subsampling import BLOCK_ELEMENTS, _blocks, _per_replicate, subsample_indices
+from nhanes.trace import traced
+
+# Number of replicates per task; fixed so that the seed of every replicate does not depend on the worker count
+TASK_REPLICATES = 250
+
+ResampleResult = namedtuple("ResampleResult", ["estimate", "replicates", "percentile_ci", "bca_ci"])
+
+_worker_data = None
+_worker_statistic = None
+_worker_vectorized = False
+
+
+def _as_matrix(data, columns=None):
+    if columns is not None:
+        data = data[list(columns)]
+    x = np.asarray(data, dtype=np.float64)
+    if x.ndim == 2 and x.shape[1] == 1:
+        x = x[:, 0]
+    return x
+
+
+def _init_worker(data, statistic, vectorized):
+    global _worker_data, _worker_statistic, _worker_vectorized
+    _worker_data = data
+    _worker_statistic = statistic
+    _worker_vectorized = vectorized
+
+
+def _replicates(data, statistic, vectorized, task):
+    '''Values of the statistic for the resamples of one task, gathered a block of resamples at a time.'''
+    seed_seq, count, size, replace = task
+    rng = np.random.default_rng(seed_seq)
+    n = data.shape[0]
+    width = max(size * int(np.prod(data.shape[1:])), _per_replicate(n, size, replace))
+    out = np.empty(count)
+    for start, stop in _blocks(count, width):
+        if replace:
+            idx = rng.integers(0, n, size=(stop - start, size))
+        else:
+            idx = subsample_indices(n, size, stop - start, rng)
+        samples = data[idx]
+        if vectorized:
+            out[start:stop] = np.asarray(statistic(samples), dtype=np.float64)
+        else:
+            out[start:stop] = [statistic(s) for s in samples]
+    return out
+
+
+def _run_task(task):
+    return _replicates(_worker_data, _worker_statistic, _worker_vectorized, task)
+
+
+def _jackknife(x, statistic, vectorized):
+    '''Leave-one-out values of the statistic, used for the BCa acceleration.'''
+    n = x.shape[0]
+    if not vectorized:
+        keep = np.ones(n, dtype=bool)
+        out = np.empty(n)
+        for i in range(n):
+            keep[i] = False
+            out[i] = statistic(x[keep])
+            keep[i] = True
+        return out
+    base = np.arange(n - 1)[None, :]
+    block = max(1, BLOCK_ELEMENTS // n)
+    out = np.empty(n)
+    for start in range(0, n, block):
+        left = np.arange(start, min(start + block, n))[:, None]
+        out[start:start + left.shape[0]] = statistic(x[base + (base >= left)])
+    return out
+
+
+def percentile_interval(replicates, alpha=0.05):
+    '''Percentile confidence interval of level 1 - alpha from the replicate values.'''
+    reps = replicates[~np.isnan(replicates)]
+    return tuple(float(v) for v in np.percentile(reps, [100 * alpha / 2, 100 * (1 - alpha / 2)]))
+
+
+def bca_interval(replicates, estimate, jackknife, alpha=0.05):
+    '''Bias-corrected and accelerated (BCa) confidence interval of level 1 - alpha.'''
+    reps = replicates[~np.isnan(replicates)]
+    z0 = norm.ppf(np.mean(reps < estimate) + 0.5 * np.mean(reps == estimate))
+    d = np.nanmean(jackknife) - jackknife
+    a = np.nansum(d ** 3) / (6 * np.nansum(d ** 2) ** 1.5)
+    z = norm.ppf([alpha / 2, 1 - alpha / 2])
+    levels = norm.cdf(z0 + (z0 + z) / (1 - a * (z0 + z)))
+    return tuple(float(v) for v in np.percentile(reps, 100 * levels))
+
+
+@traced("resample")
+def resample(data, statistic, columns=None, replicates=1000, size=None, replace=True, seed=None, workers=1,
+             vectorized=False, alpha=0.05):
+    '''
+    Sampling distribution of `statistic` over resamples of the rows of `data`.
+
+    replace=True gives the bootstrap (resamples of size n with replacement, unless `size` is given);
+    replace=False gives subsamples of `size` distinct rows, as da.sample(size) does. `workers=None` uses every
+    core. The BCa interval is only computed for the bootstrap and is None for subsamples.
+    '''
+    x = _as_matrix(data, columns)
+    n = x.shape[0]
+    if size is None:
+        size = n
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    counts = [min(TASK_REPLICATES, replicates - s) for s in range(0, replicates, TASK_REPLICATES)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    tasks = [(s, c, size, replace) for s, c in zip(seeds, counts)]
+
+    if workers == 1 or len(tasks) == 1:
+        # In process the data is passed along, so no module global keeps a reference to it after the call
+        parts = [_replicates(x, statistic, vectorized, t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(x, statistic, vectorized)) as pool:
+            parts = list(pool.map(_run_task, tasks))
+    reps = np.concatenate(parts)
+
+    estimate = float(statistic(x[None, ...])[0]) if vectorized else float(statistic(x))
+    pct = percentile_interval(reps, alpha)
+    bca = None
+    if replace and size == n:
+        bca = bca_interval(reps, estimate, _jackknife(x, statistic, vectorized), alpha)
+    return ResampleResult(estimate, reps, pct, bca)
+
+
+def bootstrap(data, statistic, columns=None, replicates=1000, **kwargs):
+    '''Bootstrap distribution of `statistic`; see resample().'''
+    return resample(data, statistic, columns, replicates, replace=True, **kwargs)
+
+
+def subsample(data, statistic, size, columns=None, replicates=1000, **kwargs):
+    '''Distribution of `statistic` over subsamples of `size` distinct rows; see resample().'''
+    return resample(data, statistic, columns, replicates, size=size, replace=False, **kwargs)
@@ -0,0 +1,78 @@
+'''
+The single authoritative label mapping for the coded NHANES variables.
+
+Earlier versions of the scripts each relabelled DMDMARTL, DMDEDUC2 and RIAGENDR with their own Series.replace
+dicts, and the two files disagreed (one called code 1 of DMDMARTL "Unmarried", the other "Married"). The labels
+below follow the NHANES 2015-2016 codebook. Recoding goes through an integer lookup table indexed by the raw code,
+so turning a code column into a categorical is a single O(n) gather; the loader does it once when it builds the
+cache, so the frames it returns are already labelled.
+'''
+import numpy as np
+import pandas as pd
+
+from nhanes.trace import traced
+
+YES_NO = {1: "Yes", 2: "No", 7: "Refused", 9: "Don't know"}
+
+CODEBOOK = {
+    "ALQ101": YES_NO,
+    "ALQ110": YES_NO,
+    "SMQ020": YES_NO,
+    "RIAGENDR": {1: "Male", 2: "Female"},
+    "RIDRETH1": {1: "Mexican American", 2: "Other Hispanic", 3: "Non-Hispanic White", 4: "Non-Hispanic Black",
+                 5: "Other/Multi-racial"},
+    "DMDCITZN": {1: "Citizen", 2: "Not a citizen", 7: "Refused", 9: "Don't know"},
+    "DMDEDUC2": {1: "<9", 2: "9-11", 3: "HS/GED", 4: "Some college/AA", 5: "College", 7: "Refused",
+                 9: "Don't know"},
+    "DMDMARTL": {1: "Married", 2: "Widowed", 3: "Divorced", 4: "Separated", 5: "Never married",
+                 6: "Living w/partner", 77: "Refused", 99: "Don't know"},
+    "HIQ210": YES_NO,
+}
+
+# Labels of the answers that are not substantive, usually excluded before tabulating
+NON_RESPONSE = ("Refused", "Don't know")
+
+_tables = {}
+
+
+def labels(variable):
+    '''The {code: label} mapping of a coded variable.'''
+    return CODEBOOK[variable]
+
+
+def categories(variable):
+    '''Category labels of a coded variable, in code order.'''
+    mapping = CODEBOOK[variable]
+    return [mapping[k] for k in sorted(mapping)]
+
+
+def lookup_table(variable):
+    '''int8 table mapping raw code -> category position (-1 for codes without a label); built once per variable.'''
+    table = _tables.get(variable)
+    if table is None:
+        codes = sorted(CODEBOOK[variable])
+        table = np.full(codes[-1] + 1, -1, dtype=np.int8)
+        table[codes] = np.arange(len(codes))
+        _tables[variable] = table
+    return table
+
+
+@traced("recode")
+def category_codes(values, variable):
+    '''Category positions of raw codes (NaN becomes -1); raises ValueError for codes the codebook does not know.'''
+    table = lookup_table(variable)
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    raw = np.where(missing, 0, values)
+    valid = (raw >= 0) & (raw < table.shape[0]) & (raw == np.floor(raw))
+    out = np.full(values.shape, -1, dtype=np.int8)
+    out[valid] = table[raw[valid].astype(np.intp)]
+    unknown = ~missing & (out == -1)
+    if unknown.any():
+        raise ValueError("%s codes %s have no label" % (variable, sorted(set(values[unknown].tolist()))))
+    return out
+
+
+def recode(values, variable):
+    '''Raw codes of `variable` as a labelled pd.Categorical.'''
+    return pd.Categorical.from_codes(category_codes(values, variable), categories=categories(variable))
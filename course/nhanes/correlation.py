@@ -0,0 +1,136 @@
+'''
+Precomputed pairwise correlation/covariance store over all numeric NHANES columns.
+
+Instead of running .dropna().corr() on a few columns every time, the co-moments of every pair of numeric columns
+are computed once (pairwise-complete, like DataFrame.corr(), with the blocked masked matrix products of
+nhanes.online.CoMoments) for the whole sample and, optionally, for every level of a stratifying column. Any
+sub-matrix, or any stratum's matrix, is then a lookup:
+
+    store = correlation_store(by="RIAGENDR")
+    store.corr(["BMXLEG", "BMXARML"], stratum="Female")
+    store.corr(["BPXSY1", "BPXSY2", "BPXDI1", "BPXDI2"])
+
+correlation_store() keeps the result next to the loader's column cache (so it is invalidated together with it)
+and in memory for the rest of the process.
+
+For two columns pairwise and listwise deletion coincide; for more columns each entry uses every row where that
+pair is observed, whereas .dropna().corr() drops rows missing any of the columns.
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+from nhanes.loader import DATA_PATH, build_cache, load
+from nhanes.online import CoMoments
+from nhanes.stratified import codes
+from nhanes.trace import traced
+
+# Identifier columns that are numeric but meaningless to correlate
+ID_COLUMNS = ("SEQN",)
+
+# Rows per block when accumulating the co-moments
+BLOCK_ROWS = 1 << 16
+
+ALL = "All"
+
+_stores = {}
+
+
+def numeric_columns(frame):
+    '''Numeric (float, int or nullable int) columns of `frame`, excluding identifiers.'''
+    return [c for c in frame.columns
+            if c not in ID_COLUMNS and pd.api.types.is_numeric_dtype(frame[c].dtype)
+            and not isinstance(frame[c].dtype, pd.CategoricalDtype)]
+
+
+def _comoments(frame, columns):
+    acc = CoMoments(columns)
+    for start in range(0, len(frame), BLOCK_ROWS):
+        acc.update(frame.iloc[start:start + BLOCK_ROWS])
+    return acc
+
+
+class CorrelationStore:
+    '''Co-moments of every pair of columns, overall and per stratum, answering correlation queries by lookup.'''
+
+    def __init__(self, columns, strata):
+        self.columns = list(columns)
+        self.position = {c: i for i, c in enumerate(self.columns)}
+        self.strata = strata  # {stratum label: CoMoments}
+
+    def _get(self, stratum):
+        try:
+            return self.strata[stratum]
+        except KeyError:
+            raise KeyError("no stratum %r; available: %s" % (stratum, ", ".join(map(str, self.strata))))
+
+    def _select(self, frame, columns):
+        if columns is None:
+            return frame
+        if isinstance(columns, str):
+            columns = [columns]
+        return frame.loc[list(columns), list(columns)]
+
+    def corr(self, columns=None, stratum=ALL):
+        '''Pairwise-complete correlation matrix of `columns` (all columns by default) in one stratum.'''
+        return self._select(self._get(stratum).corr(), columns)
+
+    def cov(self, columns=None, stratum=ALL, ddof=1):
+        '''Pairwise-complete covariance matrix of `columns` in one stratum.'''
+        return self._select(self._get(stratum).cov(ddof), columns)
+
+    def count(self, columns=None, stratum=ALL):
+        '''Number of complete pairs behind every entry.'''
+        acc = self._get(stratum)
+        n = pd.DataFrame(acc.n.astype(np.int64), index=self.columns, columns=self.columns)
+        return self._select(n, columns)
+
+    def save(self, path):
+        arrays = {"columns": np.array(self.columns), "strata": np.array([str(s) for s in self.strata])}
+        for i, acc in enumerate(self.strata.values()):
+            for name in ("n", "mean_x", "m2_x", "c"):
+                arrays["%s_%d" % (name, i)] = getattr(acc, name)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = [str(c) for c in data["columns"]]
+            strata = {}
+            for i, label in enumerate(data["strata"]):
+                acc = CoMoments(columns)
+                for name in ("n", "mean_x", "m2_x", "c"):
+                    setattr(acc, name, data["%s_%d" % (name, i)])
+                strata[str(label)] = acc
+        return cls(columns, strata)
+
+
+@traced("correlation")
+def build(frame, columns=None, by=None):
+    '''Compute a CorrelationStore for `frame`: the whole sample, plus every level of `by` if given.'''
+    if columns is None:
+        columns = numeric_columns(frame)
+    strata = {ALL: _comoments(frame, columns)}
+    if by is not None:
+        code, labels = codes(frame[by])
+        order = np.argsort(code, kind="stable")
+        bounds = np.searchsorted(code[order], np.arange(len(labels) + 1))
+        for j, label in enumerate(labels):
+            rows = order[bounds[j]:bounds[j + 1]]
+            strata[str(label)] = _comoments(frame.iloc[rows], columns)
+    return CorrelationStore(columns, strata)
+
+
+def correlation_store(by=None, path=DATA_PATH):
+    '''The CorrelationStore of the cached dataset at `path`, computed once and kept alongside the column cache.'''
+    target = build_cache(path)
+    key = (target, by)
+    if key not in _stores:
+        fname = os.path.join(target, "corr-%s.npz" % (by or ALL))
+        if os.path.exists(fname):
+            _stores[key] = CorrelationStore.load(fname)
+        else:
+            _stores[key] = build(load(path=path), by=by)
+            _stores[key].save(fname)
+    return _stores[key]
@@ -0,0 +1,137 @@
+'''
+Per-stratum statistics cube: gender x ethnicity x education x marital status x age band.
+
+The scripts slice the data with boolean .loc filters (da.RIAGENDRx == "Female", then "Male", then every
+gender x RIDRETH1 facet, then every age band), each one a scan of the whole frame. The cube scans the rows once
+and keeps, for every cell of the cross-classification, the state of an nhanes.online.CoMoments over the chosen
+numeric columns: pairwise counts, means, and sums of squared deviations and cross-products about the cell's own
+means. Any slice or roll-up merges cells with the CoMoments Chan update, O(cells) however many rows there are:
+
+    cube = build(da, ["BMXLEG", "BMXARML"])
+    cube.slice(RIAGENDR="Female").corr()
+    cube.slice(RIAGENDR="Male", RIDAGEYR=["[40, 50)", "[50, 60)"]).means()
+    cube.corr("BMXLEG", "BMXARML", keep=["RIAGENDR", "RIDRETH1"])     # the 2 x 5 facet correlations
+
+Rows with a missing stratum value fall in an extra "NA" level of that dimension, so roll-ups still include them;
+per-level tables leave that level out unless it is selected explicitly.
+'''
+import numpy as np
+import pandas as pd
+
+from nhanes.online import CoMoments
+from nhanes.stratified import band_codes, codes
+
+DIMENSIONS = ["RIAGENDR", "RIDRETH1", "DMDEDUC2", "DMDMARTL"]
+BANDS = {"RIDAGEYR": [18, 30, 40, 50, 60, 70, 81]}
+MISSING = "NA"
+
+
+class StatisticsCube:
+    '''Pairwise moments for every cell of the cross-classification of some dimensions.'''
+
+    def __init__(self, dims, labels, columns, stats):
+        self.dims = dims            # dimension names, in axis order
+        self.labels = labels        # {dim: [labels]}, the last one being MISSING
+        self.columns = columns
+        self.stats = stats          # shape (*cells, 4, k, k): the n, mean_x, m2_x and c of CoMoments
+
+    def _index(self, dim, selection):
+        labels = self.labels[dim]
+        if isinstance(selection, (list, tuple, np.ndarray, pd.Index)):
+            return [labels.index(s) for s in selection]
+        return [labels.index(selection)]
+
+    def _reduce(self, keep=(), **selection):
+        unknown = set(selection) | set(keep)
+        unknown -= set(self.dims)
+        if unknown:
+            raise KeyError("unknown dimensions: %s" % ", ".join(sorted(unknown)))
+        stats = self.stats
+        for axis, dim in enumerate(self.dims):
+            if dim in selection:
+                stats = np.take(stats, self._index(dim, selection[dim]), axis=axis)
+        axes = tuple(a for a, d in enumerate(self.dims) if d not in keep)
+        return np.stack(CoMoments.combine(*np.moveaxis(stats, -3, 0), axis=axes), axis=-3)
+
+    def _moments(self, state):
+        return CoMoments.from_state(self.columns, *state)
+
+    def slice(self, **selection):
+        '''CoMoments of the rows in the selected levels (a label or a list of labels per dimension), rolled up.'''
+        return self._moments(self._reduce(**selection))
+
+    def _by(self, keep, selection, value):
+        keep = [d for d in self.dims if d in keep]
+        for dim in keep:
+            # Kept dimensions list their real levels only, unless the missing level is asked for explicitly
+            selection.setdefault(dim, self.labels[dim][:-1])
+        stats = self._reduce(keep, **selection)
+        levels = [[self.labels[dim][i] for i in self._index(dim, selection[dim])] for dim in keep]
+        flat = stats.reshape((-1,) + stats.shape[len(keep):])
+        values = [value(self._moments(cell)) for cell in flat]
+        if len(keep) > 1:
+            index = pd.MultiIndex.from_product(levels, names=keep)
+        else:
+            index = pd.Index(levels[0], name=keep[0])
+        if isinstance(values[0], pd.Series):
+            return pd.DataFrame(values, index=index)
+        return pd.Series(values, index=index)
+
+    def mean(self, keep, **selection):
+        '''Means of every column in each combination of the `keep` dimensions.'''
+        return self._by(keep, selection, CoMoments.means)
+
+    def count(self, keep, **selection):
+        '''Non-missing counts of every column in each combination of the `keep` dimensions.'''
+        return self._by(keep, selection, CoMoments.count)
+
+    def corr(self, x, y, keep, **selection):
+        '''Correlation of columns x and y in each combination of the `keep` dimensions.'''
+        return self._by(keep, selection, lambda m: m.corr().loc[x, y])
+
+
+def build(frame, columns, dims=DIMENSIONS, bands=BANDS):
+    '''Scan `frame` once and build the cube of `columns` over the categorical `dims` and the banded `bands`.'''
+    names = []
+    cell_codes = []
+    labels = {}
+    for dim in dims:
+        code, lab = codes(frame[dim])
+        names.append(dim)
+        cell_codes.append(code)
+        labels[dim] = [str(v) for v in lab] + [MISSING]
+    for dim, edges in bands.items():
+        code, lab = band_codes(frame[dim], edges)
+        names.append(dim)
+        cell_codes.append(code)
+        labels[dim] = lab + [MISSING]
+
+    shape = tuple(len(labels[d]) for d in names)
+    cell = np.zeros(len(frame), dtype=np.int64)
+    for code, size in zip(cell_codes, shape):
+        cell = cell * size + np.where(code < 0, size - 1, code)
+    n_cells = int(np.prod(shape))
+
+    x = np.column_stack([np.asarray(frame[c], dtype=np.float64) for c in columns])
+    present = ~np.isnan(x)
+    k = len(columns)
+
+    # Two passes of bincounts per column pair, the cell means and then the deviations from them: Python loops
+    # over pairs only, never over rows
+    stats = np.zeros((n_cells, 4, k, k))
+    for i in range(k):
+        for j in range(i, k):
+            rows = np.flatnonzero(present[:, i] & present[:, j])
+            at = cell[rows]
+            n = np.bincount(at, minlength=n_cells).astype(np.float64)
+            dev = []
+            for a, b in [(i, j), (j, i)]:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    mean = np.where(n > 0, np.bincount(at, weights=x[rows, a], minlength=n_cells) / n, 0.0)
+                stats[:, 0, a, b] = n
+                stats[:, 1, a, b] = mean
+                dev.append(x[rows, a] - mean[at])
+            for a, b, d in [(i, j, dev[0]), (j, i, dev[1])]:
+                stats[:, 2, a, b] = np.bincount(at, weights=d * d, minlength=n_cells)
+                stats[:, 3, a, b] = np.bincount(at, weights=dev[0] * dev[1], minlength=n_cells)
+    return StatisticsCube(names, labels, list(columns), stats.reshape(shape + (4, k, k)))
@@ -0,0 +1,197 @@
+'''
+Declarative derived columns, computed on first access and cached within a memory budget.
+
+The scripts derive variables by hand, e.g. da['sys1log'] = np.log(da.BPXSY1.dropna()), which copies the
+non-missing values and relies on index alignment to put the gaps back, and they recompute them in every script.
+Here a derived column is a named definition over input columns (base columns or other derived ones): a log, a
+difference, age bands or a recode. DerivedFrame evaluates a definition on first access with one vectorized
+ufunc over the whole column (NaN in, NaN out; nullable integers are read as float with NaN) and keeps the result
+in an LRU cache bounded by `budget` bytes. Aliases share the input column instead of copying it.
+
+    dv = DerivedFrame(da)
+    dv.sys1log                                   # np.log of BPXSY1, computed now and cached
+    dv.frame(["sys1log", "sys2log"]).corr()      # DataFrame of derived and/or base columns
+    da = dv.with_columns("agegrp", "RIAGENDRx")  # every base column plus the named derived ones
+
+DEFINITIONS holds the course variables; define() or the log/difference/bands/recode/alias helpers add more.
+The cache assumes the base columns are not modified afterwards; call invalidate() when they are.
+'''
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from nhanes.codebook import recode as codebook_recode
+from nhanes.trace import span
+
+# Default cache size in bytes
+BUDGET = 256 << 20
+
+Definition = namedtuple("Definition", ["name", "inputs", "func"])
+
+DEFINITIONS = {}
+
+
+def define(name, inputs, func, registry=None):
+    '''Add a derived column computed as func(*input_arrays); returns the Definition.'''
+    registry = DEFINITIONS if registry is None else registry
+    registry[name] = Definition(name, tuple(inputs), func)
+    return registry[name]
+
+
+def _numeric(values):
+    '''Float view of a column: float arrays as they are, nullable integers with NaN for the missing values.'''
+    if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+        return values
+    if isinstance(values, pd.Categorical):
+        raise TypeError("numeric transform of a categorical column")
+    return pd.array(values).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _log(x):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log(_numeric(x))
+
+
+def _difference(a, b):
+    return np.subtract(_numeric(a), _numeric(b))
+
+
+def log(name, column, registry=None):
+    '''name = natural log of column.'''
+    return define(name, [column], _log, registry)
+
+
+def difference(name, a, b, registry=None):
+    '''name = a - b.'''
+    return define(name, [a, b], _difference, registry)
+
+
+def bands(name, column, edges, right=True, registry=None):
+    '''
+    name = the band of column as a categorical; missing outside the edges.
+
+    right=True gives the bands and labels of pd.cut, (18, 30], (30, 40], ...; right=False the half-open
+    [18, 30) bands of nhanes.stratified.band_codes.
+    '''
+    edges = np.asarray(edges, dtype=np.float64)
+    fmt = "(%g, %g]" if right else "[%g, %g)"
+    labels = [fmt % (lo, hi) for lo, hi in zip(edges[:-1], edges[1:])]
+
+    def func(x):
+        x = _numeric(x)
+        code = np.searchsorted(edges, x, side="left" if right else "right") - 1
+        code[np.isnan(x) | (code < 0) | (code >= len(labels))] = -1
+        return pd.Categorical.from_codes(code.astype(np.int8 if len(labels) < 128 else np.int32), labels)
+    return define(name, [column], func, registry)
+
+
+def recode(name, column, mapping=None, registry=None):
+    '''
+    name = column with its values relabelled through `mapping` ({old: new}; several old values may share a new
+    label, unmapped ones become missing). Without a mapping, raw codes get their nhanes.codebook labels.
+
+    Categorical inputs are relabelled through their category codes, so the work is per category, not per row.
+    '''
+    if mapping is None:
+        return define(name, [column], lambda x: codebook_recode(np.asarray(x), column), registry)
+    new_labels = list(dict.fromkeys(mapping.values()))
+    position = {label: i for i, label in enumerate(new_labels)}
+
+    def func(x):
+        x = x if isinstance(x, pd.Categorical) else pd.Categorical(x)
+        table = np.array([position.get(mapping.get(c), -1) for c in x.categories] + [-1], dtype=np.int32)
+        return pd.Categorical.from_codes(table[np.asarray(x.codes)], new_labels)
+    return define(name, [column], func, registry)
+
+
+def alias(name, column, registry=None):
+    '''name = column itself, sharing its data.'''
+    return define(name, [column], None, registry)
+
+
+def _values(series):
+    return series.array if not isinstance(series.dtype, np.dtype) else series.to_numpy()
+
+
+class DerivedFrame:
+    '''
+    A DataFrame plus lazily computed, LRU-cached derived columns.
+
+    Columns are handed out as Series sharing the cached data; pandas copy-on-write copies them if they are
+    modified, so the cache never sees the change.
+    '''
+
+    def __init__(self, frame, definitions=None, budget=BUDGET):
+        self.base = frame
+        self.definitions = DEFINITIONS if definitions is None else definitions
+        self.budget = budget
+        self._cache = OrderedDict()
+        self.nbytes = 0
+
+    def __contains__(self, name):
+        return name in self.base.columns or name in self.definitions
+
+    def __getitem__(self, name):
+        if name in self.base.columns:
+            return self.base[name]
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name].copy(deep=False)
+        if name not in self.definitions:
+            raise KeyError(name)
+        d = self.definitions[name]
+        if d.func is None:
+            return self[d.inputs[0]].rename(name)
+        with span("derive", len(self.base), column=name) as s:
+            values = d.func(*[_values(self[c]) for c in d.inputs])
+            s.rows_out = len(values)
+        series = pd.Series(values, index=self.base.index, name=name, copy=False)
+        self._store(name, series)
+        return series.copy(deep=False)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or name not in self:
+            raise AttributeError(name)
+        return self[name]
+
+    def _store(self, name, series):
+        size = int(series.memory_usage(index=False, deep=False))
+        if size > self.budget:
+            return
+        self._cache[name] = series
+        self.nbytes += size
+        while self.nbytes > self.budget:
+            _, old = self._cache.popitem(last=False)
+            self.nbytes -= int(old.memory_usage(index=False, deep=False))
+
+    def frame(self, names):
+        '''DataFrame of the base and derived columns in `names`, sharing their data.'''
+        return pd.DataFrame({n: self[n] for n in names}, copy=False)
+
+    def with_columns(self, *names):
+        '''Every base column plus the derived columns in `names`.'''
+        return self.frame(list(self.base.columns) + [n for n in names if n not in self.base.columns])
+
+    def cached(self):
+        '''Names of the derived columns currently cached, least recently used first.'''
+        return list(self._cache)
+
+    def invalidate(self, name=None):
+        '''Drop `name` (default every derived column) from the cache.'''
+        names = list(self._cache) if name is None else [name]
+        for n in names:
+            if n in self._cache:
+                self.nbytes -= int(self._cache.pop(n).memory_usage(index=False, deep=False))
+
+
+for _col, _name in [("BPXSY1", "sys1log"), ("BPXSY2", "sys2log"), ("BPXDI1", "dis1log"), ("BPXDI2", "dis2log")]:
+    log(_name, _col)
+difference("bpxsy_diff", "BPXSY2", "BPXSY1")
+difference("bpxdi_diff", "BPXDI2", "BPXDI1")
+bands("agegrp", "RIDAGEYR", [18, 30, 40, 50, 60, 70, 80])
+# The loader already labels the coded variables (see nhanes.codebook); the x names of the course notebooks
+# are aliases of them
+alias("RIAGENDRx", "RIAGENDR")
+alias("DMDEDUC2x", "DMDEDUC2")
+alias("DMDMARTLx", "DMDMARTL")
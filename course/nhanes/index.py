@@ -0,0 +1,243 @@
+'''
+Row-selection indexes for repeated filters on the same loaded data.
+
+df_BMX['BMXWAIST'] > waist_median, df.RIDAGEYR > 60 or da.RIDAGEYR.isin([30, 40]) each scan the whole column and
+build a full boolean mask. A TableIndex builds, on first use of a column,
+
+* a sorted-permutation index for numeric columns: range and equality predicates become two binary searches
+  and a slice of the permutation;
+* a bitmap index for categorical columns: one packed bitmap (n / 8 bytes) per level.
+
+Predicates return RowSets (sorted row positions from the sorted index, packed bitmaps from the bitmap index),
+which combine with &, | and ~ and hand back positional row numbers for .iloc (or index labels for .loc) without
+any intermediate masked copy of the frame:
+
+    ix = TableIndex(df)
+    rows = (ix.col("BMXWAIST") > ix.col("BMXWAIST").median()) & (ix.col("BMXLEG") < 32)
+    df.iloc[rows.positions()].head()
+'''
+import numpy as np
+import pandas as pd
+
+
+class RowSet:
+    '''
+    A set of row positions: a slice of a sorted index, a sorted position array or a packed bitmap.
+
+    Predicates on the sorted index give slices, so a selective predicate costs only its matches: & tests the
+    positions of the smaller side for membership in the other (a rank comparison for a slice, a bit probe for a
+    bitmap) and never sorts or scans the larger one. Bitmap indexes give bitmaps; ~ and combinations of two
+    bitmaps work on the bits.
+    '''
+
+    def __init__(self, n, bits=None, positions=None, source=None):
+        self.n = n
+        self._bits = bits
+        self._positions = positions
+        self._source = source  # (SortedIndex, lo, hi)
+
+    @classmethod
+    def from_positions(cls, positions, n, is_sorted=False):
+        positions = np.asarray(positions, dtype=np.int64)
+        return cls(n, positions=positions if is_sorted else np.sort(positions))
+
+    @property
+    def bits(self):
+        if self._bits is None:
+            mask = np.zeros(self.n, dtype=bool)
+            mask[self.positions()] = True
+            self._bits = np.packbits(mask)
+        return self._bits
+
+    @property
+    def dense(self):
+        return self._positions is None and self._source is None
+
+    def _contains(self, positions):
+        '''Which of `positions` are in the set.'''
+        if self._source is not None:
+            index, lo, hi = self._source
+            rank = index.rank[positions]
+            return (rank >= lo) & (rank < hi)
+        if self._positions is not None:
+            if self._positions.shape[0] == 0:
+                return np.zeros(positions.shape, dtype=bool)
+            at = np.searchsorted(self._positions, positions).clip(max=self._positions.shape[0] - 1)
+            return self._positions[at] == positions
+        return (self._bits[positions >> 3] >> (7 - (positions & 7)).astype(np.uint8)) & 1 == 1
+
+    def __and__(self, other):
+        if self.dense and other.dense:
+            return RowSet(self.n, bits=self.bits & other.bits)
+        if other.dense or (not self.dense and len(self) <= len(other)):
+            small, large = self, other
+        else:
+            small, large = other, self
+        positions = small.positions()
+        return RowSet(self.n, positions=positions[large._contains(positions)])
+
+    def __or__(self, other):
+        if self.dense or other.dense:
+            return RowSet(self.n, bits=self.bits | other.bits)
+        return RowSet(self.n, positions=np.union1d(self.positions(), other.positions()))
+
+    def __invert__(self):
+        # Clear the padding bits past the last row so they never count as selected
+        return RowSet(self.n, bits=np.packbits(np.unpackbits(~self.bits, count=self.n)))
+
+    def __len__(self):
+        if self._source is not None:
+            return self._source[2] - self._source[1]
+        if self._positions is not None:
+            return int(self._positions.shape[0])
+        return int(np.unpackbits(self._bits, count=self.n).sum())
+
+    def positions(self):
+        '''Selected row positions in ascending order, for .iloc.'''
+        if self._positions is None:
+            if self._source is not None:
+                index, lo, hi = self._source
+                self._positions = np.sort(index.order[lo:hi])
+            else:
+                self._positions = np.flatnonzero(np.unpackbits(self._bits, count=self.n))
+        return self._positions
+
+    def labels(self, frame):
+        '''Index labels of the selected rows of `frame`, for .loc.'''
+        return frame.index[self.positions()]
+
+    def take(self, frame, columns=None):
+        '''The selected rows (and optionally columns) of `frame`.'''
+        rows = frame.iloc[self.positions()]
+        return rows if columns is None else rows[columns]
+
+
+class SortedIndex:
+    '''
+    Sorted-permutation index of a numeric column; missing values never match.
+
+    The values keep the column's own dtype and probe values are cast to it, so a float32 column compares with
+    98.3 exactly as the pandas comparison does (98.3 rounded to float32), not with the float64 98.3.
+    '''
+
+    def __init__(self, values):
+        values = pd.Series(values, copy=False)
+        dtype = getattr(values.dtype, "numpy_dtype", values.dtype)  # nullable integers: their numpy type
+        present = np.flatnonzero(~np.asarray(values.isna()))
+        x = values.to_numpy(dtype=dtype, na_value=0 if dtype.kind in "biu" else np.nan)
+        self.n = x.shape[0]
+        self.order = present[np.argsort(x[present], kind="stable")]
+        self.count = self.order.shape[0]
+        self.sorted = x[self.order]
+        # Position of every row in the sorted order (-1 for missing values), for membership tests
+        self.rank = np.full(self.n, -1, dtype=np.int64)
+        self.rank[self.order] = np.arange(self.count)
+
+    def _probe(self, value):
+        # Integer columns compare with float probes in float64, which holds their values exactly
+        return np.asarray(value, dtype=self.sorted.dtype if self.sorted.dtype.kind == "f" else np.float64)
+
+    def _search(self, value, side):
+        return np.searchsorted(self.sorted, self._probe(value), side=side)
+
+    def _range(self, lo, hi):
+        return RowSet(self.n, source=(self, int(lo), int(max(lo, hi))))
+
+    def __gt__(self, value):
+        return self._range(self._search(value, "right"), self.count)
+
+    def __ge__(self, value):
+        return self._range(self._search(value, "left"), self.count)
+
+    def __lt__(self, value):
+        return self._range(0, self._search(value, "left"))
+
+    def __le__(self, value):
+        return self._range(0, self._search(value, "right"))
+
+    def __eq__(self, value):
+        return self.isin([value])
+
+    def __ne__(self, value):
+        return ~(self == value) & self.notna()
+
+    def between(self, low, high, inclusive="both"):
+        '''Rows with low <= value <= high (inclusive as in pd.Series.between).'''
+        lo = self._search(low, "left" if inclusive in ("both", "left") else "right")
+        hi = self._search(high, "right" if inclusive in ("both", "right") else "left")
+        return self._range(lo, hi)
+
+    def isin(self, values):
+        values = np.unique(self._probe(values))
+        lo = np.searchsorted(self.sorted, values, side="left")
+        hi = np.searchsorted(self.sorted, values, side="right")
+        parts = [self.order[a:b] for a, b in zip(lo, hi)]
+        return RowSet.from_positions(np.concatenate(parts) if parts else [], self.n)
+
+    def notna(self):
+        return self._range(0, self.count)
+
+    def median(self):
+        '''Median of the non-missing values, read off the sorted values.'''
+        if self.count == 0:
+            return np.nan
+        mid = self.count // 2
+        if self.count % 2:
+            return float(self.sorted[mid])
+        return (float(self.sorted[mid - 1]) + float(self.sorted[mid])) / 2
+
+
+class BitmapIndex:
+    '''One packed bitmap per level of a categorical column.'''
+
+    def __init__(self, values):
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")
+        codes = np.asarray(values.cat.codes)
+        self.n = codes.shape[0]
+        self.levels = list(values.cat.categories)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(-1, len(self.levels) + 1))
+        self.bitmaps = {level: RowSet.from_positions(order[bounds[i + 1]:bounds[i + 2]], self.n).bits
+                        for i, level in enumerate(self.levels)}
+        self.missing = RowSet.from_positions(order[bounds[0]:bounds[1]], self.n).bits
+
+    def __eq__(self, level):
+        return self.isin([level])
+
+    def __ne__(self, level):
+        return ~(self == level) & self.notna()
+
+    def isin(self, levels):
+        bits = np.zeros_like(self.missing)
+        for level in levels:
+            if level in self.bitmaps:
+                bits = bits | self.bitmaps[level]
+        return RowSet(self.n, bits=bits)
+
+    def notna(self):
+        return ~RowSet(self.n, bits=self.missing)
+
+
+class TableIndex:
+    '''Indexes over the columns of a frame, built lazily on the first predicate that uses each column.'''
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.indexes = {}
+
+    def col(self, name):
+        if name not in self.indexes:
+            values = self.frame[name]
+            if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(values.dtype):
+                self.indexes[name] = BitmapIndex(values)
+            else:
+                self.indexes[name] = SortedIndex(values)
+        return self.indexes[name]
+
+    __getitem__ = col
+
+    def all(self):
+        '''Every row.'''
+        n = self.frame.shape[0]
+        return RowSet(n, positions=np.arange(n))
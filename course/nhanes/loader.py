@@ -0,0 +1,126 @@
+'''
+Cached columnar loader for nhanes_2015_2016.csv.
+
+The CSV is parsed once and written as one .npy file per column under .nhanes_cache/ next to the CSV, keyed on the
+CSV's size and modification time. Columns are stored with the compact types declared in nhanes.schema. Later
+loads memory-map the cached columns (copy-on-write, so scripts can still modify the frame they get back) and only
+open the columns that were asked for.
+
+    da = load()                       # every column
+    da = load(["BPXSY1", "BPXDI1"])   # a script that only needs blood pressure never touches the rest
+'''
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from nhanes.schema import SCHEMA, decode, encode, schema_hash
+from nhanes.trace import span, traced
+
+COURSE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(COURSE_DIR, "nhanes_2015_2016.csv")
+CACHE_DIRNAME = ".nhanes_cache"
+
+
+def cache_key(path):
+    '''Cache key for a CSV file: its size, its modification time in nanoseconds and the schema version.'''
+    st = os.stat(path)
+    return "%d-%d-%s" % (st.st_size, st.st_mtime_ns, schema_hash())
+
+
+def cache_dir(path=DATA_PATH):
+    '''Directory holding the columnar cache of the current version of `path`.'''
+    path = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(path), CACHE_DIRNAME, name, cache_key(path))
+
+
+def _parse(path):
+    return pd.read_csv(path)
+
+
+def _write_cache(frame, target):
+    '''Write the columns of `frame` to `target` atomically, so concurrent readers never see a partial cache.'''
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    os.chmod(tmp, 0o755)
+    meta = {"columns": [], "rows": len(frame)}
+    for i, col in enumerate(frame.columns):
+        parts, info = encode(frame[col], SCHEMA.get(col))
+        info["name"] = col
+        info["files"] = {}
+        for part, values in parts.items():
+            fname = "%03d.%s.npy" % (i, part)
+            np.save(os.path.join(tmp, fname), np.ascontiguousarray(values))
+            info["files"][part] = fname
+        meta["columns"].append(info)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another process finished first; its cache is equivalent
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Drop caches of older versions of the same file
+    for old in os.listdir(parent):
+        if os.path.join(parent, old) != target and not old.startswith("tmp"):
+            shutil.rmtree(os.path.join(parent, old), ignore_errors=True)
+
+
+def build_cache(path=DATA_PATH):
+    '''Parse the CSV and write its columnar cache if it is missing or stale; return the cache directory.'''
+    target = cache_dir(path)
+    if not os.path.exists(os.path.join(target, "meta.json")):
+        with span("load.parse_csv", path=os.path.basename(path)) as s:
+            frame = _parse(path)
+            s.rows_out = len(frame)
+            _write_cache(frame, target)
+    return target
+
+
+def _read_meta(target):
+    with open(os.path.join(target, "meta.json")) as f:
+        return json.load(f)
+
+
+def columns(path=DATA_PATH):
+    '''Names of the columns available in the dataset.'''
+    return [c["name"] for c in _read_meta(build_cache(path))["columns"]]
+
+
+def load_arrays(cols=None, path=DATA_PATH, mmap=True):
+    '''
+    Return {column: array} for the requested columns (all columns when `cols` is None).
+
+    Plain columns are ndarrays, coded columns pd.Categorical and counts nullable integer arrays, all built
+    directly on the cached buffers. With mmap=True those buffers are copy-on-write memory maps of the cache, so
+    nothing is read from disk until it is used.
+    '''
+    target = build_cache(path)
+    meta = _read_meta(target)
+    info = {c["name"]: c for c in meta["columns"]}
+    if cols is None:
+        cols = [c["name"] for c in meta["columns"]]
+    elif isinstance(cols, str):
+        cols = [cols]
+    missing = [c for c in cols if c not in info]
+    if missing:
+        raise KeyError("columns not in %s: %s" % (os.path.basename(path), ", ".join(missing)))
+    mode = "c" if mmap else None
+    out = {}
+    for c in cols:
+        parts = {part: np.load(os.path.join(target, fname), mmap_mode=mode)
+                 for part, fname in info[c]["files"].items()}
+        out[c] = decode(parts, info[c])
+    return out
+
+
+@traced("load")
+def load(cols=None, path=DATA_PATH, mmap=True):
+    '''Load the dataset (or only the columns in `cols`) as a DataFrame backed by the columnar cache.'''
+    return pd.DataFrame(load_arrays(cols, path, mmap), copy=False)
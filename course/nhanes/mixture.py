@@ -0,0 +1,199 @@
+'''
+Finite mixture populations whose units are generated on demand.
+
+SamplingFromBiasedPopulation.py builds its population with np.append(uofm_students, students_at_gym), which
+holds every unit in memory. A MixturePopulation only stores the component sizes and a seed. Unit i of component
+k has the value F_k^-1(u), where F_k is the component's distribution and u is output number i of a counter-based
+stream keyed by (seed, k): the SplitMix64 mix of key + (i + 1) * golden gamma. Any unit's value is computed
+directly from its number, so a sample costs the same whatever the population size, and the population never has
+to exist as one array. Whole-population summaries stream over chunks of `chunk_size` units.
+
+    pop = MixturePopulation([Component("UofM", 0.7, "normal", (155, 5)),
+                             Component("Gym", 0.3, "normal", (185, 5))], 40000)
+    pop.sample_means(50, 5000)                    # SRS from the whole population
+    pop.sample_means(3, 5000, frame=["Gym"])      # biased frame: only the gym goers can be sampled
+    pop.bias(["Gym"], 3, 5000)                    # analytic vs empirical bias of that frame
+
+Component distributions are named like the numpy Generator methods ("normal", "uniform", "lognormal", ...) and
+take the same positional parameters; QUANTILES lists the supported ones.
+'''
+import math
+from collections import namedtuple
+
+import numpy as np
+from scipy import special, stats
+
+from nhanes.sampler import sample_indices
+from nhanes.subsampling import BLOCK_ELEMENTS, as_rng
+from nhanes.trace import traced
+
+Component = namedtuple("Component", ["name", "weight", "distribution", "params"])
+Bias = namedtuple("Bias", ["analytic", "empirical", "population_mean", "frame_mean", "sample_mean"])
+
+# Expected value of each supported distribution as a function of its Generator parameters
+DISTRIBUTION_MEANS = {
+    "normal": lambda loc=0.0, scale=1.0: loc,
+    "uniform": lambda low=0.0, high=1.0: (low + high) / 2,
+    "exponential": lambda scale=1.0: scale,
+    "lognormal": lambda mean=0.0, sigma=1.0: math.exp(mean + sigma ** 2 / 2),
+    "gamma": lambda shape, scale=1.0: shape * scale,
+    "poisson": lambda lam=1.0: lam,
+    "binomial": lambda n, p: n * p,
+}
+
+# Inverse CDF of each supported distribution: uniform (0, 1) values to values of the distribution
+QUANTILES = {
+    "normal": lambda u, loc=0.0, scale=1.0: loc + scale * special.ndtri(u),
+    "uniform": lambda u, low=0.0, high=1.0: low + (high - low) * u,
+    "exponential": lambda u, scale=1.0: -scale * np.log1p(-u),
+    "lognormal": lambda u, mean=0.0, sigma=1.0: np.exp(mean + sigma * special.ndtri(u)),
+    "gamma": lambda u, shape, scale=1.0: scale * special.gammaincinv(shape, u),
+    "poisson": lambda u, lam=1.0: stats.poisson.ppf(u, lam),
+    "binomial": lambda u, n, p: stats.binom.ppf(u, n, p),
+}
+
+# SplitMix64 increment and multipliers
+_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def uniforms(key, counters):
+    '''
+    Uniform values in (0, 1), one per counter: output number `counter` of the SplitMix64 stream started at `key`.
+
+    The value depends only on the key and the counter, so any part of the stream is generated without the rest.
+    '''
+    z = (np.asarray(counters, dtype=np.uint64) + np.uint64(1)) * _GAMMA + np.uint64(key)
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    z ^= z >> np.uint64(31)
+    # Top 53 bits, centred in their interval so that 0 and 1 never occur
+    return ((z >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+
+def component_sizes(weights, size):
+    '''Split `size` units between components in proportion to `weights` (largest remainders get the leftovers).'''
+    w = np.asarray(weights, dtype=np.float64)
+    exact = size * w / w.sum()
+    counts = np.floor(exact).astype(np.int64)
+    leftover = size - counts.sum()
+    counts[np.argsort(counts - exact, kind="stable")[:leftover]] += 1
+    return counts
+
+
+class MixturePopulation:
+    '''A population of `size` units split between `components`, each unit generated from its number on demand.'''
+
+    def __init__(self, components, size, seed=None, chunk_size=1 << 20):
+        self.components = list(components)
+        unknown = [c.distribution for c in self.components if c.distribution not in QUANTILES]
+        if unknown:
+            raise ValueError("unsupported distributions: %s" % ", ".join(unknown))
+        self.names = [c.name for c in self.components]
+        self.size = int(size)
+        self.counts = component_sizes([c.weight for c in self.components], self.size)
+        # Units are numbered component after component, as in np.append(first, second)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.seed = np.random.SeedSequence(seed)
+        self.keys = [int(np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + (k,))
+                         .generate_state(1, np.uint64)[0]) for k in range(len(self.components))]
+        self.chunk_size = int(chunk_size)
+
+    def _component_ids(self, names):
+        if names is None:
+            return list(range(len(self.components)))
+        if isinstance(names, str):
+            names = [names]
+        return [self.names.index(n) for n in names]
+
+    def _values(self, k, local):
+        '''Values of the units with numbers `local` within component k.'''
+        comp = self.components[k]
+        return QUANTILES[comp.distribution](uniforms(self.keys[k], local), *comp.params)
+
+    def _chunk(self, k, c):
+        '''Values of chunk c (units c * chunk_size, ...) of component k.'''
+        start = c * self.chunk_size
+        return self._values(k, np.arange(start, min(start + self.chunk_size, int(self.counts[k]))))
+
+    def iter_chunks(self, components=None):
+        '''Yield the values of the population (or of some components) one chunk at a time.'''
+        for k in self._component_ids(components):
+            for c in range(-(-int(self.counts[k]) // self.chunk_size)):
+                yield self._chunk(k, c)
+
+    def materialize(self, components=None):
+        '''All values of the population (or of some components) as one array; only sensible for small sizes.'''
+        chunks = list(self.iter_chunks(components))
+        return np.concatenate(chunks) if chunks else np.empty(0)
+
+    def values(self, units):
+        '''Values of the units with the given global numbers (any shape); the cost depends only on their count.'''
+        units = np.asarray(units, dtype=np.int64)
+        flat = units.ravel()
+        k = np.searchsorted(self.offsets, flat, side="right") - 1
+        local = flat - self.offsets[k]
+        if len(self.components) == 1:
+            return self._values(0, local).reshape(units.shape)
+        out = np.empty(flat.shape[0])
+        for kk in np.unique(k):
+            sel = k == kk
+            out[sel] = self._values(int(kk), local[sel])
+        return out.reshape(units.shape)
+
+    def frame_units(self, positions, frame=None):
+        '''Global unit numbers of positions within a sampling frame made of some components.'''
+        ids = self._component_ids(frame)
+        sizes = self.counts[ids]
+        starts = self.offsets[ids]
+        frame_offsets = np.concatenate([[0], np.cumsum(sizes)])
+        part = np.searchsorted(frame_offsets, positions, side="right") - 1
+        return starts[part] + (positions - frame_offsets[part])
+
+    def frame_size(self, frame=None):
+        return int(self.counts[self._component_ids(frame)].sum())
+
+    def sample(self, size, samples, frame=None, replace=True, rng=None):
+        '''(samples, size) values of simple random samples drawn from the frame (default: the whole population).'''
+        pos = sample_indices(self.frame_size(frame), size, samples, replace, rng)
+        return self.values(self.frame_units(pos, frame))
+
+    @traced("resample")
+    def sample_means(self, size, samples, frame=None, replace=True, rng=None, block_size=None):
+        '''Sampling distribution of the mean for samples drawn from the frame, in memory-bounded blocks.'''
+        rng = as_rng(rng)
+        if block_size is None:
+            block_size = max(1, BLOCK_ELEMENTS // max(size, 1))
+        out = np.empty(samples)
+        for start in range(0, samples, block_size):
+            stop = min(start + block_size, samples)
+            out[start:stop] = self.sample(size, stop - start, frame, replace, rng).mean(axis=1)
+        return out
+
+    def analytic_mean(self, components=None):
+        '''Mean implied by the component distributions, weighted by the component sizes.'''
+        ids = self._component_ids(components)
+        means = [DISTRIBUTION_MEANS[self.components[k].distribution](*self.components[k].params) for k in ids]
+        return float(np.dot(self.counts[ids], means) / self.counts[ids].sum())
+
+    def mean(self, components=None):
+        '''Actual mean of the generated values, streamed chunk by chunk.'''
+        total = 0.0
+        n = 0
+        for chunk in self.iter_chunks(components):
+            total += chunk.sum()
+            n += chunk.shape[0]
+        return float(total / n)
+
+    def bias(self, frame, size, samples, replace=True, rng=None):
+        '''
+        Bias of the sample mean when only the units in `frame` can be sampled.
+
+        analytic = analytic mean of the frame - analytic mean of the population;
+        empirical = mean of the simulated sample means - actual population mean.
+        '''
+        population_mean = self.mean()
+        sample_mean = float(self.sample_means(size, samples, frame, replace, rng).mean())
+        return Bias(self.analytic_mean(frame) - self.analytic_mean(), sample_mean - population_mean,
+                    population_mean, float(self.mean(frame)), sample_mean)
@@ -0,0 +1,137 @@
+'''
+Adaptive Monte Carlo: run a simulation in batches until its target quantity is known to a given precision.
+
+The scripts run a fixed number of replicates (1000 subsample pairs, 5000 samples) whatever precision they need.
+Here the simulation is a function simulate(count, rng) returning `count` replicate values. After every batch the
+Monte Carlo standard error of the target (the mean, SD or a quantile of the replicates, or the bias of their mean
+against a known truth) is recomputed from the values so far, and sampling stops as soon as it is below
+tol + rtol * |estimate|, the tolerance of np.isclose. The mean, quantile and bias targets can be 0, where a
+relative tolerance alone is never met, so they need `tol`. The size of the next batch is projected from the current
+standard error (it falls like 1/sqrt(replicates)). The first batch is planned so most runs finish in one or two
+batches: for the SD with `rtol` from its relative error, about 1/sqrt(2 * replicates) whatever the SD; for an
+absolute `tol` from an analytic guess of the replicates' spread, such as sqrt(2 / m) for the difference of two
+correlations, which only `tol` uses.
+
+    res = run(lambda n, rng: correlation_difference(sbp, dbp, m, replicates=n, seed=rng),
+              target="sd", rtol=0.02)
+    res.estimate, res.se, res.replicates
+
+Every batch gets its own child of a SeedSequence, so a given seed reproduces the whole run.
+'''
+import warnings
+from collections import namedtuple
+
+import numpy as np
+from scipy.stats import norm
+
+from nhanes.trace import traced
+
+MonteCarloResult = namedtuple("MonteCarloResult", ["estimate", "se", "replicates", "batches", "converged",
+                                                   "values"])
+
+TARGETS = ("mean", "sd", "quantile", "bias")
+
+# Targets whose value can be 0 (locations rather than scales)
+LOCATIONS = ("mean", "quantile", "bias")
+
+
+def mean_se(values):
+    '''Mean of the replicates and its Monte Carlo standard error.'''
+    return float(np.mean(values)), float(np.std(values, ddof=1) / np.sqrt(values.shape[0]))
+
+
+def sd_se(values):
+    '''
+    Standard deviation of the replicates and its Monte Carlo standard error.
+
+    Delta method on the sample variance, var(s^2) ~ (m4 - s^4) / n, so heavy tails widen the error as they should.
+    '''
+    n = values.shape[0]
+    centred = values - values.mean()
+    var = centred @ centred / (n - 1)
+    m4 = np.mean(centred ** 4)
+    sd = np.sqrt(var)
+    return float(sd), float(np.sqrt(max(m4 - var ** 2, 0.0) / n) / (2 * sd)) if sd > 0 else 0.0
+
+
+def quantile_se(values, q):
+    '''
+    q-quantile of the replicates and its Monte Carlo standard error.
+
+    The order statistics at n q +- sqrt(n q (1 - q)) bracket the quantile with about one standard error either
+    side (binomial count of replicates below it), so half their distance estimates the error without a density.
+    '''
+    n = values.shape[0]
+    half = np.sqrt(n * q * (1 - q))
+    lo = int(np.clip(np.floor(n * q - half), 0, n - 1))
+    hi = int(np.clip(np.ceil(n * q + half), 0, n - 1))
+    part = np.partition(values, [lo, hi])
+    return float(np.quantile(values, q)), float((part[hi] - part[lo]) / 2)
+
+
+def _planned(target, tol, guess, q):
+    '''Replicates needed for standard error `tol` when the replicates are normal with standard deviation `guess`.'''
+    if target == "sd":
+        return 0.5 * (guess / tol) ** 2
+    if target == "quantile":
+        return q * (1 - q) / norm.pdf(norm.ppf(q)) ** 2 * (guess / tol) ** 2
+    return (guess / tol) ** 2
+
+
+@traced("montecarlo")
+def run(simulate, target="sd", tol=None, rtol=None, guess=None, q=0.5, truth=0.0, min_replicates=200,
+        max_replicates=1000000, seed=None):
+    '''
+    Call simulate(count, rng) in batches until the Monte Carlo standard error of `target` meets the tolerance.
+
+    target is "mean", "sd", "quantile" (the q-quantile) or "bias" (mean - truth). The error must be at most
+    tol + rtol * |estimate| (a missing tol or rtol counts as 0); the location targets mean, quantile and bias
+    need `tol`. `guess` is an analytic approximation of the standard deviation of one replicate value (e.g.
+    sqrt(2 / m)); with `tol` it sizes the first batch. The SD with `rtol` plans its first batch without a guess;
+    otherwise the first batch has `min_replicates`. Returns a MonteCarloResult; when max_replicates is reached
+    first, converged is False and a RuntimeWarning is issued.
+    '''
+    if target not in TARGETS:
+        raise ValueError("target must be one of %s" % ", ".join(TARGETS))
+    if tol is None and rtol is None:
+        raise ValueError("give tol, rtol or both")
+    if tol is None and target in LOCATIONS:
+        raise ValueError("target %r can be 0, where rtol alone is never met; give tol as well" % target)
+    seeds = np.random.SeedSequence(seed)
+
+    first = min_replicates
+    if guess is not None and tol is not None:
+        first = _planned(target, tol, guess, q)
+    elif target == "sd" and rtol is not None:
+        # The relative standard error of an SD is about 1 / sqrt(2 * replicates), whatever the SD
+        first = 0.5 / rtol ** 2
+    # Start at about half the plan, so an optimistic guess does not overshoot
+    count = int(np.clip(np.ceil(first / 2), min_replicates, max_replicates))
+
+    values = np.empty(0)
+    batches = 0
+    while True:
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+        batch = np.asarray(simulate(count, rng), dtype=np.float64).ravel()
+        values = np.concatenate([values, batch]) if batches else batch
+        batches += 1
+        if target == "sd":
+            estimate, se = sd_se(values)
+        elif target == "quantile":
+            estimate, se = quantile_se(values, q)
+        else:
+            estimate, se = mean_se(values)
+            if target == "bias":
+                estimate -= truth
+
+        limit = (tol or 0.0) + (rtol or 0.0) * abs(estimate)
+        total = values.shape[0]
+        if se <= limit:
+            return MonteCarloResult(estimate, se, total, batches, True, values)
+        if total >= max_replicates:
+            warnings.warn("Monte Carlo error %.3g still above %.3g after max_replicates=%d"
+                          % (se, limit, max_replicates), RuntimeWarning, stacklevel=3)
+            return MonteCarloResult(estimate, se, total, batches, False, values)
+        # se falls like 1/sqrt(n): project the total needed, growing by at least a quarter per batch
+        needed = total * (se / max(limit, np.finfo(np.float64).tiny)) ** 2 * 1.05
+        count = int(min(max(np.ceil(needed) - total, total // 4, 1), max_replicates - total))
@@ -0,0 +1,108 @@
+'''
+Batched multivariate normal draws over grids of covariance matrices.
+
+np.random.multivariate_normal factorizes the covariance (an SVD) on every call, so a sweep over thousands of
+correlations spends most of its time there, one matrix at a time. Here a whole stack of P covariance matrices is
+factorized at once and each factor is cached by the matrix's bytes, so repeated sweeps only factorize new
+matrices. Positive definite matrices get a Cholesky factor (one batched LAPACK call). Singular but positive
+semidefinite ones, such as rho = +-1, get an eigen factor V sqrt(w) with the null directions dropped, so their
+draws lie exactly on the lower-dimensional support instead of failing or being jittered. All draws come from one
+standard normal array of shape (P, n, d) and one batched matmul.
+
+    covs = equicorrelation(np.round(np.arange(-1, 1.001, 0.01), 2))   # 201 x 2 x 2, rho = -1, -0.99, ..., 1
+    x = multivariate_normal([15, 5], covs, 400, rng=0)                 # 201 x 400 x 2
+'''
+from collections import OrderedDict
+
+import numpy as np
+
+from nhanes.subsampling import as_rng
+
+# Eigenvalues below TOLERANCE times the largest one are treated as zero
+TOLERANCE = 1e-10
+
+# Number of factorizations kept in the cache
+CACHE_SIZE = 1 << 16
+
+_factors = OrderedDict()
+
+
+def equicorrelation(rho, d=2, sd=1.0):
+    '''
+    Covariance matrices with every correlation equal to rho: shape (d, d) for a scalar rho, (P, d, d) for P values.
+
+    They are positive semidefinite for -1/(d-1) <= rho <= 1 and singular at both ends.
+    '''
+    rho = np.asarray(rho, dtype=np.float64)
+    sd = np.broadcast_to(np.asarray(sd, dtype=np.float64), (d,))
+    corr = np.empty(rho.shape + (d, d))
+    corr[...] = rho[..., None, None]
+    idx = np.arange(d)
+    corr[..., idx, idx] = 1.0
+    return corr * np.multiply.outer(sd, sd)
+
+
+def _factorize(covs):
+    '''Factors L with L @ L.T == cov for a stack of symmetric matrices, without the cache.'''
+    w = np.linalg.eigvalsh(covs)
+    scale = np.maximum(np.abs(w).max(axis=-1), np.finfo(np.float64).tiny)
+    if np.any(w.min(axis=-1) < -TOLERANCE * scale):
+        raise ValueError("covariance matrix is not positive semidefinite")
+    singular = w.min(axis=-1) <= TOLERANCE * scale
+    out = np.empty_like(covs)
+    if (~singular).any():
+        out[~singular] = np.linalg.cholesky(covs[~singular])
+    if singular.any():
+        w, v = np.linalg.eigh(covs[singular])
+        w[w <= TOLERANCE * scale[singular, None]] = 0.0
+        out[singular] = v * np.sqrt(w)[..., None, :]
+    return out
+
+
+def factorize(covs):
+    '''Cached factors L (same shape as covs) with L @ L.T == cov, for one (d, d) matrix or a (P, d, d) stack.'''
+    covs = np.asarray(covs, dtype=np.float64)
+    single = covs.ndim == 2
+    stack = np.ascontiguousarray(covs[None] if single else covs)
+    if stack.shape[-1] != stack.shape[-2]:
+        raise ValueError("covariance matrices must be square")
+    keys = [m.tobytes() for m in stack]
+    out = np.empty_like(stack)
+    missing = []
+    for i, key in enumerate(keys):
+        hit = _factors.get((stack.shape[-1], key))
+        if hit is None:
+            missing.append(i)
+        else:
+            _factors.move_to_end((stack.shape[-1], key))
+            out[i] = hit
+    if missing:
+        new = _factorize(stack[missing])
+        out[missing] = new
+        for i, f in zip(missing, new):
+            _factors[(stack.shape[-1], keys[i])] = f
+        while len(_factors) > CACHE_SIZE:
+            _factors.popitem(last=False)
+    return out[0] if single else out
+
+
+def clear_cache():
+    _factors.clear()
+
+
+def multivariate_normal(mean, cov, n, rng=None):
+    '''
+    `n` draws from N(mean, cov) for every covariance matrix in `cov`.
+
+    A single (d, d) matrix gives an (n, d) array like np.random.multivariate_normal; a (P, d, d) stack gives
+    (P, n, d). `mean` is one (d,) vector or one per matrix, (P, d).
+    '''
+    factors = factorize(cov)
+    single = factors.ndim == 2
+    factors = factors[None] if single else factors
+    p, d = factors.shape[0], factors.shape[-1]
+    mean = np.broadcast_to(np.asarray(mean, dtype=np.float64), (p, d))
+    z = as_rng(rng).standard_normal((p, n, d))
+    x = np.matmul(z, np.swapaxes(factors, -1, -2))
+    x += mean[:, None, :]
+    return x[0] if single else x
@@ -0,0 +1,223 @@
+'''
+Mergeable streaming accumulators, for data that does not fit in one DataFrame.
+
+Every accumulator keeps only a fixed amount of state (it grows with the number of statistics, never with the
+number of rows), is fed chunk by chunk with update(), and can absorb another accumulator of the same kind with
+merge(), so partial results computed on different chunks or by different workers combine exactly:
+
+    moments = Moments(["BPXSY1", "BPXDI1"])
+    comoments = CoMoments(["BPXSY1", "BPXSY2", "BPXDI1", "BPXDI2"], listwise=True)
+    table = CountTable("DMDEDUC2", "DMDMARTL")
+    accumulate(read_chunks(chunksize=1000), moments, comoments, table)
+    comoments.corr()     # same as da[cols].dropna().corr()
+
+Means and (co)variances use Welford/Chan updates on chunk-centred data, which stay accurate for long streams.
+'''
+import numpy as np
+import pandas as pd
+
+from nhanes.codebook import CODEBOOK, recode
+from nhanes.loader import DATA_PATH
+from nhanes.stratified import table as stratified_table
+
+
+def _columns_of(chunk, columns):
+    if isinstance(chunk, pd.DataFrame):
+        return np.column_stack([np.asarray(chunk[c], dtype=np.float64) for c in columns])
+    x = np.asarray(chunk, dtype=np.float64)
+    return x[:, None] if x.ndim == 1 else x
+
+
+class Moments:
+    '''Count, mean and sum of squared deviations of each column, skipping missing values.'''
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+
+    def _combine(self, n_b, mean_b, m2_b):
+        n = self.n + n_b
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean_b - self.mean
+            self.mean = np.where(n > 0, self.mean + delta * n_b / n, 0.0)
+            self.m2 = np.where(n > 0, self.m2 + m2_b + delta ** 2 * self.n * n_b / n, 0.0)
+        self.n = n
+
+    def update(self, chunk):
+        x = _columns_of(chunk, self.columns)
+        present = ~np.isnan(x)
+        n_b = present.sum(axis=0).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.where(present, x, 0.0).sum(axis=0) / n_b
+            dev = np.where(present, x - mean_b, 0.0)
+        self._combine(n_b, np.nan_to_num(mean_b), (dev ** 2).sum(axis=0))
+        return self
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+        return self
+
+    def var(self, ddof=1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(np.where(self.n > ddof, self.m2 / (self.n - ddof), np.nan), index=self.columns)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.var(ddof))
+
+    def means(self):
+        return pd.Series(np.where(self.n > 0, self.mean, np.nan), index=self.columns)
+
+
+class CoMoments:
+    '''
+    Co-moments of every pair of columns, for covariance and correlation matrices.
+
+    By default each pair uses the rows where both of its values are present (like DataFrame.corr()); with
+    listwise=True only rows with no missing value in any of the columns are used (like .dropna().corr()).
+    Entry [i, j] of mean_x is the mean of column i over the rows used for the pair (i, j).
+    '''
+
+    def __init__(self, columns, listwise=False):
+        self.columns = list(columns)
+        self.listwise = listwise
+        k = len(self.columns)
+        self.n = np.zeros((k, k))
+        self.mean_x = np.zeros((k, k))
+        self.m2_x = np.zeros((k, k))
+        self.c = np.zeros((k, k))
+
+    @staticmethod
+    def combine(n, mean_x, m2_x, c, axis=0):
+        '''
+        Chan's merge of the states stacked along `axis` (or a tuple of axes) of n, mean_x, m2_x and c.
+
+        Deviations are taken between each state's means and the merged means, so states centred far from each
+        other lose no precision. Returns the merged (n, mean_x, m2_x, c).
+        '''
+        total = n.sum(axis=axis)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(total > 0, (n * mean_x).sum(axis=axis) / total, 0.0)
+        d = np.where(n > 0, mean_x - np.expand_dims(mean, axis), 0.0)
+        m2 = (m2_x + n * d ** 2).sum(axis=axis)
+        c = (c + n * d * np.swapaxes(d, -1, -2)).sum(axis=axis)
+        return total, mean, m2, c
+
+    @classmethod
+    def from_state(cls, columns, n, mean_x, m2_x, c, listwise=False):
+        acc = cls(columns, listwise)
+        acc.n, acc.mean_x, acc.m2_x, acc.c = n, mean_x, m2_x, c
+        return acc
+
+    def _combine(self, n_b, mean_b, m2_b, c_b):
+        self.n, self.mean_x, self.m2_x, self.c = self.combine(
+            np.stack([self.n, n_b]), np.stack([self.mean_x, mean_b]), np.stack([self.m2_x, m2_b]),
+            np.stack([self.c, c_b]))
+
+    def update(self, chunk):
+        x = _columns_of(chunk, self.columns)
+        present = ~np.isnan(x)
+        if self.listwise:
+            present &= present.all(axis=1, keepdims=True)
+        # Centre on the chunk's column means first: co-moments do not depend on the shift, and the
+        # sums of products below then suffer no cancellation
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.nan_to_num(np.where(present, x, 0.0).sum(axis=0) / present.sum(axis=0))
+        xc = np.where(present, x - shift, 0.0)
+        m = present.astype(np.float64)
+        n_b = m.T @ m
+        s = xc.T @ m  # s[i, j]: sum of column i over the rows where j is present too
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_c = np.where(n_b > 0, s / n_b, 0.0)
+            c_b = np.where(n_b > 0, xc.T @ xc - s * s.T / n_b, 0.0)
+            m2_b = np.where(n_b > 0, (xc ** 2).T @ m - s ** 2 / n_b, 0.0)
+        self._combine(n_b, np.where(n_b > 0, mean_c + shift[:, None], 0.0), m2_b, c_b)
+        return self
+
+    def merge(self, other):
+        self._combine(other.n, other.mean_x, other.m2_x, other.c)
+        return self
+
+    def count(self):
+        return pd.Series(np.diag(self.n).astype(np.int64), index=self.columns)
+
+    def means(self):
+        return pd.Series(np.where(np.diag(self.n) > 0, np.diag(self.mean_x), np.nan), index=self.columns)
+
+    def var(self, ddof=1):
+        return pd.Series(np.diag(self.cov(ddof)), index=self.columns)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.var(ddof))
+
+    def cov(self, ddof=1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = np.where(self.n > ddof, self.c / (self.n - ddof), np.nan)
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def corr(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = self.c / np.sqrt(self.m2_x * self.m2_x.T)
+        np.fill_diagonal(r, np.where(np.diag(self.n) > 1, 1.0, np.nan))
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
+
+
+class CountTable:
+    '''Counts of every (row, col) combination of two categorical columns, as in pd.crosstab.'''
+
+    def __init__(self, row, col):
+        self.row = row
+        self.col = col
+        self.counts = None
+
+    def _add(self, counts):
+        if self.counts is None:
+            self.counts = counts
+        else:
+            # Union of the labels in first-seen order, so the table keeps the codebook order of its levels
+            rows = pd.Index(list(self.counts.index) + list(counts.index)).unique()
+            cols = pd.Index(list(self.counts.columns) + list(counts.columns)).unique()
+            self.counts = (self.counts.reindex(index=rows, columns=cols, fill_value=0)
+                           + counts.reindex(index=rows, columns=cols, fill_value=0))
+
+    def update(self, chunk):
+        self._add(stratified_table(chunk, self.row, self.col).counts)
+        return self
+
+    def merge(self, other):
+        if other.counts is not None:
+            self._add(other.counts)
+        return self
+
+    def table(self):
+        return self.counts.astype(np.int64)
+
+
+def read_chunks(path=DATA_PATH, chunksize=100000, columns=None):
+    '''Read a CSV in chunks with pd.read_csv, labelling the coded variables with nhanes.codebook.'''
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=columns):
+        for col in chunk.columns.intersection(list(CODEBOOK)):
+            chunk[col] = recode(chunk[col].to_numpy(), col)
+        yield chunk
+
+
+def batches(rows, size=10000):
+    '''Group an iterator of rows (dicts or tuples with named fields) into DataFrame chunks of `size` rows.'''
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) == size:
+            yield pd.DataFrame(buf)
+            buf = []
+    if buf:
+        yield pd.DataFrame(buf)
+
+
+def accumulate(chunks, *accumulators):
+    '''Feed every chunk to every accumulator; returns the accumulators.'''
+    for chunk in chunks:
+        for acc in accumulators:
+            acc.update(chunk)
+    return accumulators
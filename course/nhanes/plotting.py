@@ -0,0 +1,231 @@
+'''
+Binned rendering for large-N scatter, KDE and joint plots.
+
+sns.jointplot(kind='kde') evaluates a kernel at every grid point for every row, and plt.scatter / sns.regplot
+draw every point. Here the data are first reduced to a fixed grid with one 2D histogram pass; densities are that
+histogram smoothed by an FFT convolution with a Gaussian kernel (Scott's rule bandwidth, as seaborn uses), so
+the cost is O(n + grid log grid) whatever the number of rows. Every figure is drawn from the binned arrays:
+density images and contours, hexbins (from the bin centres weighted by their counts) and marginal densities.
+An optional overlay shows a uniform random subset of the points (reservoir sampling).
+
+The functions follow the seaborn calls they replace:
+
+    jointplot(x="BMXLEG", y="BMXARML", kind="kde", data=da)        # sns.jointplot(..., kind='kde')
+    regplot(x="BPXDI1", y="BPXDI2", data=da, scatter_kws={"alpha": 0.2})   # sns.regplot(..., fit_reg=False)
+    facetplot(da, "BMXLEG", "BMXARML", col="RIDRETH1", row="RIAGENDRx")    # FacetGrid(...).map(plt.scatter, ...)
+'''
+from collections import namedtuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy.signal import fftconvolve
+
+from nhanes.stratified import codes
+from nhanes.trace import traced
+
+GRID = 200
+
+Binned = namedtuple("Binned", ["counts", "xedges", "yedges", "n"])
+
+
+class JointGrid(namedtuple("JointGrid", ["figure", "ax_joint", "ax_marg_x", "ax_marg_y"])):
+    '''The figure and axes of a jointplot, under the attribute names of seaborn's JointGrid.'''
+
+    __slots__ = ()
+
+    @property
+    def fig(self):
+        return self.figure
+
+    def set_axis_labels(self, xlabel="", ylabel="", **kwargs):
+        self.ax_joint.set_xlabel(xlabel, **kwargs)
+        self.ax_joint.set_ylabel(ylabel, **kwargs)
+        return self
+
+    def savefig(self, *args, **kwargs):
+        self.figure.savefig(*args, **kwargs)
+
+
+def _pairs(data, x, y):
+    xv = np.asarray(data[x], dtype=np.float64)
+    yv = np.asarray(data[y], dtype=np.float64)
+    keep = ~(np.isnan(xv) | np.isnan(yv))
+    return xv[keep], yv[keep]
+
+
+def _extent(v, pad, fallback=(0.0, 1.0)):
+    '''Padded (min, max) of the non-missing values; `fallback` when there are none.'''
+    v = np.asarray(v, dtype=np.float64)
+    v = v[~np.isnan(v)]
+    if v.size == 0:
+        return fallback
+    lo, hi = float(np.min(v)), float(np.max(v))
+    width = (hi - lo) or 1.0
+    return lo - pad * width, hi + pad * width
+
+
+def bin2d(x, y, bins=GRID, range=None, pad=0.1):
+    '''2D histogram of the pairs on a bins x bins grid (one pass over the data).'''
+    if range is None:
+        range = (_extent(x, pad), _extent(y, pad))
+    counts, xedges, yedges = np.histogram2d(x, y, bins=bins, range=range)
+    return Binned(counts, xedges, yedges, x.shape[0])
+
+
+def scott_bandwidth(v, n, dims=2):
+    '''Scott's rule kernel standard deviation, as used by scipy.stats.gaussian_kde and seaborn.'''
+    return np.std(v) * n ** (-1.0 / (dims + 4))
+
+
+def _gaussian(sigma_bins):
+    half = int(np.ceil(4 * sigma_bins))
+    t = np.arange(-half, half + 1)
+    k = np.exp(-0.5 * (t / max(sigma_bins, 1e-9)) ** 2)
+    return k / k.sum()
+
+
+def kde2d(x, y, bins=GRID, range=None, bw_adjust=1.0):
+    '''Gaussian KDE of the pairs on a grid: the 2D histogram convolved (FFT) with the kernel. Returns a density.'''
+    b = bin2d(x, y, bins, range, pad=0.25)
+    dx = b.xedges[1] - b.xedges[0]
+    dy = b.yedges[1] - b.yedges[0]
+    kx = _gaussian(bw_adjust * scott_bandwidth(x, b.n) / dx)
+    ky = _gaussian(bw_adjust * scott_bandwidth(y, b.n) / dy)
+    smooth = fftconvolve(b.counts, np.outer(kx, ky), mode="same")
+    density = np.clip(smooth, 0, None) / (b.n * dx * dy)
+    return Binned(density, b.xedges, b.yedges, b.n)
+
+
+def kde1d(v, bins=GRID, range=None, bw_adjust=1.0):
+    '''Gaussian KDE of one variable on a grid; returns (grid centres, density).'''
+    if range is None:
+        range = _extent(v, 0.25)
+    counts, edges = np.histogram(v, bins=bins, range=range)
+    dx = edges[1] - edges[0]
+    smooth = fftconvolve(counts, _gaussian(bw_adjust * scott_bandwidth(v, v.shape[0], dims=1) / dx), mode="same")
+    return (edges[:-1] + edges[1:]) / 2, np.clip(smooth, 0, None) / (v.shape[0] * dx)
+
+
+def reservoir_sample(chunks, k, rng=None):
+    '''
+    Uniform random sample of k items from a stream of array chunks, holding at most k + one chunk in memory.
+
+    Every item gets a random key and the k smallest keys win, which is the same distribution as reservoir
+    sampling; each chunk is handled with one argpartition.
+    '''
+    rng = np.random.default_rng(rng)
+    kept = None
+    kept_keys = np.empty(0)
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        keys = np.concatenate([kept_keys, rng.random(chunk.shape[0])])
+        items = chunk if kept is None else np.concatenate([kept, chunk])
+        if keys.shape[0] > k:
+            sel = np.argpartition(keys, k - 1)[:k]
+            items, keys = items[sel], keys[sel]
+        kept, kept_keys = items, keys
+    return kept
+
+
+def _centres(edges):
+    return (edges[:-1] + edges[1:]) / 2
+
+
+def _draw(ax, x, y, kind, bins, cmap, overlay, scatter_kws, rng):
+    if kind == "kde":
+        d = kde2d(x, y, bins)
+        ax.contourf(_centres(d.xedges), _centres(d.yedges), d.counts.T, levels=10, cmap=cmap)
+    elif kind == "hex":
+        b = bin2d(x, y, bins)
+        gx, gy = np.meshgrid(_centres(b.xedges), _centres(b.yedges), indexing="ij")
+        nz = b.counts > 0
+        ax.hexbin(gx[nz], gy[nz], C=b.counts[nz], reduce_C_function=np.sum, gridsize=max(10, bins // 8),
+                  cmap=cmap, mincnt=1)
+    else:
+        b = bin2d(x, y, bins)
+        masked = np.ma.masked_equal(b.counts.T, 0)
+        ax.pcolormesh(b.xedges, b.yedges, masked, cmap=cmap)
+    if overlay:
+        pts = reservoir_sample([np.column_stack([x, y])], overlay, rng)
+        ax.scatter(pts[:, 0], pts[:, 1], **{"s": 4, "color": "k", "alpha": 0.3, **(scatter_kws or {})})
+
+
+@traced("plot")
+def regplot(x, y, data, fit_reg=False, scatter_kws=None, ax=None, bins=GRID, overlay=2000, cmap="Blues",
+            rng=None):
+    '''Binned stand-in for sns.regplot(..., fit_reg=False): a count image plus a sampled point overlay.'''
+    if fit_reg:
+        raise ValueError("only fit_reg=False is supported")
+    ax = ax or plt.gca()
+    xv, yv = _pairs(data, x, y)
+    _draw(ax, xv, yv, "hist", bins, cmap, overlay, scatter_kws, rng)
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return ax
+
+
+@traced("plot")
+def jointplot(x, y, data, kind="kde", bins=GRID, overlay=0, cmap="Blues", height=6, rng=None):
+    '''
+    Binned stand-in for sns.jointplot: joint density (kind "kde", "hex" or "hist") with marginal densities.
+
+    Returns a JointGrid with the figure and its ax_joint, ax_marg_x and ax_marg_y axes, like seaborn.
+    '''
+    xv, yv = _pairs(data, x, y)
+    fig = plt.figure(figsize=(height, height))
+    grid = fig.add_gridspec(2, 2, width_ratios=(5, 1), height_ratios=(1, 5), hspace=0.05, wspace=0.05)
+    ax = fig.add_subplot(grid[1, 0])
+    ax_x = fig.add_subplot(grid[0, 0], sharex=ax)
+    ax_y = fig.add_subplot(grid[1, 1], sharey=ax)
+    _draw(ax, xv, yv, kind, bins, cmap, overlay, None, rng)
+    gx, dx = kde1d(xv, bins)
+    gy, dy = kde1d(yv, bins)
+    ax_x.fill_between(gx, dx, alpha=0.5)
+    ax_y.fill_betweenx(gy, dy, alpha=0.5)
+    ax_x.axis("off")
+    ax_y.axis("off")
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return JointGrid(fig, ax, ax_x, ax_y)
+
+
+@traced("plot")
+def facetplot(data, x, y, col=None, row=None, kind="hist", bins=100, cmap="Blues", height=3):
+    '''Binned stand-in for sns.FacetGrid(data, col=..., row=...).map(plt.scatter, x, y): one panel per stratum.'''
+    xv_all = np.asarray(data[x], dtype=np.float64)
+    yv_all = np.asarray(data[y], dtype=np.float64)
+    row_code, row_labels = codes(data[row]) if row else (np.zeros(len(data), dtype=int), [None])
+    col_code, col_labels = codes(data[col]) if col else (np.zeros(len(data), dtype=int), [None])
+    fig, axes = plt.subplots(len(row_labels), len(col_labels), squeeze=False, sharex=True, sharey=True,
+                             figsize=(height * len(col_labels), height * len(row_labels)))
+    ok = ~(np.isnan(xv_all) | np.isnan(yv_all))
+    # Common bins for every panel so the images are comparable; without complete pairs, each axis's own range
+    rng_xy = (_extent(xv_all[ok], 0.05, _extent(xv_all, 0.05)), _extent(yv_all[ok], 0.05, _extent(yv_all, 0.05)))
+    # One stable sort by panel, then every panel is a slice
+    keep = np.flatnonzero(ok & (row_code >= 0) & (col_code >= 0))
+    panel = row_code[keep] * len(col_labels) + col_code[keep]
+    order = keep[np.argsort(panel, kind="stable")]
+    bounds = np.searchsorted(np.sort(panel), np.arange(len(row_labels) * len(col_labels) + 1))
+    for i, rl in enumerate(row_labels):
+        for j, cl in enumerate(col_labels):
+            p = i * len(col_labels) + j
+            sel = order[bounds[p]:bounds[p + 1]]
+            ax = axes[i, j]
+            if sel.size:
+                if kind == "kde":
+                    d = kde2d(xv_all[sel], yv_all[sel], bins, rng_xy)
+                    ax.contourf(_centres(d.xedges), _centres(d.yedges), d.counts.T, levels=10, cmap=cmap)
+                else:
+                    b = bin2d(xv_all[sel], yv_all[sel], bins, rng_xy)
+                    ax.pcolormesh(b.xedges, b.yedges, np.ma.masked_equal(b.counts.T, 0), cmap=cmap)
+            title = " | ".join("%s = %s" % (n, v) for n, v in ((row, rl), (col, cl)) if n)
+            ax.set_title(title, fontsize="small")
+            if i == len(row_labels) - 1:
+                ax.set_xlabel(x)
+            if j == 0:
+                ax.set_ylabel(y)
+    # The axes are shared, so this also frames panels left empty
+    axes[0, 0].set_xlim(*rng_xy[0])
+    axes[0, 0].set_ylim(*rng_xy[1])
+    return fig
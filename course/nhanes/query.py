@@ -0,0 +1,305 @@
+'''
+Lazy queries over the NHANES data: projection, filtering and aggregation fused into one pass.
+
+Chains like da.loc[cond, cols].dropna().corr(), df_BMX[condition1 & condition2].head() or
+db.groupby([...]).size().unstack() allocate a full intermediate DataFrame at every step. A Query only records
+the steps; when a terminal method runs it
+
+* asks the loader for exactly the columns the plan uses (projection push-down, memory-mapped);
+* walks the rows in blocks, evaluating all filters on each block and feeding only the matching rows to the
+  terminal operation (a count table, co-moments, per-group sums) without building a filtered frame;
+* stops reading as soon as head(n) has its n rows.
+
+    q = Query()
+    q.filter(col("RIAGENDR") == "Female").select("BMXLEG", "BMXARML").dropna().corr()
+    q.filter(col("BMXWAIST") > 98.3, col("BMXLEG") < 32).select("BMXBMI", "BMXARML").head()
+    q.groupby("RIAGENDR", "DMDEDUC2").agg({"BPXSY1": "mean"})
+'''
+import operator
+
+import numpy as np
+import pandas as pd
+
+from nhanes.correlation import numeric_columns
+from nhanes.loader import DATA_PATH, columns as dataset_columns, load_arrays
+from nhanes.online import CoMoments
+from nhanes.stratified import codes
+from nhanes.trace import traced
+
+BLOCK_ROWS = 1 << 16
+
+
+def _as_bool(result):
+    '''Comparison results as a plain bool array, missing values counting as False.'''
+    if isinstance(result, np.ndarray):
+        return result.astype(bool, copy=False)
+    return np.asarray(pd.array(result, dtype="boolean").fillna(False), dtype=bool)
+
+
+class Predicate:
+    '''A row condition on some columns; combine with &, | and ~.'''
+
+    def __init__(self, columns, evaluate):
+        self.columns = set(columns)
+        self.evaluate = evaluate  # block dict -> bool array
+
+    def __and__(self, other):
+        return Predicate(self.columns | other.columns, lambda b: self.evaluate(b) & other.evaluate(b))
+
+    def __or__(self, other):
+        return Predicate(self.columns | other.columns, lambda b: self.evaluate(b) | other.evaluate(b))
+
+    def __invert__(self):
+        return Predicate(self.columns, lambda b: ~self.evaluate(b))
+
+
+class Col:
+    '''Reference to a column inside a query, used to build predicates.'''
+
+    def __init__(self, name):
+        self.name = name
+
+    def _compare(self, op, value):
+        name = self.name
+        return Predicate([name], lambda b: _as_bool(op(b[name], value)))
+
+    def __eq__(self, value):
+        return self._compare(operator.eq, value)
+
+    def __ne__(self, value):
+        return self._compare(operator.ne, value) & self.notna()
+
+    def __lt__(self, value):
+        return self._compare(operator.lt, value)
+
+    def __le__(self, value):
+        return self._compare(operator.le, value)
+
+    def __gt__(self, value):
+        return self._compare(operator.gt, value)
+
+    def __ge__(self, value):
+        return self._compare(operator.ge, value)
+
+    def isin(self, values):
+        name = self.name
+        return Predicate([name], lambda b: _as_bool(pd.array(b[name]).isin(values)))
+
+    def between(self, low, high):
+        return (self >= low) & (self <= high)
+
+    def notna(self):
+        name = self.name
+        return Predicate([name], lambda b: ~np.asarray(pd.isna(b[name])))
+
+
+def col(name):
+    '''A column reference for Query.filter().'''
+    return Col(name)
+
+
+class Query:
+    '''An immutable plan; every method returns a new Query, and terminal methods execute it.'''
+
+    def __init__(self, path=DATA_PATH, frame=None, columns=None, predicates=(), listwise=False, keys=None):
+        self.path = path
+        self.frame = frame
+        self.columns = columns
+        self.predicates = tuple(predicates)
+        self.listwise = listwise
+        self.keys = keys
+
+    @classmethod
+    def from_frame(cls, frame):
+        '''A query over an already loaded DataFrame instead of the cached dataset.'''
+        return cls(frame=frame)
+
+    def _with(self, **changes):
+        state = dict(path=self.path, frame=self.frame, columns=self.columns, predicates=self.predicates,
+                     listwise=self.listwise, keys=self.keys)
+        state.update(changes)
+        return Query(**state)
+
+    # Plan building
+
+    def select(self, *columns):
+        return self._with(columns=list(columns))
+
+    def filter(self, *predicates):
+        return self._with(predicates=self.predicates + predicates)
+
+    def dropna(self):
+        '''Drop rows with a missing value in any selected column (applied inside the fused pass).'''
+        return self._with(listwise=True)
+
+    def groupby(self, *keys):
+        return self._with(keys=list(keys))
+
+    # Execution
+
+    def _needed(self, extra=()):
+        needed = []
+        for c in list(self.columns or []) + list(self.keys or []) + list(extra):
+            if c not in needed:
+                needed.append(c)
+        for p in self.predicates:
+            needed.extend(sorted(c for c in p.columns if c not in needed))
+        return needed
+
+    def _source(self, needed):
+        if self.frame is not None:
+            return {c: self.frame[c].array for c in needed}, len(self.frame)
+        arrays = load_arrays(needed, self.path)
+        n = len(next(iter(arrays.values()))) if arrays else 0
+        return arrays, n
+
+    def _blocks(self, extra=()):
+        '''Yield (start, block, mask) for each block of rows, the mask combining every filter and dropna.'''
+        if self.columns is None:
+            cols = list(self.frame.columns) if self.frame is not None else dataset_columns(self.path)
+            query = self._with(columns=cols)
+        else:
+            query = self
+        needed = query._needed(extra)
+        arrays, n = query._source(needed)
+        for start in range(0, n, BLOCK_ROWS):
+            block = {c: a[start:start + BLOCK_ROWS] for c, a in arrays.items()}
+            mask = np.ones(min(BLOCK_ROWS, n - start), dtype=bool)
+            for p in query.predicates:
+                mask &= p.evaluate(block)
+            if query.listwise:
+                for c in query.columns:
+                    mask &= ~np.asarray(pd.isna(block[c]))
+            yield start, block, mask, query.columns
+
+    def _gather(self, limit=None):
+        parts = {}
+        index = []
+        taken = 0
+        columns = None
+        for start, block, mask, columns in self._blocks():
+            rows = np.flatnonzero(mask)
+            if limit is not None:
+                rows = rows[:limit - taken]
+            for c in columns:
+                parts.setdefault(c, []).append(block[c][rows])
+            index.append(start + rows)
+            taken += rows.shape[0]
+            if limit is not None and taken >= limit:
+                break
+        if columns is None:
+            return pd.DataFrame()
+        data = {c: np.concatenate(parts[c]) if isinstance(parts[c][0], np.ndarray)
+                else type(parts[c][0])._concat_same_type(parts[c]) for c in columns}
+        return pd.DataFrame(data, index=np.concatenate(index))
+
+    @traced("filter")
+    def collect(self):
+        '''Materialize the selected columns of the matching rows (the only copy made).'''
+        return self._gather()
+
+    def head(self, n=5):
+        '''The first n matching rows; reading stops as soon as they are found.'''
+        return self._gather(limit=n)
+
+    @traced("filter")
+    def count(self):
+        '''Number of matching rows.'''
+        return int(sum(mask.sum() for _, _, mask, _ in self._blocks()))
+
+    def _empty(self, columns):
+        '''A zero-row frame of `columns` with their real dtypes.'''
+        arrays, _ = self._with(predicates=())._source(columns)
+        return pd.DataFrame({c: a[:0] for c, a in arrays.items()})
+
+    @traced("correlation")
+    def corr(self):
+        '''
+        Correlation matrix of the selected columns over the matching rows, without materializing them.
+
+        Without select() every numeric column is used (identifiers excluded), like DataFrame.corr(numeric_only=True).
+        '''
+        if self.columns is None:
+            names = list(self.frame.columns) if self.frame is not None else dataset_columns(self.path)
+            query = self.select(*numeric_columns(self._empty(names)))
+        else:
+            empty = self._empty(self.columns)
+            other = [c for c in self.columns if not pd.api.types.is_numeric_dtype(empty[c].dtype)
+                     or isinstance(empty[c].dtype, pd.CategoricalDtype)]
+            if other:
+                raise ValueError("corr() needs numeric columns; %s %s not" % (", ".join(other),
+                                                                               "is" if len(other) == 1 else "are"))
+            query = self
+        if not query.columns:
+            raise ValueError("corr() has no columns to correlate")
+        acc = CoMoments(query.columns, listwise=query.listwise)
+        matched = 0
+        for _, block, mask, columns in query._blocks():
+            rows = np.flatnonzero(mask)
+            matched += rows.shape[0]
+            acc.update(np.column_stack([np.asarray(block[c][rows], dtype=np.float64) for c in columns]))
+        if matched == 0:
+            raise ValueError("corr() of an empty selection: no rows match the query")
+        return acc.corr()
+
+    def _group_codes(self):
+        '''Codes of the group keys over the whole column (only the key columns are read for this).'''
+        arrays, _ = self._with(columns=[], predicates=())._source(self.keys)
+        parts = [codes(pd.Series(arrays[k])) for k in self.keys]
+        shape = [len(labels) for _, labels in parts]
+        combined = np.zeros(len(parts[0][0]), dtype=np.int64)
+        valid = np.ones(len(parts[0][0]), dtype=bool)
+        for (code, _), size in zip(parts, shape):
+            valid &= code >= 0
+            combined = combined * size + code
+        if len(self.keys) == 1:
+            index = pd.Index(parts[0][1], name=self.keys[0])
+        else:
+            index = pd.MultiIndex.from_product([labels for _, labels in parts], names=self.keys)
+        return np.where(valid, combined, -1), index
+
+    @traced("crosstab")
+    def size(self):
+        '''Rows per group (observed groups only), like groupby(keys).size().'''
+        return self._aggregate({})["size"]
+
+    @traced("crosstab")
+    def agg(self, spec):
+        '''Per-group aggregates, spec = {column: "mean" | "sum" | "count" | "size"} (or a list of those).'''
+        return self._aggregate(spec)
+
+    def _aggregate(self, spec):
+        if not self.keys:
+            raise ValueError("agg() and size() need groupby() first")
+        group, index = self._group_codes()
+        n_groups = len(index)
+        sizes = np.zeros(n_groups)
+        sums = {c: np.zeros(n_groups) for c in spec}
+        counts = {c: np.zeros(n_groups) for c in spec}
+        for start, block, mask, _ in self._with(columns=list(spec))._blocks():
+            g = group[start:start + mask.shape[0]]
+            keep = mask & (g >= 0)
+            sizes += np.bincount(g[keep], minlength=n_groups)
+            for c in spec:
+                x = np.asarray(block[c], dtype=np.float64)[keep]
+                present = ~np.isnan(x)
+                sums[c] += np.bincount(g[keep][present], weights=x[present], minlength=n_groups)
+                counts[c] += np.bincount(g[keep][present], minlength=n_groups)
+        out = {}
+        for c, how in spec.items():
+            for h in ([how] if isinstance(how, str) else how):
+                name = c if isinstance(how, str) else (c, h)
+                if h == "sum":
+                    out[name] = sums[c]
+                elif h == "count":
+                    out[name] = counts[c].astype(np.int64)
+                elif h == "mean":
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        out[name] = sums[c] / counts[c]
+                elif h == "size":
+                    out[name] = sizes.astype(np.int64)
+                else:
+                    raise ValueError("unsupported aggregate %r" % h)
+        if not spec:
+            out["size"] = sizes.astype(np.int64)
+        return pd.DataFrame(out, index=index)[sizes > 0]
@@ -0,0 +1,196 @@
+'''
+Registry of NHANES survey cycles and component files, joined on the SEQN participant ID.
+
+Each cycle (e.g. "2015-2016") has one or more component files (demographics, examination, labs, questionnaires)
+sharing the SEQN key. Every file goes through the columnar cache of nhanes.loader and gets a SeqnIndex, the
+sorted SEQN keys plus the permutation into file order (None when the file is already sorted, as NHANES files
+are). A join looks the base component's keys up in the other file's sorted keys with one vectorized binary
+search: the base columns are shared as they are and only the joined columns are gathered, instead of pd.merge
+copying both frames. Stacking cycles harmonizes the schema: the columns are the union over cycles, missing ones
+become all-missing, categories are unioned and numeric types widened.
+
+    reg = Registry()
+    reg.register("2015-2016", "demo", "nhanes_2015_2016.csv")
+    reg.register("2015-2016", "lab", "nhanes_2015_2016_lab.csv")
+    reg.register("2017-2018", "demo", "nhanes_2017_2018.csv")
+    da = reg.dataset()                        # every cycle, components left-joined onto "demo", stacked
+    bp = reg.join("2015-2016", ["lab"], how="inner")
+
+REGISTRY holds the course file as cycle "2015-2016", component "demo".
+'''
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from nhanes.loader import DATA_PATH, load
+
+KEY = "SEQN"
+CYCLE = "cycle"
+
+
+class SeqnIndex:
+    '''Sorted participant IDs of one file; maps IDs to row positions by binary search.'''
+
+    def __init__(self, keys):
+        keys = np.asarray(keys)
+        if keys.size > 1 and not np.all(keys[1:] > keys[:-1]):
+            self.order = np.argsort(keys, kind="stable")
+            keys = keys[self.order]
+            if np.any(keys[1:] == keys[:-1]):
+                raise ValueError("duplicate %s values" % KEY)
+        else:
+            self.order = None
+        self.keys = keys
+
+    def __len__(self):
+        return self.keys.shape[0]
+
+    def positions(self, keys):
+        '''Row positions (in file order) of `keys`, -1 for IDs not in the file.'''
+        keys = np.asarray(keys)
+        i = np.searchsorted(self.keys, keys)
+        i[i == len(self)] = 0
+        found = self.keys[i] == keys if len(self) else np.zeros(keys.shape, dtype=bool)
+        pos = i if self.order is None else self.order[i]
+        return np.where(found, pos, -1)
+
+
+def take(values, positions):
+    '''values[positions] for an ndarray or extension array, with missing values where positions is -1.'''
+    if isinstance(values, pd.Series):
+        values = values.array if not isinstance(values.dtype, np.dtype) else values.to_numpy()
+    if isinstance(values, np.ndarray):
+        if positions.size == 0 or positions.min() >= 0:
+            return values[positions]
+        if values.dtype.kind in "fc":
+            out = values[positions]
+            out[positions < 0] = np.nan
+            return out
+        # Integers and booleans cannot hold NaN; the nullable array keeps their type
+        values = pd.array(values)
+    return values.take(positions, allow_fill=True)
+
+
+def join(left, right, right_index, how="left", suffix=None):
+    '''
+    Join `right` onto `left` on SEQN, looking the keys of `left` up in the SeqnIndex of `right`.
+
+    how="left" keeps every row of `left` in its order and shares its columns (copy-on-write); how="inner" keeps
+    only the rows found in `right`. Non-key columns of `right` that clash with `left` get `suffix` appended.
+    '''
+    if how not in ("left", "inner"):
+        raise ValueError("how must be 'left' or 'inner'")
+    pos = right_index.positions(left[KEY].to_numpy())
+    out = {}
+    if how == "inner":
+        keep = np.flatnonzero(pos >= 0)
+        pos = pos[keep]
+        for c in left.columns:
+            out[c] = take(left[c], keep)
+    else:
+        for c in left.columns:
+            out[c] = left[c]
+    for c in right.columns:
+        if c == KEY:
+            continue
+        name = c
+        if name in out:
+            if not suffix:
+                raise ValueError("column %s is in both frames; pass a suffix" % c)
+            name = c + suffix
+        out[name] = take(right[c], pos)
+    return pd.DataFrame(out, copy=False)
+
+
+def _missing(like, n):
+    return pd.Series(index=pd.RangeIndex(n), dtype=like.dtype)
+
+
+def stack(frames, labels=None, label_column=CYCLE):
+    '''
+    Concatenate frames with different schemas: the union of their columns in first-seen order.
+
+    Columns absent from a frame are all-missing for its rows, categorical columns get the union of the
+    categories and numeric columns the common type of their pieces. With `labels`, a categorical column
+    `label_column` records which frame every row came from.
+    '''
+    names = []
+    for f in frames:
+        names.extend(c for c in f.columns if c not in names)
+    sizes = [len(f) for f in frames]
+    out = {}
+    if labels is not None:
+        codes = np.repeat(np.arange(len(frames), dtype=np.int8 if len(frames) < 128 else np.int32), sizes)
+        out[label_column] = pd.Categorical.from_codes(codes, categories=list(labels))
+    for c in names:
+        like = next(f[c] for f in frames if c in f.columns)
+        pieces = [f[c].reset_index(drop=True) if c in f.columns else _missing(like, len(f)) for f in frames]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in pieces):
+            out[c] = union_categoricals(pieces)
+        else:
+            if any(isinstance(p.dtype, pd.CategoricalDtype) for p in pieces):
+                pieces = [p.astype(object) for p in pieces]
+            out[c] = pd.concat(pieces, ignore_index=True).array
+    return pd.DataFrame(out, copy=False)
+
+
+class Registry:
+    '''Component files of every cycle, loaded through the columnar cache and indexed on SEQN on first use.'''
+
+    def __init__(self):
+        self.paths = {}
+        self._frames = {}
+        self._indexes = {}
+
+    def register(self, cycle, component, path):
+        '''Add a file; the first component registered for a cycle is its base for joins.'''
+        self.paths.setdefault(cycle, {})[component] = os.path.abspath(path)
+        self._frames.pop((cycle, component), None)
+        self._indexes.pop((cycle, component), None)
+        return self
+
+    @property
+    def cycles(self):
+        return list(self.paths)
+
+    def components(self, cycle):
+        return list(self.paths[cycle])
+
+    def frame(self, cycle, component):
+        '''The component file of a cycle as a DataFrame backed by the columnar cache.'''
+        key = (cycle, component)
+        if key not in self._frames:
+            self._frames[key] = load(path=self.paths[cycle][component])
+        return self._frames[key]
+
+    def index(self, cycle, component):
+        '''SeqnIndex of a component file.'''
+        key = (cycle, component)
+        if key not in self._indexes:
+            self._indexes[key] = SeqnIndex(self.frame(cycle, component)[KEY].to_numpy())
+        return self._indexes[key]
+
+    def join(self, cycle, components=None, how="left", base=None):
+        '''The base component of `cycle` with the other `components` (default all) joined on SEQN.'''
+        base = base or self.components(cycle)[0]
+        if components is None:
+            components = [c for c in self.components(cycle) if c != base]
+        out = self.frame(cycle, base)
+        for comp in components:
+            out = join(out, self.frame(cycle, comp), self.index(cycle, comp), how, suffix="_" + comp)
+        return out
+
+    def dataset(self, cycles=None, components=None, how="left"):
+        '''
+        Every cycle in `cycles` (default all) joined as in join() and stacked with a harmonized schema and a
+        `cycle` column. A single cycle is returned as join() gives it.
+        '''
+        cycles = cycles or self.cycles
+        if len(cycles) == 1:
+            return self.join(cycles[0], components, how)
+        return stack([self.join(c, components, how) for c in cycles], labels=cycles)
+
+
+REGISTRY = Registry().register("2015-2016", "demo", DATA_PATH)
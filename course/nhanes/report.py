@@ -0,0 +1,246 @@
+'''
+Headless batch runner for the course analyses.
+
+Every week script is a registered task. The runner parses the CSV once (building the columnar cache of
+nhanes.loader, which the scripts' load() calls then memory-map instead of reparsing), runs the tasks in a process
+pool under the non-interactive Agg backend and writes each task's printed tables to <out>/<task>/output.txt and
+every figure it would have shown to <out>/<task>/figure-NN.png. plt.show() saves and closes the open figures
+instead of blocking. As in a notebook, the value of every top-level expression statement (a bare
+da.describe() or pd.crosstab(...)) is written to the output too, not only what the script prints.
+
+A task is skipped when the SHA-256 of its inputs (the script, the nhanes package sources and the contents of the
+dataset) matches the hash recorded by its last successful run.
+
+    python -m nhanes.report                   # from the course directory; writes to course/report/
+    python -m nhanes.report -o /tmp/report -j 4 week4/Randomness.py
+    python -m nhanes.report --force           # ignore recorded hashes
+    python -m nhanes.report --trace --force   # also write trace.json / trace.chrome.json per task
+'''
+import argparse
+import ast
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+import types
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from nhanes import trace as tracing
+from nhanes.loader import COURSE_DIR, DATA_PATH, build_cache
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(COURSE_DIR, "report")
+HASH_FILE = ".inputs.sha256"
+
+Task = namedtuple("Task", ["name", "script"])
+TaskResult = namedtuple("TaskResult", ["name", "status", "seconds", "figures", "error"])
+
+TASKS = {}
+
+
+def register(script, name=None):
+    '''Register a script (absolute, or relative to the course directory) as a report task.'''
+    script = os.path.join(COURSE_DIR, script)
+    if name is None:
+        rel = os.path.relpath(script, COURSE_DIR)
+        if rel.startswith(os.pardir):
+            rel = os.path.basename(script)
+        name = os.path.splitext(rel)[0].replace(os.sep, ".")
+    TASKS[name] = Task(name, os.path.abspath(script))
+    return TASKS[name]
+
+
+def discover(pattern="week*/*.py"):
+    '''Register every script under the course directory matching `pattern`.'''
+    for script in sorted(glob.glob(os.path.join(COURSE_DIR, pattern))):
+        register(script)
+    return TASKS
+
+
+def file_digest(path):
+    '''SHA-256 of the contents of a file, read in 1 MiB blocks.'''
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+def input_hash(task, data_path=DATA_PATH, data_digest=None):
+    '''
+    Content hash of everything a task's output depends on. Pass `data_digest` (file_digest of the dataset) to
+    avoid rehashing the dataset for every task.
+    '''
+    h = hashlib.sha256()
+    sources = [task.script] + sorted(glob.glob(os.path.join(PACKAGE_DIR, "*.py")))
+    for path in sources:
+        h.update(os.path.relpath(path, COURSE_DIR).encode())
+        h.update(file_digest(path))
+    h.update(data_digest or file_digest(data_path))
+    return h.hexdigest()
+
+
+def _hash_path(out):
+    return os.path.join(out, HASH_FILE)
+
+
+def is_current(task, out, digest):
+    '''True when the outputs in `out` were produced from inputs with hash `digest`.'''
+    try:
+        with open(_hash_path(out)) as f:
+            return f.read().strip() == digest
+    except OSError:
+        return False
+
+
+def _is_plot_object(value):
+    if isinstance(value, (list, tuple)) and value:
+        return all(_is_plot_object(v) for v in value)
+    return type(value).__module__.split(".")[0] in ("matplotlib", "seaborn")
+
+
+def _display(value):
+    '''Print the value of a top-level expression the way a notebook cell shows it; plot objects are skipped.'''
+    if value is not None and not _is_plot_object(value):
+        print(repr(value))
+
+
+def _compile(script):
+    '''Compile a script with every top-level expression statement wrapped in a call to _display.'''
+    with open(script) as f:
+        tree = ast.parse(f.read(), script)
+    for i, node in enumerate(tree.body):
+        if isinstance(node, ast.Expr):
+            call = ast.Call(ast.Name("__display__", ast.Load()), [node.value], [])
+            tree.body[i] = ast.copy_location(ast.Expr(ast.copy_location(call, node.value)), node)
+    return compile(ast.fix_missing_locations(tree), script, "exec")
+
+
+def _run_script(script):
+    '''Run a script as __main__, as `python script` would, displaying its top-level expressions.'''
+    module = types.ModuleType("__main__")
+    module.__file__ = script
+    module.__dict__["__display__"] = _display
+    sys.modules["__main__"] = module
+    sys.argv = [script]
+    exec(_compile(script), module.__dict__)
+
+
+def _run_task(task, out, digest, trace=None):
+    # Runs in a fresh worker process, so the backend switch, the patched plt.show, the working directory and
+    # whatever global state the script leaves behind never reach another task
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if trace:
+        tracing.enable(trace_memory=trace == "memory")
+
+    # The script runs inside `out`, so every path below has to be absolute
+    out = os.path.abspath(out)
+    os.makedirs(out, exist_ok=True)
+    for old in glob.glob(os.path.join(out, "figure-*.png")) + [_hash_path(out)]:
+        if os.path.exists(old):
+            os.remove(old)
+
+    figures = []
+
+    def show(*args, **kwargs):
+        with tracing.span("plot.save", figures=len(plt.get_fignums())):
+            for num in plt.get_fignums():
+                path = os.path.join(out, "figure-%02d.png" % (len(figures) + 1))
+                plt.figure(num).savefig(path)
+                figures.append(os.path.basename(path))
+            plt.close("all")
+
+    plt.show = show
+    start = time.perf_counter()
+    error = None
+    with open(os.path.join(out, "output.txt"), "w") as log:
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            try:
+                os.chdir(out)
+                with tracing.span("task", script=task.name):
+                    _run_script(task.script)
+                    show()
+            except BaseException:
+                error = traceback.format_exc()
+                log.write(error)
+    seconds = time.perf_counter() - start
+    if trace:
+        tracing.save_json(os.path.join(out, "trace.json"))
+        tracing.save_chrome(os.path.join(out, "trace.chrome.json"))
+    if error is None:
+        with open(_hash_path(out), "w") as f:
+            f.write(digest)
+        return TaskResult(task.name, "ok", seconds, figures, None)
+    return TaskResult(task.name, "failed", seconds, figures, error.strip().splitlines()[-1])
+
+
+def run(tasks=None, output_dir=OUTPUT_DIR, workers=None, force=False, data_path=DATA_PATH, trace=None):
+    '''
+    Run `tasks` (names or Task tuples; default every registered task) and return their TaskResults.
+
+    The dataset cache is built before any worker starts, so the CSV is parsed at most once per run. With
+    trace="time" or "memory" every task also writes trace.json and trace.chrome.json (see nhanes.trace).
+    '''
+    if not TASKS:
+        discover()
+    tasks = [TASKS[t] if isinstance(t, str) else t for t in (tasks or TASKS.values())]
+    output_dir = os.path.abspath(output_dir)
+    build_cache(data_path)
+    data_digest = file_digest(data_path)
+
+    results = []
+    pending = []
+    for task in tasks:
+        out = os.path.join(output_dir, task.name)
+        digest = input_hash(task, data_path, data_digest)
+        if not force and is_current(task, out, digest):
+            results.append(TaskResult(task.name, "skipped", 0.0, [], None))
+        else:
+            pending.append((task, out, digest))
+
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), max_tasks_per_child=1) as pool:
+            futures = [pool.submit(_run_task, *args, trace=trace) for args in pending]
+            results.extend(f.result() for f in futures)
+
+    order = {task.name: i for i, task in enumerate(tasks)}
+    results.sort(key=lambda r: order[r.name])
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump([r._asdict() for r in results], f, indent=2)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the course analyses headless and write their outputs.")
+    parser.add_argument("scripts", nargs="*", help="scripts to run (default: every week*/ script)")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR, help="output directory")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--force", action="store_true", help="rerun tasks whose inputs have not changed")
+    parser.add_argument("--trace", action="store_const", const="time", help="write a per-stage trace for every task")
+    parser.add_argument("--trace-memory", action="store_const", const="memory", dest="trace",
+                        help="as --trace, also tracing allocations (slower)")
+    args = parser.parse_args(argv)
+
+    if args.scripts:
+        tasks = [register(os.path.abspath(s)) for s in args.scripts]
+    else:
+        tasks = list(discover().values())
+    results = run(tasks, args.output, args.workers, args.force, trace=args.trace)
+    for r in results:
+        line = "%-40s %-8s %7.2fs %2d figures" % (r.name, r.status, r.seconds, len(r.figures))
+        print(line + ("  " + r.error if r.error else ""))
+    return 1 if any(r.status == "failed" for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
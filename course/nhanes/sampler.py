@@ -0,0 +1,55 @@
+'''
+Batched simple random sampling.
+
+Draws K samples of size n from a population in one call instead of K calls to random.sample or
+np.random.choice: with replacement the K x n index matrix comes from a single rng.integers call, without
+replacement from nhanes.subsampling.subsample_indices (when n is over half the population, one random key per
+unit and sample, the n smallest picked with argpartition and only those sorted; vectorized rejection of repeats
+otherwise). Samples are returned as a K x n array, or reduced straight to one statistic per sample, block by block
+so memory stays bounded: a block holds about four million values, keys included.
+
+    SampleA, SampleB = draw(Population, 500, 2)
+    means = sample_means(Population, 1000, 100)
+    mean_distribution = sample_means(population, sampSize, numberSamps, replace=True)
+'''
+import numpy as np
+
+from nhanes.subsampling import BLOCK_ELEMENTS, _per_replicate, as_rng, subsample_indices
+
+
+def sample_indices(n, size, samples, replace=False, rng=None):
+    '''(samples, size) matrix of positions into a population of n units.'''
+    rng = as_rng(rng)
+    if replace:
+        return rng.integers(0, n, size=(samples, size))
+    return subsample_indices(n, size, samples, rng)
+
+
+def draw(population, size, samples, replace=False, rng=None):
+    '''`samples` simple random samples of `size` values from `population`, as a (samples, size) array.'''
+    population = np.asarray(population)
+    return population[sample_indices(population.shape[0], size, samples, replace, rng)]
+
+
+def sample_statistic(population, size, samples, statistic=np.mean, replace=False, rng=None, block_size=None):
+    '''
+    One value of `statistic` per sample; `statistic` is called as statistic(block, axis=1).
+
+    Samples are drawn and reduced in blocks of at most block_size rows (by default enough rows to hold about
+    four million values, counting the key per population unit of the dense draws without replacement), so only
+    one block of gathered values exists at a time.
+    '''
+    population = np.asarray(population)
+    rng = as_rng(rng)
+    if block_size is None:
+        block_size = max(1, BLOCK_ELEMENTS // max(_per_replicate(population.shape[0], size, replace), 1))
+    out = np.empty(samples)
+    for start in range(0, samples, block_size):
+        stop = min(start + block_size, samples)
+        out[start:stop] = statistic(draw(population, size, stop - start, replace, rng), axis=1)
+    return out
+
+
+def sample_means(population, size, samples, replace=False, rng=None, block_size=None):
+    '''Sampling distribution of the mean: the means of `samples` samples of `size` values.'''
+    return sample_statistic(population, size, samples, np.mean, replace, rng, block_size)
@@ -0,0 +1,102 @@
+'''
+Vectorized random data for the simulations, built on numpy.random.Generator.
+
+The week4 scripts generate their populations one value at a time with random.normalvariate / random.uniform
+list comprehensions. Here every draw returns a contiguous float64 array in one call, and streams() splits one seed
+into independent child generators (numpy SeedSequence), e.g. one per worker.
+
+StdlibCompat reproduces, value for value, what the `random` module gives after random.seed(seed), so regression
+checks against the old list comprehensions still hold:
+
+    rng = StdlibCompat(1738)
+    Observations = rng.normalvariate(7, 1.7, 100000)   # == [random.normalvariate(7, 1.7) for _ in range(100000)]
+'''
+import math
+import random
+
+import numpy as np
+
+from nhanes.subsampling import as_rng
+
+# Constant of the Kinderman-Monahan ratio-of-uniforms method used by random.normalvariate
+NV_MAGICCONST = 4 * math.exp(-0.5) / math.sqrt(2.0)
+
+
+def streams(seed, n):
+    '''`n` independent generators derived from one seed.'''
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def normal(mu, sigma, size, rng=None):
+    '''`size` draws from Normal(mu, sigma) as a contiguous float64 array.'''
+    return np.ascontiguousarray(as_rng(rng).normal(mu, sigma, size), dtype=np.float64)
+
+
+def uniform(low, high, size, rng=None):
+    '''`size` draws from Uniform(low, high) as a contiguous float64 array.'''
+    return np.ascontiguousarray(as_rng(rng).uniform(low, high, size), dtype=np.float64)
+
+
+class StdlibCompat:
+    '''
+    Vectorized draws that reproduce the stdlib `random` module exactly.
+
+    Python's random() and numpy's MT19937 produce the same 53-bit doubles from the same Mersenne Twister state,
+    so the state of random.Random(seed) is copied into a numpy MT19937 and the stdlib formulas are applied to
+    whole arrays. getstate() returns the state in random.getstate() format, so a script can hand over to
+    the `random` module at any point with random.setstate(rng.getstate()).
+    '''
+
+    def __init__(self, seed=None):
+        self.bitgen = np.random.MT19937()
+        self.setstate(random.Random(seed).getstate())
+        self.gen = np.random.Generator(self.bitgen)
+
+    def setstate(self, state):
+        internal = state[1]
+        self.bitgen.state = {"bit_generator": "MT19937",
+                             "state": {"key": np.array(internal[:624], dtype=np.uint32), "pos": internal[624]}}
+
+    def getstate(self):
+        st = self.bitgen.state["state"]
+        return (3, tuple(int(v) for v in st["key"]) + (int(st["pos"]),), None)
+
+    def random(self, size=None):
+        '''random.random(); an array of `size` values when size is given.'''
+        if size is None:
+            return float(self.gen.random())
+        return self.gen.random(size)
+
+    def uniform(self, a, b, size=None):
+        '''random.uniform(a, b), computed as a + (b - a) * random() like the stdlib.'''
+        u = self.random(size)
+        return a + (b - a) * u
+
+    def normalvariate(self, mu, sigma, size=None):
+        '''random.normalvariate(mu, sigma) for `size` values, consuming exactly the uniforms the stdlib would.'''
+        n = 1 if size is None else int(size)
+        out = np.empty(n)
+        filled = 0
+        while filled < n:
+            # Every attempt uses two uniforms; draw a block of attempts, keep the accepted ones in order, then
+            # rewind and advance the stream by exactly the uniforms the accepted attempts used
+            state = self.bitgen.state
+            attempts = int((n - filled) * 1.4) + 16
+            u = self.gen.random(2 * attempts).reshape(attempts, 2)
+            u1 = u[:, 0]
+            u2 = 1.0 - u[:, 1]
+            z = NV_MAGICCONST * (u1 - 0.5) / u2
+            zz = z * z / 4.0
+            bound = -np.log(u2)
+            accept = zz <= bound
+            # np.log may differ from math.log in the last bit; decide the borderline attempts with math.log
+            close = np.flatnonzero(np.abs(zz - bound) <= 1e-12 * np.maximum(np.abs(bound), 1e-300))
+            for i in close:
+                accept[i] = zz[i] <= -math.log(u2[i])
+            idx = np.flatnonzero(accept)[:n - filled]
+            out[filled:filled + idx.shape[0]] = mu + z[idx] * sigma
+            filled += idx.shape[0]
+            used = attempts if filled < n else idx[-1] + 1
+            self.bitgen.state = state
+            self.gen.random(2 * used)
+        return float(out[0]) if size is None else out
@@ -0,0 +1,131 @@
+'''
+Mergeable quantile sketch (KLL) usable in place of statsmodels' ECDF and pd.Series.describe().
+
+ECDF(Observations) sorts and keeps the whole array. The sketch keeps a few hundred weighted items in a stack of
+"compactors": level h holds items that stand for 2**h observations each. Compaction is lazy: only when the sketch
+as a whole holds more items than its total capacity is the lowest full level sorted and every other item (random
+offset) promoted to the next level, so the sketch stays close to full and no level is halved before it has to be.
+Memory stays O(k log(n / k)) and the rank error of cdf() and quantile() is about n / k with high probability,
+whatever the number of observations.
+
+Sketches are fed chunk by chunk with update() and combine with merge(), so partial sketches from different chunks
+or workers can be joined:
+
+    ecdf = QuantileSketch().update(Observations)
+    plt.plot(ecdf.x, ecdf.y)
+    ecdf([5, 7, 9])                # ECDF evaluation
+    ecdf.quantile([0.025, 0.975])
+    ecdf.describe()                # like pd.Series(Observations).describe()
+'''
+import numpy as np
+import pandas as pd
+
+from nhanes.online import Moments
+
+
+class QuantileSketch:
+    '''KLL quantile sketch; `k` sets the accuracy (rank error about 1/k of the count).'''
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.levels = [np.empty(0)]
+        self.moments = Moments(["x"])
+        self.min = np.inf
+        self.max = -np.inf
+        self._sorted = None
+
+    @property
+    def n(self):
+        return int(self.moments.n[0])
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compact(self, h):
+        '''Sort level h and promote every other item of it to level h + 1.'''
+        if h + 1 == len(self.levels):
+            self.levels.append(np.empty(0))
+        level = np.sort(self.levels[h])
+        # An odd item out stays behind, so that every promoted item replaces exactly two
+        keep = level[-1:] if level.shape[0] % 2 else level[:0]
+        pairs = level[:level.shape[0] - keep.shape[0]]
+        self.levels[h] = keep
+        self.levels[h + 1] = np.concatenate([self.levels[h + 1], pairs[self.rng.integers(2)::2]])
+
+    def _compress(self):
+        while (sum(level.shape[0] for level in self.levels)
+               > sum(self._capacity(h) for h in range(len(self.levels)))):
+            h = next(h for h, level in enumerate(self.levels) if level.shape[0] >= self._capacity(h))
+            self._compact(h)
+        self._sorted = None
+
+    def update(self, values):
+        '''Add a chunk of observations (NaN values are ignored).'''
+        x = np.asarray(values, dtype=np.float64).ravel()
+        x = x[~np.isnan(x)]
+        if x.shape[0] == 0:
+            return self
+        self.moments.update(x)
+        self.min = min(self.min, x.min())
+        self.max = max(self.max, x.max())
+        self.levels[0] = np.concatenate([self.levels[0], x])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        '''Absorb another sketch.'''
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.moments.merge(other.moments)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _items(self):
+        '''Sorted retained items and their cumulative weights (cached until the next update).'''
+        if self._sorted is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(level.shape[0], 2.0 ** h) for h, level in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            self._sorted = items[order], np.cumsum(weights[order])
+        return self._sorted
+
+    def cdf(self, x):
+        '''Estimated fraction of observations <= x.'''
+        items, cum = self._items()
+        pos = np.searchsorted(items, np.asarray(x, dtype=np.float64), side="right")
+        total = cum[-1]
+        return np.where(pos > 0, cum[np.maximum(pos - 1, 0)] / total, 0.0)
+
+    __call__ = cdf
+
+    def quantile(self, q):
+        '''Estimated q-quantiles; the extremes q=0 and q=1 are the exact minimum and maximum.'''
+        items, cum = self._items()
+        q = np.asarray(q, dtype=np.float64)
+        pos = np.searchsorted(cum, q * cum[-1], side="left")
+        out = items[np.minimum(pos, items.shape[0] - 1)]
+        return np.where(q <= 0, self.min, np.where(q >= 1, self.max, out))
+
+    @property
+    def x(self):
+        '''Step points of the ECDF, with -inf first like statsmodels' ECDF.x.'''
+        return np.concatenate([[-np.inf], self._items()[0]])
+
+    @property
+    def y(self):
+        '''ECDF values at x, starting at 0 like statsmodels' ECDF.y.'''
+        cum = self._items()[1]
+        return np.concatenate([[0.0], cum / cum[-1]])
+
+    def describe(self, percentiles=(0.25, 0.5, 0.75)):
+        '''Summary like pd.Series.describe(): exact count, mean, std, min and max, sketched percentiles.'''
+        index = ["count", "mean", "std", "min"] + ["%g%%" % (100 * p) for p in percentiles] + ["max"]
+        values = [self.n, self.moments.means().iloc[0], self.moments.std().iloc[0], self.min]
+        values += list(self.quantile(percentiles)) + [self.max]
+        return pd.Series(values, index=index, dtype=np.float64)
@@ -0,0 +1,104 @@
+'''
+Stratified count and proportion tables in a single pass.
+
+The scripts build their tables with groupby([...]).size().unstack().fillna(0).apply(lambda x: x/x.sum(), axis=1),
+once per stratum (e.g. once per age band). Here every stratum column and the outcome are turned into integer codes,
+combined into one mixed-radix code per row and counted with a single np.bincount; row proportions are a
+broadcast division of the resulting array, so there is no Python-level apply.
+
+    counts, props = table(db, ["RIAGENDRx", "DMDEDUC2x"], "DMDMARTLx", bins={"RIDAGEYR": [40, 50, 60]})
+'''
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from nhanes.trace import traced
+
+StratifiedTable = namedtuple("StratifiedTable", ["counts", "proportions"])
+
+
+def codes(values):
+    '''
+    Integer codes (-1 for missing) and the matching labels of a column.
+
+    Categoricals reuse their category codes, anything else is factorized in sorted order.
+    '''
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return np.asarray(values.cat.codes), list(values.cat.categories)
+    code, uniques = pd.factorize(values, sort=True)
+    return code, list(uniques)
+
+
+def band_codes(values, edges):
+    '''Codes of the half-open bands [edges[i], edges[i+1]) for a numeric column (-1 outside all bands).'''
+    x = np.asarray(values, dtype=np.float64)
+    code = np.searchsorted(edges, x, side="right") - 1
+    code[np.isnan(x) | (code < 0) | (code >= len(edges) - 1)] = -1
+    labels = ["[%g, %g)" % (lo, hi) for lo, hi in zip(edges[:-1], edges[1:])]
+    return code, labels
+
+
+def stratum_counts(columns):
+    '''
+    Count the rows in every cell of the cross-classification of `columns`, a list of (codes, labels) pairs.
+
+    Rows with a missing code in any column are left out. Returns an integer array with one axis per column.
+    '''
+    shape = tuple(len(labels) for _, labels in columns)
+    combined = np.zeros(columns[0][0].shape[0], dtype=np.int64)
+    keep = np.ones(combined.shape[0], dtype=bool)
+    for (code, _), size in zip(columns, shape):
+        keep &= code >= 0
+        combined = combined * size + code
+    flat = np.bincount(combined[keep], minlength=int(np.prod(shape)))
+    return flat.reshape(shape)
+
+
+@traced("crosstab")
+def table(frame, strata, outcome, bins=None, observed=True):
+    '''
+    Counts and row proportions of `outcome` within every stratum of `strata`.
+
+    `bins` maps numeric columns to band edges; those columns become the leading strata, in the order given.
+    With observed=True empty strata and outcome levels are dropped, as groupby().size().unstack() does.
+    Returns StratifiedTable(counts, proportions), two DataFrames indexed by the strata with one column per
+    outcome level.
+    '''
+    if isinstance(strata, str):
+        strata = [strata]
+    names = []
+    columns = []
+    for col, edges in (bins or {}).items():
+        names.append(col)
+        columns.append(band_codes(frame[col], edges))
+    for col in strata:
+        names.append(col)
+        columns.append(codes(frame[col]))
+    columns.append(codes(frame[outcome]))
+
+    counts = stratum_counts(columns)
+    n_out = counts.shape[-1]
+    counts = counts.reshape(-1, n_out)
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        props = counts / totals
+
+    if len(names) == 1:
+        index = pd.Index(columns[0][1], name=names[0])
+    else:
+        index = pd.MultiIndex.from_product([labels for _, labels in columns[:-1]], names=names)
+    header = pd.Index(columns[-1][1], name=outcome)
+    counts = pd.DataFrame(counts, index=index, columns=header)
+    props = pd.DataFrame(props, index=index, columns=header)
+    if observed:
+        rows = totals[:, 0] > 0
+        cols = counts.to_numpy().sum(axis=0) > 0
+        counts = counts.loc[rows, cols]
+        props = props.loc[rows, cols]
+    return StratifiedTable(counts, props)
+
+
+def proportions(frame, strata, outcome, bins=None, observed=True):
+    '''Row proportions of `outcome` within every stratum of `strata`; see table().'''
+    return table(frame, strata, outcome, bins, observed).proportions
@@ -0,0 +1,165 @@
+'''
+Vectorized subsampling of a single column.
+
+FinalSamlingDistributions.py draws two disjoint subsamples of size m with da.sample(2*m), one replicate at a
+time, copying every NHANES column just to read one of them. Here all replicate index sets are drawn at once as a
+(replicates x 2m) integer matrix over a NumPy array of the needed column, and the statistic is reduced along the
+rows in one operation. Replicates are processed in blocks so memory stays bounded for very large replicate counts,
+counting the population-sized key rows that the dense draws need.
+'''
+import numpy as np
+
+from nhanes.trace import traced
+
+# Upper bound on the number of gathered values held in memory at once (replicates x subsample size)
+BLOCK_ELEMENTS = 1 << 22
+
+
+def as_rng(seed=None):
+    '''Return a numpy Generator from a seed, SeedSequence or an existing Generator.'''
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def subsample_indices(n, size, replicates, rng=None):
+    '''
+    Draw `replicates` simple random samples of `size` distinct positions out of range(n).
+
+    Returns an int matrix of shape (replicates, size); each row is an ordered sample without replacement,
+    so row[:m] and row[m:] are two disjoint random subsamples just like da.sample(2*m).iloc[:m] / .iloc[m:].
+    '''
+    rng = as_rng(rng)
+    if size > n:
+        raise ValueError("cannot draw %d distinct rows from %d" % (size, n))
+    dtype = np.int32 if n < 2 ** 31 else np.int64
+
+    if 2 * size > n:
+        # Dense case: one random key per population unit and row; the units with the `size` smallest keys form
+        # the sample, ordered by key. Only the selected keys are sorted (partial selection with argpartition).
+        keys = rng.random((replicates, n))
+        part = np.argpartition(keys, size - 1, axis=1)[:, :size]
+        order = np.argsort(np.take_along_axis(keys, part, axis=1), axis=1)
+        return np.take_along_axis(part, order, axis=1).astype(dtype)
+
+    # Sparse case: draw with replacement, then redraw every position that repeats an earlier one in its row.
+    # The rule only looks at equality, so the resulting row sets are uniform over all size-subsets; a final
+    # shuffle within each row makes the order (and therefore the split into halves) uniform as well.
+    idx = rng.integers(0, n, size=(replicates, size), dtype=dtype)
+    pos = np.arange(size, dtype=np.int64)
+    rows = np.arange(replicates)
+    while rows.size:
+        # Sort (value, position) pairs packed into one int64 key; equal values then sit next to each other
+        # with ascending positions, so every repeat after the first one in a run is a later duplicate.
+        key = np.sort(idx[rows].astype(np.int64) * size + pos, axis=1)
+        dup = (key[:, 1:] // size) == (key[:, :-1] // size)
+        hit_row, hit_col = np.nonzero(dup)
+        if hit_row.size == 0:
+            break
+        r = rows[hit_row]
+        idx[r, key[hit_row, hit_col + 1] % size] = rng.integers(0, n, size=r.size, dtype=dtype)
+        rows = np.unique(r)
+    return rng.permuted(idx, axis=1)
+
+
+def _per_replicate(n, size, replace=False):
+    '''
+    Values held in memory for each replicate while drawing `size` positions out of n: the dense case of
+    subsample_indices keeps one random key per population unit, not per drawn position.
+    '''
+    if not replace and 2 * size > n:
+        return n
+    return size
+
+
+def _blocks(replicates, size, block_size=None):
+    if block_size is None:
+        block_size = max(1, BLOCK_ELEMENTS // max(size, 1))
+    for start in range(0, replicates, block_size):
+        yield start, min(start + block_size, replicates)
+
+
+def gather(values, size, replicates, rng=None):
+    '''Gather `replicates` subsamples of `size` values as a (replicates, size) float array.'''
+    values = np.asarray(values, dtype=np.float64)
+    idx = subsample_indices(values.shape[0], size, replicates, rng)
+    return values[idx]
+
+
+def nanmean_rows(x):
+    '''Row means ignoring NaN, like pandas Series.mean(); rows that are all NaN give NaN.'''
+    mask = ~np.isnan(x)
+    count = mask.sum(axis=1)
+    total = np.where(mask, x, 0.0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+@traced("resample")
+def mean_difference(values, m, replicates=1000, seed=None, block_size=None):
+    '''
+    Sampling distribution of the difference between the means of two disjoint subsamples of size m.
+
+    Equivalent to repeating `dx = da.sample(2*m); dx.iloc[:m].col.mean() - dx.iloc[m:].col.mean()`
+    `replicates` times, with NaN values skipped in each mean as pandas does.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rng = as_rng(seed)
+    out = np.empty(replicates)
+    for start, stop in _blocks(replicates, _per_replicate(values.shape[0], 2 * m), block_size):
+        x = gather(values, 2 * m, stop - start, rng)
+        out[start:stop] = nanmean_rows(x[:, :m]) - nanmean_rows(x[:, m:])
+    return out
+
+
+def subsample_means(values, m, replicates=1000, seed=None, block_size=None):
+    '''Sampling distribution of the mean of a subsample of size m (NaN values skipped).'''
+    values = np.asarray(values, dtype=np.float64)
+    rng = as_rng(seed)
+    out = np.empty(replicates)
+    for start, stop in _blocks(replicates, _per_replicate(values.shape[0], m), block_size):
+        out[start:stop] = nanmean_rows(gather(values, m, stop - start, rng))
+    return out
+
+
+def pearson_rows(x, y):
+    '''
+    Pearson correlation of each row of x with the same row of y, from the sufficient statistics
+    (n, Σx, Σy, Σxy, Σx², Σy²) of the rows' complete pairs.
+
+    Pairs where either value is NaN are masked out, which matches calling .dropna() on the two columns
+    before np.corrcoef. Returns a flat array with one coefficient per row.
+    '''
+    mask = ~(np.isnan(x) | np.isnan(y))
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+    n = mask.sum(axis=1)
+    sx = x.sum(axis=1)
+    sy = y.sum(axis=1)
+    sxy = np.einsum("ij,ij->i", x, y)
+    sxx = np.einsum("ij,ij->i", x, x)
+    syy = np.einsum("ij,ij->i", y, y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cxy = sxy - sx * sy / n
+        cxx = sxx - sx * sx / n
+        cyy = syy - sy * sy / n
+        return cxy / np.sqrt(cxx * cyy)
+
+
+@traced("resample")
+def correlation_difference(x, y, m, replicates=1000, seed=None, block_size=None):
+    '''
+    Sampling distribution of the difference between the correlations of x and y in two disjoint subsamples
+    of size m, as a flat float array of length `replicates`.
+    '''
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    rng = as_rng(seed)
+    out = np.empty(replicates)
+    # x and y are both gathered, 4m values per replicate
+    for start, stop in _blocks(replicates, max(4 * m, _per_replicate(x.shape[0], 2 * m)), block_size):
+        idx = subsample_indices(x.shape[0], 2 * m, stop - start, rng)
+        gx = x[idx]
+        gy = y[idx]
+        out[start:stop] = pearson_rows(gx[:, :m], gy[:, :m]) - pearson_rows(gx[:, m:], gy[:, m:])
+    return out
@@ -0,0 +1,199 @@
+'''
+Design-based (survey-weighted) estimates for NHANES.
+
+NHANES is a stratified, clustered sample: every participant carries an interview weight (WTINT2YR), a masked
+variance stratum (SDMVSTRA) and a masked variance PSU (SDMVPSU) within that stratum. Point estimates here are
+weighted; standard errors come either from Taylor linearization or from replicate weights.
+
+Taylor linearization turns every estimate into a weighted total of per-row influence values; the influence values
+are summed per PSU with one np.add.at call and the between-PSU covariance is a single matrix product, so several
+estimates (all levels of a variable, all cells of a crosstab, all columns of a mean) share one pass. Replicate
+variants (delete-one-PSU jackknife, BRR) build the (rows x replicates) weight matrix once and evaluate every
+replicate with one matrix product.
+
+Strata with a single PSU contribute no variance (they are treated as certainty units).
+'''
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import hadamard
+
+from nhanes.stratified import codes
+from nhanes.trace import traced
+
+SurveyDesign = namedtuple("SurveyDesign", ["weights", "cluster", "cluster_stratum", "stratum_size"])
+Estimate = namedtuple("Estimate", ["estimate", "se"])
+
+
+def design(frame, weights="WTINT2YR", strata="SDMVSTRA", psu="SDMVPSU"):
+    '''Survey design of `frame` from its weight, stratum and PSU columns.'''
+    w = np.asarray(frame[weights], dtype=np.float64)
+    s_code, s_labels = codes(frame[strata])
+    p_code, p_labels = codes(frame[psu])
+    if (s_code < 0).any() or (p_code < 0).any() or np.isnan(w).any():
+        raise ValueError("design columns must not have missing values")
+    combined = s_code.astype(np.int64) * len(p_labels) + p_code
+    clusters, cluster = np.unique(combined, return_inverse=True)
+    cluster_stratum = clusters // len(p_labels)
+    stratum_size = np.bincount(cluster_stratum, minlength=len(s_labels))
+    return SurveyDesign(w, cluster, cluster_stratum, stratum_size)
+
+
+def design_covariance(des, z):
+    '''
+    Linearized covariance of the weighted totals of the columns of z, an (n, k) array of influence values.
+
+    Var = sum_h n_h / (n_h - 1) * sum_i (t_hi - mean_h t)(t_hi - mean_h t)', t_hi the PSU totals of w * z.
+    '''
+    z = np.asarray(z, dtype=np.float64)
+    if z.ndim == 1:
+        z = z[:, None]
+    totals = np.zeros((des.cluster_stratum.shape[0], z.shape[1]))
+    np.add.at(totals, des.cluster, des.weights[:, None] * z)
+
+    n_h = des.stratum_size.astype(np.float64)
+    stratum_sum = np.zeros((n_h.shape[0], z.shape[1]))
+    np.add.at(stratum_sum, des.cluster_stratum, totals)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stratum_mean = stratum_sum / n_h[:, None]
+        factor = np.where(n_h > 1, n_h / (n_h - 1), 0.0)
+    d = (totals - stratum_mean[des.cluster_stratum]) * np.sqrt(factor[des.cluster_stratum])[:, None]
+    return d.T @ d
+
+
+def _ratio_means(des, values, present):
+    '''Weighted means of the columns of `values` over the rows where `present`, with their influence values.'''
+    w = des.weights[:, None] * present
+    total_w = w.sum(axis=0)
+    est = (w * values).sum(axis=0) / total_w
+    z = present * (values - est) / total_w
+    return est, z
+
+
+def _matrix(frame, columns):
+    x = np.column_stack([np.asarray(frame[c], dtype=np.float64) for c in columns])
+    present = ~np.isnan(x)
+    return np.where(present, x, 0.0), present
+
+
+def mean(des, frame, columns):
+    '''Weighted means of numeric columns with linearized standard errors (missing values are a domain).'''
+    if isinstance(columns, str):
+        columns = [columns]
+    x, present = _matrix(frame, columns)
+    est, z = _ratio_means(des, x, present)
+    se = np.sqrt(np.diag(design_covariance(des, z)))
+    return pd.DataFrame({"estimate": est, "se": se}, index=pd.Index(columns))
+
+
+def _indicators(frame, columns):
+    '''One-hot matrix of the joint levels of `columns`, plus the level labels and a row-present mask.'''
+    parts = [codes(frame[c]) for c in columns]
+    shape = [len(labels) for _, labels in parts]
+    combined = np.zeros(len(frame), dtype=np.int64)
+    present = np.ones(len(frame), dtype=bool)
+    for (code, _), size in zip(parts, shape):
+        present &= code >= 0
+        combined = combined * size + code
+    onehot = np.zeros((len(frame), int(np.prod(shape))))
+    onehot[np.flatnonzero(present), combined[present]] = 1.0
+    if len(columns) == 1:
+        index = pd.Index(parts[0][1], name=columns[0])
+    else:
+        index = pd.MultiIndex.from_product([labels for _, labels in parts], names=columns)
+    return onehot, index, present
+
+
+def proportion(des, frame, column):
+    '''Weighted proportions of the levels of a categorical column with linearized standard errors.'''
+    onehot, index, present = _indicators(frame, [column])
+    est, z = _ratio_means(des, onehot, np.repeat(present[:, None], onehot.shape[1], axis=1))
+    se = np.sqrt(np.diag(design_covariance(des, z)))
+    return pd.DataFrame({"estimate": est, "se": se}, index=index)
+
+
+@traced("crosstab")
+def crosstab(des, frame, row, col):
+    '''
+    Weighted joint cell proportions of two categorical columns, with linearized standard errors.
+
+    Returns Estimate(estimate, se), two DataFrames shaped like pd.crosstab(frame[row], frame[col], normalize=True).
+    '''
+    onehot, index, present = _indicators(frame, [row, col])
+    est, z = _ratio_means(des, onehot, np.repeat(present[:, None], onehot.shape[1], axis=1))
+    se = np.sqrt(np.diag(design_covariance(des, z)))
+    rows, cols = index.get_level_values(0).unique(), index.get_level_values(1).unique()
+    shape = (len(rows), len(cols))
+    est = pd.DataFrame(est.reshape(shape), index=rows, columns=cols)
+    se = pd.DataFrame(se.reshape(shape), index=rows, columns=cols)
+    return Estimate(est, se)
+
+
+def correlation(des, frame, x, y):
+    '''Weighted Pearson correlation of two columns (complete pairs) with a linearized standard error.'''
+    xy, present = _matrix(frame, [x, y])
+    both = present.all(axis=1)
+    a, b = xy[:, 0], xy[:, 1]
+    moments = np.column_stack([a, b, a * a, b * b, a * b])
+    m, z = _ratio_means(des, moments, np.repeat(both[:, None], 5, axis=1))
+    vx = m[2] - m[0] ** 2
+    vy = m[3] - m[1] ** 2
+    cxy = m[4] - m[0] * m[1]
+    r = cxy / np.sqrt(vx * vy)
+    # Gradient of r = cxy / sqrt(vx vy) with respect to (E x, E y, E x^2, E y^2, E xy)
+    grad = np.array([
+        (-m[1] + r * m[0] * np.sqrt(vy / vx)) / np.sqrt(vx * vy),
+        (-m[0] + r * m[1] * np.sqrt(vx / vy)) / np.sqrt(vx * vy),
+        -r / (2 * vx),
+        -r / (2 * vy),
+        1 / np.sqrt(vx * vy),
+    ])
+    se = np.sqrt(grad @ design_covariance(des, z) @ grad)
+    return Estimate(float(r), float(se))
+
+
+def replicate_weights(des, method="jackknife"):
+    '''
+    Replicate weight matrix of shape (rows, replicates) and the variance multiplier of each replicate.
+
+    method="jackknife" deletes one PSU at a time and reweights the rest of its stratum by n_h / (n_h - 1);
+    method="brr" halves every stratum (two PSUs per stratum required) following a Hadamard matrix.
+    '''
+    n_clusters = des.cluster_stratum.shape[0]
+    if method == "jackknife":
+        n_h = des.stratum_size[des.cluster_stratum].astype(np.float64)
+        keep = n_h > 1
+        with np.errstate(divide="ignore"):
+            inflate = np.where(keep, n_h / (n_h - 1), 1.0)
+        # factor[c, r]: weight multiplier of PSU c in the replicate that deletes PSU r
+        same = des.cluster_stratum[:, None] == des.cluster_stratum[None, :]
+        factor = np.where(same, inflate[None, :], 1.0)
+        factor[np.arange(n_clusters), np.arange(n_clusters)] = 0.0
+        factor = factor[:, keep]
+        scale = ((n_h - 1) / n_h)[keep]
+    elif method == "brr":
+        if (des.stratum_size != 2).any():
+            raise ValueError("BRR needs exactly two PSUs in every stratum")
+        n_strata = des.stratum_size.shape[0]
+        order = 1 << int(np.ceil(np.log2(n_strata + 1)))
+        signs = hadamard(order)[1:n_strata + 1].T  # (replicates, strata)
+        first = np.r_[True, des.cluster_stratum[1:] != des.cluster_stratum[:-1]]
+        half = np.where(first, 1, -1)  # +1 for the first PSU of a stratum, -1 for the second
+        factor = (1 + signs[:, des.cluster_stratum] * half[None, :]).T.astype(np.float64)
+        scale = np.full(order, 1.0 / order)
+    else:
+        raise ValueError("unknown replicate method %r" % method)
+    return des.weights[:, None] * factor[des.cluster], scale
+
+
+def replicate_mean(des, frame, columns, method="jackknife"):
+    '''Weighted means of numeric columns with replicate-weight standard errors (one batched matrix product).'''
+    if isinstance(columns, str):
+        columns = [columns]
+    x, present = _matrix(frame, columns)
+    rw, scale = replicate_weights(des, method)
+    full = (des.weights @ (x * present)) / (des.weights @ present)
+    reps = (rw.T @ (x * present)) / (rw.T @ present)
+    se = np.sqrt(scale @ (reps - full) ** 2)
+    return pd.DataFrame({"estimate": full, "se": se}, index=pd.Index(columns))
@@ -0,0 +1,243 @@
+'''
+Per-stage instrumentation: wall time, CPU time, peak memory and row counts of named spans.
+
+The stages of the scripts (load, recode, filter, crosstab, correlation, resampling, plot) are wrapped as spans
+in the nhanes modules that implement them, either with the traced decorator or the span context manager:
+
+    @traced("crosstab")
+    def table(frame, strata, outcome, ...): ...
+
+    with span("load.parse_csv") as s:
+        frame = _parse(path)
+        s.rows_out = len(frame)
+
+A span records its wall time (perf_counter), CPU time (process_time), the growth of the process's peak RSS and,
+when memory tracing is on, the peak of Python/numpy allocations above the level at entry (tracemalloc, which
+slows allocation-heavy code down, so it is opt-in). The decorator takes the input row count from the first
+argument and the output row count from the result when they are arrays or frames. Spans nest; the finished
+spans form the trace, exportable as JSON or as a Chrome trace (chrome://tracing, Perfetto).
+
+Tracing is off by default and a disabled span costs one flag check. Turn it on with enable(), or for a whole
+run with the environment variable NHANES_TRACE=1 (NHANES_TRACE=memory also traces allocations), which writes
+nhanes-trace-<pid>.json and .chrome.json to NHANES_TRACE_DIR (default: the working directory) at exit:
+
+    NHANES_TRACE=1 python week4/FinalSamlingDistributions.py
+    python -m nhanes.report --trace          # one trace per report task
+'''
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_state = threading.local()
+_lock = threading.Lock()
+
+enabled = False
+memory = False
+spans = []
+_origin = time.perf_counter()
+
+
+def _max_rss():
+    '''Peak resident set size of the process in bytes (0 where it cannot be read).'''
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _rows(value):
+    '''Row count of an array, Series or DataFrame; None for anything else.'''
+    shape = getattr(value, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+def _stack():
+    stack = getattr(_state, "stack", None)
+    if stack is None:
+        stack = _state.stack = []
+    return stack
+
+
+class Span:
+    '''One timed stage; set rows_in / rows_out or add to args inside the with block.'''
+
+    __slots__ = ("name", "args", "rows_in", "rows_out", "start", "wall", "cpu", "rss_growth", "rss_peak",
+                 "mem_peak", "depth", "thread", "_cpu0", "_rss0", "_mem0", "_child_peak")
+
+    def __init__(self, name, rows_in=None, **args):
+        self.name = name
+        self.args = args
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.mem_peak = None
+
+    def __enter__(self):
+        stack = _stack()
+        self.depth = len(stack)
+        self.thread = threading.get_ident()
+        if memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+            tracemalloc.reset_peak()
+            self._mem0 = current
+            self._child_peak = current
+        stack.append(self)
+        self._rss0 = _max_rss()
+        self._cpu0 = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = time.process_time() - self._cpu0
+        self.rss_peak = _max_rss()
+        self.rss_growth = self.rss_peak - self._rss0
+        stack = _stack()
+        stack.pop()
+        if memory and tracemalloc.is_tracing() and hasattr(self, "_mem0"):
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            self.mem_peak = peak - self._mem0
+            if stack:
+                stack[-1]._child_peak = max(stack[-1]._child_peak, peak)
+        with _lock:
+            spans.append(self)
+        return False
+
+    def record(self):
+        '''The span as a JSON serialisable dict; times in seconds since the trace started, memory in bytes.'''
+        return {"name": self.name, "start": self.start - _origin, "wall": self.wall, "cpu": self.cpu,
+                "rows_in": self.rows_in, "rows_out": self.rows_out, "rss_growth": self.rss_growth,
+                "rss_peak": self.rss_peak, "mem_peak": self.mem_peak, "depth": self.depth, "thread": self.thread,
+                "args": self.args}
+
+
+class _NullSpan:
+    '''Stand-in returned while tracing is off; accepts the same attribute writes and does nothing.'''
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+def span(name, rows_in=None, **args):
+    '''Context manager timing the stage `name` (a no-op while tracing is off).'''
+    if not enabled:
+        return _NULL
+    return Span(name, rows_in, **args)
+
+
+def traced(name=None):
+    '''Decorator running every call of the function in a span (named after the function by default).'''
+    def wrap(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Span(label, _rows(args[0]) if args else None) as s:
+                result = func(*args, **kwargs)
+                s.rows_out = _rows(result)
+            return result
+        return wrapper
+    return wrap
+
+
+def enable(trace_memory=False):
+    '''Start recording spans; with trace_memory=True also trace allocations with tracemalloc.'''
+    global enabled, memory
+    enabled = True
+    memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global enabled, memory
+    enabled = False
+    if memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    memory = False
+
+
+def reset():
+    '''Forget the recorded spans and restart the trace clock.'''
+    global _origin
+    with _lock:
+        del spans[:]
+    _origin = time.perf_counter()
+
+
+def records():
+    '''Recorded spans as dicts, in start order.'''
+    with _lock:
+        done = list(spans)
+    return [s.record() for s in sorted(done, key=lambda s: s.start)]
+
+
+def summary():
+    '''{name: {"calls", "wall", "cpu", "rows_in", "mem_peak"}} totals over the spans of each stage.'''
+    out = {}
+    for r in records():
+        total = out.setdefault(r["name"], {"calls": 0, "wall": 0.0, "cpu": 0.0, "rows_in": 0, "mem_peak": None})
+        total["calls"] += 1
+        total["wall"] += r["wall"]
+        total["cpu"] += r["cpu"]
+        total["rows_in"] += r["rows_in"] or 0
+        if r["mem_peak"] is not None:
+            total["mem_peak"] = max(total["mem_peak"] or 0, r["mem_peak"])
+    return out
+
+
+def save_json(path):
+    '''Write the spans and the per-stage summary as JSON.'''
+    with open(path, "w") as f:
+        json.dump({"pid": os.getpid(), "spans": records(), "summary": summary()}, f, indent=1)
+
+
+def save_chrome(path):
+    '''Write the spans in Chrome trace event format: complete ("X") events in microseconds.'''
+    pid = os.getpid()
+    events = []
+    for r in records():
+        args = {k: r[k] for k in ("cpu", "rows_in", "rows_out", "rss_growth", "mem_peak") if r[k] is not None}
+        args.update(r["args"])
+        events.append({"name": r["name"], "ph": "X", "ts": r["start"] * 1e6, "dur": r["wall"] * 1e6,
+                       "pid": pid, "tid": r["thread"], "args": args})
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _save_at_exit(directory):
+    if spans:
+        base = os.path.join(directory, "nhanes-trace-%d" % os.getpid())
+        save_json(base + ".json")
+        save_chrome(base + ".chrome.json")
+
+
+_env = os.environ.get("NHANES_TRACE", "")
+if _env and _env != "0":
+    enable(trace_memory=_env == "memory")
+    atexit.register(_save_at_exit, os.environ.get("NHANES_TRACE_DIR", os.getcwd()))
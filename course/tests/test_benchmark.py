@@ -0,0 +1,38 @@
+from nhanes import benchmark
+from nhanes.benchmark import CASES, Timing, previous, read_history, regressions, run, select
+
+
+def test_every_case_has_a_baseline():
+    assert all(c.baseline is not None for c in CASES.values())
+
+
+def test_run_records_case_and_baseline(tmp_path):
+    history = str(tmp_path / "history.jsonl")
+    results = run(["tables.crosstab", "tables.proportions"], repeat=1, history_path=history, report=None)
+    assert [t.case for t in results] == ["tables.crosstab", "tables.proportions"]
+    for t in results:
+        assert t.best > 0 and t.baseline > 0 and t.peak_bytes > 0
+        assert benchmark.speedup(t) == t.baseline / t.best
+    runs = read_history(history)
+    assert len(runs) == 1 and runs[0]["results"][0]["baseline"] == results[0].baseline
+
+
+def test_no_baseline(tmp_path):
+    results = run(["tables.crosstab"], repeat=1, history_path=str(tmp_path / "h"), save=False, report=None,
+                  baseline_repeat=0)
+    assert results[0].baseline is None and benchmark.speedup(results[0]) is None
+
+
+def test_regressions():
+    last = previous([{"results": [{"case": "a", "scale": 1, "best": 1.0}]}])
+    fine = Timing("a", 1, 1.1, 1.1, 1, 0, 5.0)
+    slower_than_before = Timing("a", 1, 1.5, 1.5, 1, 0, 5.0)
+    slower_than_baseline = Timing("b", 1, 2.0, 2.0, 1, 0, 1.0)
+    assert regressions([fine, slower_than_before, slower_than_baseline], last) == [slower_than_before,
+                                                                                   slower_than_baseline]
+
+
+def test_select():
+    assert select(["subsampling.mean*"]) == ["subsampling.mean_difference.m100", "subsampling.mean_difference.m400"]
+    assert select(["crosstab"]) == ["tables.crosstab"]
+    assert select() == list(CASES)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import bootstrap, subsampling
+from nhanes.bootstrap import _jackknife, bootstrap as run_bootstrap, subsample
+from nhanes.subsampling import nanmean_rows
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"a": rng.lognormal(0, 0.5, 300), "b": rng.normal(5, 2, 300)})
+
+
+def test_worker_count_does_not_change_the_replicates(frame):
+    one = run_bootstrap(frame, np.mean, columns=["a"], replicates=1000, seed=7, workers=1)
+    four = run_bootstrap(frame, np.mean, columns=["a"], replicates=1000, seed=7, workers=4)
+    np.testing.assert_array_equal(one.replicates, four.replicates)
+    assert one.bca_ci == four.bca_ci
+
+
+def test_vectorized_statistic_gives_the_same_replicates(frame):
+    loop = subsample(frame, np.mean, 50, columns=["a"], replicates=600, seed=1)
+    vec = subsample(frame, nanmean_rows, 50, columns=["a"], replicates=600, seed=1, vectorized=True)
+    np.testing.assert_allclose(loop.replicates, vec.replicates)
+    assert loop.bca_ci is None
+
+
+def test_bootstrap_of_the_mean(frame):
+    res = run_bootstrap(frame, nanmean_rows, columns=["b"], replicates=4000, seed=2, vectorized=True)
+    se = frame.b.std() / np.sqrt(len(frame))
+    assert res.estimate == pytest.approx(frame.b.mean())
+    assert res.replicates.std() == pytest.approx(se, rel=0.1)
+    lo, hi = res.percentile_ci
+    assert lo == pytest.approx(frame.b.mean() - 1.96 * se, abs=0.3 * se)
+    assert hi == pytest.approx(frame.b.mean() + 1.96 * se, abs=0.3 * se)
+    # For a symmetric statistic BCa barely moves the percentile interval
+    np.testing.assert_allclose(res.bca_ci, res.percentile_ci, atol=0.3 * se)
+
+
+def test_multi_column_statistic(frame):
+    corr = lambda x: np.corrcoef(x[:, 0], x[:, 1])[0, 1]
+    res = run_bootstrap(frame, corr, columns=["a", "b"], replicates=300, seed=3)
+    assert res.estimate == pytest.approx(frame.a.corr(frame.b))
+    assert res.replicates.shape == (300,)
+
+
+def test_jackknife_vectorized_matches_loop(frame):
+    x = frame.a.to_numpy()
+    np.testing.assert_allclose(_jackknife(x, nanmean_rows, True), _jackknife(x, np.mean, False))
+
+
+def test_in_process_run_keeps_no_reference_to_the_data(frame):
+    run_bootstrap(frame, np.mean, columns=["a"], replicates=300, seed=4, workers=1)
+    assert bootstrap._worker_data is None and bootstrap._worker_statistic is None
+
+
+def test_tasks_gather_in_blocks(frame, monkeypatch):
+    # 300 values of one column per bootstrap resample: 1000 gathered values hold 3 resamples
+    monkeypatch.setattr(subsampling, "BLOCK_ELEMENTS", 1000)
+    shapes = []
+    mean = lambda x: shapes.append(x.shape) or nanmean_rows(x)
+    res = run_bootstrap(frame, mean, columns=["a"], replicates=20, seed=5, vectorized=True)
+    assert shapes[:7] == [(3, 300)] * 6 + [(2, 300)]
+    assert res.replicates.shape == (20,) and not np.isnan(res.replicates).any()
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.codebook import CODEBOOK, categories, category_codes, recode
+from nhanes.loader import DATA_PATH
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return pd.read_csv(DATA_PATH)
+
+
+def test_recode_matches_series_replace(raw):
+    # The relabelling of week3/AnalysisOfMultivariateData.py, which used Series.replace on the raw codes
+    education = {1: "<9", 2: "9-11", 3: "HS/GED", 4: "Some college/AA", 5: "College", 7: "Refused", 9: "Don't know"}
+    for col, mapping in [("DMDEDUC2", education), ("RIAGENDR", {1: "Male", 2: "Female"})]:
+        expected = raw[col].replace(mapping)
+        got = pd.Series(recode(raw[col].to_numpy(), col)).astype(object)
+        assert got.isna().tolist() == expected.isna().tolist()
+        assert (got[expected.notna()] == expected[expected.notna()]).all()
+
+
+def test_every_coded_column_is_labelled(raw):
+    for col in CODEBOOK:
+        values = recode(raw[col].to_numpy(), col)
+        assert list(values.categories) == categories(col)
+        assert (pd.isna(values) == raw[col].isna()).all()
+
+
+def test_codes_follow_code_order():
+    np.testing.assert_array_equal(category_codes([77, 1, np.nan, 6, 99], "DMDMARTL"), [6, 0, -1, 5, 7])
+    assert categories("DMDMARTL")[0] == "Married"
+
+
+def test_unknown_codes_raise():
+    with pytest.raises(ValueError, match="8"):
+        category_codes([1, 8], "DMDEDUC2")
+    with pytest.raises(ValueError):
+        category_codes([1.5], "RIAGENDR")
+    with pytest.raises(ValueError):
+        category_codes([-1, 1000], "RIAGENDR")
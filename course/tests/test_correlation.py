@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import correlation
+from nhanes.correlation import ALL, CorrelationStore, build, numeric_columns
+from nhanes.loader import load
+
+BP = ["BPXSY1", "BPXSY2", "BPXDI1", "BPXDI2"]
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load()
+
+
+@pytest.fixture(scope="module")
+def store(da):
+    return build(da, by="RIAGENDR")
+
+
+def numeric(frame, columns):
+    return frame[columns].astype(np.float64)
+
+
+def test_matches_dataframe_corr(da, store):
+    columns = numeric_columns(da)
+    assert "SEQN" not in columns and "RIAGENDR" not in columns
+    expected = numeric(da, columns).corr()
+    pd.testing.assert_frame_equal(store.corr(), expected, rtol=1e-10)
+    pd.testing.assert_frame_equal(store.cov(BP), numeric(da, BP).cov(), rtol=1e-10)
+    pd.testing.assert_frame_equal(store.corr(["BMXLEG", "BMXARML"]),
+                                  numeric(da, ["BMXLEG", "BMXARML"]).dropna().corr(), rtol=1e-10)
+
+
+def test_strata_match_groupby(da, store):
+    for label, group in da.groupby("RIAGENDR", observed=True):
+        pd.testing.assert_frame_equal(store.corr(BP, stratum=label), numeric(group, BP).corr(), rtol=1e-10)
+    with pytest.raises(KeyError):
+        store.corr(BP, stratum="Other")
+
+
+def test_counts_are_complete_pairs(da, store):
+    n = store.count(["BPXSY1", "BMXBMI"])
+    assert n.loc["BPXSY1", "BMXBMI"] == (da.BPXSY1.notna() & da.BMXBMI.notna()).sum()
+    assert n.loc["BPXSY1", "BPXSY1"] == da.BPXSY1.notna().sum()
+
+
+def test_blocks_and_round_trip(da, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(correlation, "BLOCK_ROWS", 1000)
+    blocked = build(da, BP)
+    pd.testing.assert_frame_equal(blocked.corr(), store.corr(BP), rtol=1e-10)
+    path = str(tmp_path / "store.npz")
+    store.save(path)
+    loaded = CorrelationStore.load(path)
+    assert list(loaded.strata) == [ALL, "Male", "Female"]
+    pd.testing.assert_frame_equal(loaded.corr(stratum="Female"), store.corr(stratum="Female"))
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.cube import build
+from nhanes.loader import load
+
+COLUMNS = ["BMXLEG", "BMXARML", "BMXBMI"]
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load()
+
+
+@pytest.fixture(scope="module")
+def cube(da):
+    return build(da, COLUMNS)
+
+
+def numeric(frame):
+    return frame[COLUMNS].astype(np.float64)
+
+
+def test_whole_sample(da, cube):
+    whole = cube.slice()
+    np.testing.assert_allclose(whole.means(), numeric(da).mean(), rtol=1e-12)
+    np.testing.assert_allclose(whole.std(), numeric(da).std(), rtol=1e-10)
+    pd.testing.assert_frame_equal(whole.corr(), numeric(da).corr(), rtol=1e-10)
+    pd.testing.assert_frame_equal(whole.cov(), numeric(da).cov(), rtol=1e-10)
+
+
+def test_slices_match_boolean_filters(da, cube):
+    female = da[da.RIAGENDR == "Female"]
+    pd.testing.assert_frame_equal(cube.slice(RIAGENDR="Female").corr(), numeric(female).corr(), rtol=1e-10)
+    age = da.RIDAGEYR
+    sub = da[(da.RIAGENDR == "Male") & (age >= 40) & (age < 60)]
+    got = cube.slice(RIAGENDR="Male", RIDAGEYR=["[40, 50)", "[50, 60)"])
+    np.testing.assert_allclose(got.means(), numeric(sub).mean(), rtol=1e-12)
+    np.testing.assert_array_equal(got.count(), numeric(sub).count())
+
+
+def test_facets_match_groupby(da, cube):
+    grouped = da.groupby(["RIAGENDR", "RIDRETH1"], observed=True)
+    expected = grouped[["BMXLEG", "BMXARML"]].apply(lambda g: g.astype(np.float64).corr().iloc[0, 1])
+    got = cube.corr("BMXLEG", "BMXARML", keep=["RIAGENDR", "RIDRETH1"])
+    assert got.shape == (10,)
+    np.testing.assert_allclose(got.loc[expected.index], expected, rtol=1e-10)
+
+    grouped = numeric(da).groupby(da.DMDEDUC2, observed=True)
+    expected = grouped.mean()
+    got = cube.mean(["DMDEDUC2"])
+    np.testing.assert_allclose(got.loc[expected.index].to_numpy(), expected.to_numpy(), rtol=1e-12)
+    counts = cube.count(["DMDEDUC2"]).loc[expected.index]
+    np.testing.assert_array_equal(counts.to_numpy(), grouped.count())
+
+
+def test_missing_levels(da, cube):
+    # Rows without an education answer stay in the roll-ups through the NA level
+    missing = da[da.DMDEDUC2.isna()]
+    np.testing.assert_allclose(cube.slice(DMDEDUC2="NA").means(), numeric(missing).mean(), rtol=1e-12)
+    assert "NA" not in cube.mean(["DMDEDUC2"]).index
+    with pytest.raises(KeyError):
+        cube.slice(BPXSY1=1)
+
+
+def test_strata_far_from_the_overall_mean():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, 2000)
+    frame = pd.DataFrame({"g": np.repeat(["a", "b"], 1000), "x": x + np.repeat([0, 1e8], 1000), "y": x})
+    cube = build(frame, ["x", "y"], dims=["g"], bands={})
+    far = cube.slice(g="b")
+    np.testing.assert_allclose(far.std(), [x[1000:].std(ddof=1)] * 2, rtol=1e-7)
+    assert abs(far.corr().loc["x", "y"] - 1) < 1e-9
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import derived
+from nhanes.derived import DerivedFrame
+from nhanes.loader import load
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load(["BPXSY1", "BPXSY2", "RIDAGEYR", "RIAGENDR", "DMDMARTL"])
+
+
+def listed(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def test_course_definitions_match_the_scripts(da):
+    dv = DerivedFrame(da)
+    # The scripts: da['sys1log'] = np.log(da.BPXSY1.dropna()), aligned back on the index
+    expected = da.assign(sys1log=np.log(da.BPXSY1.dropna())).sys1log
+    pd.testing.assert_series_equal(dv.sys1log, expected)
+    np.testing.assert_array_equal(dv.bpxsy_diff, da.BPXSY2.astype(np.float64) - da.BPXSY1.astype(np.float64))
+    cut = pd.cut(da.RIDAGEYR, [18, 30, 40, 50, 60, 70, 80])
+    np.testing.assert_array_equal(dv.agegrp.cat.codes, cut.cat.codes)
+    assert dv.agegrp.cat.categories[0] == "(18, 30]"
+    assert dv.RIAGENDRx.equals(da.RIAGENDR.rename("RIAGENDRx"))
+
+
+def test_frame_and_with_columns(da):
+    dv = DerivedFrame(da)
+    frame = dv.frame(["sys1log", "BPXSY1"])
+    assert list(frame.columns) == ["sys1log", "BPXSY1"]
+    full = dv.with_columns("agegrp", "BPXSY1")
+    assert list(full.columns) == list(da.columns) + ["agegrp"]
+
+
+def test_recode_with_mapping(da):
+    registry = {}
+    derived.recode("married", "DMDMARTL", {"Married": "Yes", "Living w/partner": "Yes", "Never married": "No"},
+                   registry=registry)
+    got = DerivedFrame(da, registry).married
+    expected = da.DMDMARTL.map({"Married": "Yes", "Living w/partner": "Yes", "Never married": "No"})
+    assert list(got.cat.categories) == ["Yes", "No"]
+    assert listed(got) == listed(expected)
+
+
+def test_computed_once_and_cached(da):
+    calls = []
+    registry = {}
+    derived.define("double", ["BPXSY1"], lambda x: calls.append(1) or np.asarray(x, dtype=np.float64) * 2,
+                   registry=registry)
+    dv = DerivedFrame(da, registry)
+    first = dv.double
+    first[0] = -1.0  # copy-on-write: the cache never sees this
+    second = dv["double"]
+    assert len(calls) == 1 and second[0] == 2 * da.BPXSY1[0]
+    dv.invalidate()
+    dv.double
+    assert len(calls) == 2
+
+
+def test_budget_evicts_least_recently_used(da):
+    size = DerivedFrame(da).sys1log.nbytes
+    dv = DerivedFrame(da, budget=2 * size)
+    dv.sys1log, dv.sys2log, dv.sys1log, dv.bpxsy_diff
+    assert dv.cached() == ["sys1log", "bpxsy_diff"]
+    assert dv.nbytes == 2 * size
+    with pytest.raises(AttributeError):
+        dv.nonexistent
@@ -0,0 +1,82 @@
+import operator
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.index import RowSet, TableIndex
+from nhanes.loader import load
+
+OPERATORS = [operator.gt, operator.ge, operator.lt, operator.le, operator.eq, operator.ne]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return load(["BMXWAIST", "BMXLEG", "RIDAGEYR", "RIAGENDR", "DMDEDUC2"])
+
+
+def expected(mask):
+    return np.flatnonzero(np.asarray(pd.array(mask, dtype="boolean").fillna(False), dtype=bool))
+
+
+@pytest.mark.parametrize("op", OPERATORS)
+@pytest.mark.parametrize("column, value", [("BMXWAIST", 98.3), ("BMXWAIST", 98.30000001), ("BMXLEG", 32),
+                                           ("RIDAGEYR", 60), ("RIDAGEYR", 59.5)])
+def test_sorted_index_matches_pandas(frame, op, column, value):
+    # Missing values never match, also for != (where pandas counts NaN as unequal)
+    ix = TableIndex(frame)
+    mask = op(frame[column], value) & frame[column].notna()
+    np.testing.assert_array_equal(op(ix[column], value).positions(), expected(mask))
+
+
+def test_float32_equality(frame):
+    # The probe is rounded to float32 like the pandas comparison, so the rows equal to 98.3 are found
+    ix = TableIndex(frame)
+    assert len(ix["BMXWAIST"] == 98.3) == (frame.BMXWAIST == 98.3).sum() > 0
+
+
+def test_median_isin_between(frame):
+    ix = TableIndex(frame)
+    assert ix["BMXWAIST"].median() == frame.BMXWAIST.median()
+    np.testing.assert_array_equal(ix["RIDAGEYR"].isin([30, 40]).positions(),
+                                  expected(frame.RIDAGEYR.isin([30, 40])))
+    for inclusive in ("both", "left", "right", "neither"):
+        np.testing.assert_array_equal(ix["BMXLEG"].between(30, 40, inclusive).positions(),
+                                      expected(frame.BMXLEG.between(30, 40, inclusive)))
+
+
+def test_bitmap_index_matches_pandas(frame):
+    ix = TableIndex(frame)
+    np.testing.assert_array_equal((ix["RIAGENDR"] == "Male").positions(), expected(frame.RIAGENDR == "Male"))
+    np.testing.assert_array_equal((ix["DMDEDUC2"] != "College").positions(), expected((frame.DMDEDUC2 != "College") & frame.DMDEDUC2.notna()))
+    np.testing.assert_array_equal(ix["DMDEDUC2"].notna().positions(), expected(frame.DMDEDUC2.notna()))
+
+
+def test_combinations(frame):
+    ix = TableIndex(frame)
+    waist = ix["BMXWAIST"] > ix["BMXWAIST"].median()
+    leg = ix["BMXLEG"] < 32
+    male = ix["RIAGENDR"] == "Male"
+    w = frame.BMXWAIST > frame.BMXWAIST.median()
+    g = frame.BMXLEG < 32
+    m = frame.RIAGENDR == "Male"
+    for rows, mask in [(waist & leg, w & g), (waist | leg, w | g), (waist & male, w & m), (male & leg, m & g),
+                       (~waist, ~w.fillna(False)), (male | leg, m | g), (waist & ~male, w & ~m)]:
+        np.testing.assert_array_equal(rows.positions(), expected(mask))
+        assert len(rows) == len(expected(mask))
+    assert len(ix.all()) == len(frame)
+
+
+def test_rowset_sparse_and_dense_agree():
+    rng = np.random.default_rng(0)
+    n = 1003
+    a = np.unique(rng.integers(0, n, 300))
+    b = np.unique(rng.integers(0, n, 300))
+    sparse_a, sparse_b = RowSet.from_positions(a, n), RowSet.from_positions(b, n)
+    dense_a, dense_b = RowSet(n, bits=sparse_a.bits), RowSet(n, bits=sparse_b.bits)
+    for x, y in [(sparse_a, sparse_b), (sparse_a, dense_b), (dense_a, sparse_b), (dense_a, dense_b)]:
+        np.testing.assert_array_equal((x & y).positions(), np.intersect1d(a, b))
+        np.testing.assert_array_equal((x | y).positions(), np.union1d(a, b))
+        np.testing.assert_array_equal((~x).positions(), np.setdiff1d(np.arange(n), a))
+    empty = RowSet.from_positions([], n)
+    assert len(empty & sparse_a) == len(sparse_a & empty) == len(empty & dense_a) == 0
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import loader
+from nhanes.loader import CACHE_DIRNAME, build_cache, cache_dir, columns, load
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / "sample.csv"
+    pd.DataFrame({"SEQN": [1, 2, 3, 4], "BPXSY1": [120.0, np.nan, 131.0, 99.0],
+                  "RIAGENDR": [1, 2, 2, 1], "note": [0.5, 1.5, 2.5, 3.5]}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+    parse = loader._parse
+
+    def counting(path):
+        calls.append(path)
+        return parse(path)
+    monkeypatch.setattr(loader, "_parse", counting)
+    return calls
+
+
+def test_parses_once(csv, parses):
+    first = load(path=csv)
+    second = load(path=csv)
+    assert len(parses) == 1
+    pd.testing.assert_frame_equal(first, second)
+    raw = pd.read_csv(csv)
+    np.testing.assert_array_equal(first.BPXSY1.to_numpy(dtype=np.float64), raw.BPXSY1.to_numpy())
+    assert list(first.RIAGENDR) == ["Male", "Female", "Female", "Male"]
+    assert columns(csv) == list(raw.columns)
+
+
+def test_only_requested_columns(csv):
+    frame = load(["note", "SEQN"], path=csv)
+    assert list(frame.columns) == ["note", "SEQN"]
+    with pytest.raises(KeyError):
+        load(["BPXSY2"], path=csv)
+
+
+def test_modifying_the_frame_leaves_the_cache_alone(csv):
+    frame = load(path=csv)
+    frame.loc[0, "BPXSY1"] = -1.0
+    frame["note"] *= 2
+    again = load(path=csv)
+    assert again.BPXSY1[0] == 120.0 and again.note[0] == 0.5
+    assert load(path=csv, mmap=False).equals(again)
+
+
+def test_changed_csv_rebuilds(csv, parses):
+    old = build_cache(csv)
+    frame = pd.read_csv(csv)
+    frame.loc[0, "BPXSY1"] = 150.0
+    frame.to_csv(csv, index=False)
+    os.utime(csv, ns=(1, os.stat(csv).st_mtime_ns + 10 ** 9))
+    assert load(["BPXSY1"], path=csv).BPXSY1[0] == 150.0
+    assert len(parses) == 2
+    assert cache_dir(csv) != old and not os.path.exists(old)
+    assert os.path.dirname(os.path.dirname(old)).endswith(CACHE_DIRNAME)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from nhanes.mixture import Component, MixturePopulation, component_sizes, uniforms
+
+STUDENTS = [Component("UofM", 0.7, "normal", (155, 5)), Component("Gym", 0.3, "normal", (185, 5))]
+
+
+def test_component_sizes():
+    assert component_sizes([0.7, 0.3], 40000).tolist() == [28000, 12000]
+    assert component_sizes([1, 1, 1], 10).sum() == 10
+
+
+def test_uniforms_are_uniform_and_independent_of_the_rest_of_the_stream():
+    u = uniforms(12345, np.arange(100000))
+    assert 0 < u.min() and u.max() < 1
+    assert stats.kstest(u, "uniform").pvalue > 1e-3
+    assert abs(np.corrcoef(u[:-1], u[1:])[0, 1]) < 0.02
+    np.testing.assert_array_equal(uniforms(12345, [5, 99999]), u[[5, 99999]])
+
+
+@pytest.mark.parametrize("distribution, params, reference", [
+    ("normal", (155, 5), stats.norm(155, 5)),
+    ("uniform", (2, 7), stats.uniform(2, 5)),
+    ("exponential", (3,), stats.expon(scale=3)),
+    ("lognormal", (0.5, 0.4), stats.lognorm(0.4, scale=np.exp(0.5))),
+    ("gamma", (2.5, 2), stats.gamma(2.5, scale=2)),
+])
+def test_component_distributions(distribution, params, reference):
+    pop = MixturePopulation([Component("x", 1, distribution, params)], 50000, seed=0)
+    assert stats.kstest(pop.materialize(), reference.cdf).pvalue > 1e-3
+
+
+def test_values_agree_with_the_chunks():
+    pop = MixturePopulation(STUDENTS, 40000, seed=0, chunk_size=1000)
+    values = pop.materialize()
+    np.testing.assert_array_equal(pop.values(np.arange(40000)), values)
+    units = np.array([[39999, 0], [28000, 27999]])
+    np.testing.assert_array_equal(pop.values(units), values[units])
+    np.testing.assert_array_equal(pop.materialize("Gym"), values[28000:])
+    assert pop.mean() == pytest.approx(values.mean())
+    assert pop.mean("UofM") == pytest.approx(155, abs=0.1)
+
+
+def test_same_seed_same_population():
+    a = MixturePopulation(STUDENTS, 1000, seed=3).materialize()
+    b = MixturePopulation(STUDENTS, 1000, seed=3, chunk_size=7).materialize()
+    np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(a, MixturePopulation(STUDENTS, 1000, seed=4).materialize())
+
+
+def test_samples_from_a_huge_population():
+    # Units are generated from their numbers, so a sample never touches the other 10^12 units
+    pop = MixturePopulation(STUDENTS, 10 ** 12, seed=0)
+    means = pop.sample_means(50, 2000, rng=1)
+    assert abs(means.mean() - 164) < 4 * means.std() / np.sqrt(2000)
+    gym = pop.sample(3, 100, frame=["Gym"], rng=2)
+    assert abs(gym.mean() - 185) < 2
+
+
+def test_bias_of_a_biased_frame():
+    pop = MixturePopulation(STUDENTS, 40000, seed=0)
+    b = pop.bias(["Gym"], 3, 20000, rng=1)
+    assert b.analytic == pytest.approx(21)
+    assert b.empirical == pytest.approx(b.analytic, abs=0.3)
+
+
+def test_unsupported_distribution():
+    with pytest.raises(ValueError):
+        MixturePopulation([Component("x", 1, "zipf", (2,))], 10)
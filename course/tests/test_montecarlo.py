@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from nhanes.montecarlo import mean_se, quantile_se, run, sd_se
+
+
+def normal(count, rng):
+    return rng.normal(0, 1, count)
+
+
+def test_sd_stops_at_relative_precision():
+    res = run(normal, target="sd", rtol=0.02, seed=0)
+    assert res.converged
+    assert res.se <= 0.02 * res.estimate
+    assert res.replicates == res.values.shape[0]
+    assert abs(res.estimate - 1) < 4 * res.se
+    # sd of a normal sample has error 1 / sqrt(2 n): about 1250 replicates for 2%, so no large overshoot
+    assert res.replicates < 3000
+
+
+def test_first_batch_is_planned():
+    res = run(normal, target="sd", rtol=0.02, seed=0)
+    assert res.converged and res.batches <= 3 and res.values.shape[0] > 200
+    # An absolute tolerance needs the guess of the spread: the SD to 0.01 takes about 5000 replicates
+    guessed = run(normal, target="sd", tol=0.01, guess=1.0, seed=0)
+    assert guessed.converged and guessed.batches < run(normal, target="sd", tol=0.01, seed=0).batches
+
+
+def test_location_targets_need_tol():
+    for target in ("mean", "quantile", "bias"):
+        with pytest.raises(ValueError):
+            run(normal, target=target, rtol=0.05)
+
+
+def test_mean_near_zero_converges_with_tol():
+    res = run(normal, target="mean", tol=0.01, rtol=0.05, seed=1)
+    assert res.converged and res.se <= 0.01 + 0.05 * abs(res.estimate)
+    assert res.replicates < 20000
+
+
+def test_bias_and_quantile():
+    res = run(lambda n, rng: rng.normal(0.5, 1, n), target="bias", truth=0.5, tol=0.02, seed=2)
+    assert res.converged and abs(res.estimate) < 4 * res.se
+    res = run(normal, target="quantile", q=0.9, tol=0.02, seed=3)
+    assert res.converged and abs(res.estimate - 1.2816) < 4 * res.se
+
+
+def test_budget_exhausted_warns():
+    with pytest.warns(RuntimeWarning):
+        res = run(normal, target="sd", tol=1e-4, max_replicates=1000, seed=0)
+    assert not res.converged and res.replicates == 1000
+
+
+def test_seed_reproduces_the_run():
+    a = run(normal, target="sd", rtol=0.03, seed=5)
+    b = run(normal, target="sd", rtol=0.03, seed=5)
+    np.testing.assert_array_equal(a.values, b.values)
+
+
+def test_standard_errors_are_calibrated():
+    # Across many independent runs, the estimate errors divided by the reported se should be about N(0, 1)
+    rng = np.random.default_rng(7)
+    z = {"mean": [], "sd": [], "quantile": []}
+    for _ in range(400):
+        x = rng.normal(0, 1, 2000)
+        m, se = mean_se(x)
+        z["mean"].append(m / se)
+        s, se = sd_se(x)
+        z["sd"].append((s - 1) / se)
+        qv, se = quantile_se(x, 0.75)
+        z["quantile"].append((qv - 0.6745) / se)
+    for values in z.values():
+        assert 0.8 < np.std(values) < 1.25
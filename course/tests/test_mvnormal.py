@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from nhanes import mvnormal
+from nhanes.mvnormal import equicorrelation, factorize, multivariate_normal
+
+
+def test_equicorrelation():
+    covs = equicorrelation([0.5, -1.0], d=3, sd=[1, 2, 3])
+    assert covs.shape == (2, 3, 3)
+    np.testing.assert_allclose(covs[0], [[1, 1, 1.5], [1, 4, 3], [1.5, 3, 9]])
+    np.testing.assert_allclose(equicorrelation(0.3), [[1, 0.3], [0.3, 1]])
+
+
+def test_factors_reproduce_the_matrices():
+    covs = equicorrelation(np.round(np.arange(-1, 1.001, 0.05), 2), sd=[15, 5])
+    factors = factorize(covs)
+    np.testing.assert_allclose(factors @ np.swapaxes(factors, -1, -2), covs, atol=1e-9)
+
+
+def test_not_positive_semidefinite():
+    with pytest.raises(ValueError):
+        factorize(equicorrelation(-0.9, d=3))
+
+
+def test_factors_are_cached(monkeypatch):
+    mvnormal.clear_cache()
+    calls = []
+    factorize_uncached = mvnormal._factorize
+    monkeypatch.setattr(mvnormal, "_factorize", lambda covs: calls.append(len(covs)) or factorize_uncached(covs))
+    factorize(equicorrelation([0.1, 0.2]))
+    factorize(equicorrelation([0.2, 0.3, 0.1]))
+    assert calls == [2, 1]
+
+
+def test_draws_match_the_covariances():
+    rho = np.array([-1.0, -0.5, 0.0, 0.9, 1.0])
+    x = multivariate_normal([15, 5], equicorrelation(rho, sd=[2, 1]), 20000, rng=0)
+    assert x.shape == (5, 20000, 2)
+    for i, r in enumerate(rho):
+        np.testing.assert_allclose(x[i].mean(axis=0), [15, 5], atol=0.05)
+        np.testing.assert_allclose(x[i].std(axis=0), [2, 1], rtol=0.03)
+        assert abs(np.corrcoef(x[i].T)[0, 1] - r) < 0.02
+    # Singular matrices put every draw exactly on the line
+    np.testing.assert_allclose(x[0, :, 0] - 15, -2 * (x[0, :, 1] - 5), atol=1e-9)
+    np.testing.assert_allclose(x[4, :, 0] - 15, 2 * (x[4, :, 1] - 5), atol=1e-9)
+
+
+def test_single_matrix_like_numpy():
+    cov = [[4.0, 1.0], [1.0, 2.0]]
+    x = multivariate_normal([1, 2], cov, 50000, rng=1)
+    assert x.shape == (50000, 2)
+    np.testing.assert_allclose(np.cov(x.T), cov, rtol=0.03, atol=0.03)
+    np.testing.assert_array_equal(x, multivariate_normal([1, 2], cov, 50000, rng=1))
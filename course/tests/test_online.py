@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.loader import DATA_PATH
+from nhanes.online import CoMoments, CountTable, Moments, accumulate, batches, read_chunks
+
+COLUMNS = ["BPXSY1", "BPXSY2", "BPXDI1", "BPXDI2"]
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return pd.read_csv(DATA_PATH)
+
+
+def test_moments_match_pandas(raw):
+    moments, = accumulate(read_chunks(chunksize=700, columns=COLUMNS), Moments(COLUMNS))
+    np.testing.assert_allclose(moments.means(), raw[COLUMNS].mean(), rtol=1e-12)
+    np.testing.assert_allclose(moments.var(), raw[COLUMNS].var(), rtol=1e-10)
+    np.testing.assert_allclose(moments.std(ddof=0), raw[COLUMNS].std(ddof=0), rtol=1e-10)
+
+
+@pytest.mark.parametrize("listwise", [False, True])
+def test_comoments_match_pandas(raw, listwise):
+    comoments, = accumulate(read_chunks(chunksize=333, columns=COLUMNS), CoMoments(COLUMNS, listwise=listwise))
+    frame = raw[COLUMNS].dropna() if listwise else raw[COLUMNS]
+    pd.testing.assert_frame_equal(comoments.corr(), frame.corr(), rtol=1e-10)
+    pd.testing.assert_frame_equal(comoments.cov(), frame.cov(), rtol=1e-10)
+
+
+def test_merge_equals_one_pass(raw):
+    parts = [raw.iloc[i:i + 1000] for i in range(0, len(raw), 1000)]
+    merged = CoMoments(COLUMNS)
+    for part in parts:
+        merged.merge(CoMoments(COLUMNS).update(part))
+    pd.testing.assert_frame_equal(merged.corr(), CoMoments(COLUMNS).update(raw).corr(), rtol=1e-10)
+
+
+def test_large_offset_stays_accurate():
+    # Naive sums of squares lose every digit here; the centred updates do not
+    rng = np.random.default_rng(0)
+    x = 1e9 + rng.normal(0, 1, 100000)
+    moments = Moments(["x"])
+    for chunk in np.array_split(x, 37):
+        moments.update(chunk)
+    assert np.isclose(moments.var().iloc[0], np.var(x, ddof=1), rtol=1e-8)
+
+
+def test_count_table_matches_crosstab(raw):
+    table, = accumulate(read_chunks(chunksize=500, columns=["DMDEDUC2", "DMDMARTL"]),
+                        CountTable("DMDEDUC2", "DMDMARTL"))
+    chunk = next(read_chunks(chunksize=len(raw), columns=["DMDEDUC2", "DMDMARTL"]))
+    expected = pd.crosstab(chunk.DMDEDUC2, chunk.DMDMARTL)
+    got = table.table().loc[expected.index, expected.columns]
+    np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy())
+
+
+def test_batches_of_rows():
+    rows = ({"a": i, "b": 2.0 * i} for i in range(25))
+    sizes = [len(b) for b in batches(rows, size=10)]
+    assert sizes == [10, 10, 5]
@@ -0,0 +1,91 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import gaussian_kde
+
+from nhanes.plotting import bin2d, facetplot, jointplot, kde1d, kde2d, regplot, reservoir_sample
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(0, 1, 20000)
+    return pd.DataFrame({"x": x, "y": 0.6 * x + rng.normal(0, 0.8, 20000),
+                         "g": rng.choice(["a", "b"], 20000)})
+
+
+@pytest.fixture(autouse=True)
+def close_figures():
+    yield
+    plt.close("all")
+
+
+def test_bin2d_counts_every_pair(data):
+    b = bin2d(data.x.to_numpy(), data.y.to_numpy(), bins=50)
+    assert b.counts.sum() == len(data) == b.n
+
+
+def test_kde_matches_scipy(data):
+    x, y = data.x.to_numpy(), data.y.to_numpy()
+    x, y = x[:4000], y[:4000]
+    d = kde2d(x, y, bins=100)
+    cx = (d.xedges[:-1] + d.xedges[1:]) / 2
+    cy = (d.yedges[:-1] + d.yedges[1:]) / 2
+    gx, gy = np.meshgrid(cx, cy, indexing="ij")
+    ref = gaussian_kde(np.vstack([x, y]))(np.vstack([gx.ravel(), gy.ravel()])).reshape(gx.shape)
+    # Binning and the axis-aligned kernel (scipy's follows the covariance of the data) cost a few per cent
+    assert np.abs(d.counts - ref).max() < 0.08 * ref.max()
+    grid, dens = kde1d(x, bins=200)
+    assert np.abs(dens - gaussian_kde(x)(grid)).max() < 0.03 * dens.max()
+    assert dens.sum() * (grid[1] - grid[0]) == pytest.approx(1, abs=0.01)
+
+
+def test_reservoir_sample_is_uniform():
+    chunks = [np.arange(i, i + 100) for i in range(0, 1000, 100)]
+    hits = np.zeros(1000)
+    for seed in range(400):
+        s = reservoir_sample(chunks, 50, seed)
+        assert len(np.unique(s)) == 50
+        hits[s] += 1
+    # Every item is kept with probability 50 / 1000, so each decile holds about 1/10 of the picks
+    assert np.abs(hits.reshape(10, 100).sum(axis=1) / hits.sum() - 0.1).max() < 0.01
+
+
+def test_regplot_scatter_kws_override_defaults(data):
+    ax = regplot(x="x", y="y", data=data, scatter_kws={"alpha": 0.2, "color": "r", "s": 9}, overlay=100)
+    points = ax.collections[-1]
+    assert points.get_alpha() == 0.2
+    assert points.get_sizes()[0] == 9
+    assert tuple(points.get_facecolor()[0][:3]) == (1, 0, 0)
+    ax = regplot(x="x", y="y", data=data, scatter_kws={"s": 9}, overlay=100, ax=plt.figure().gca())
+    assert ax.collections[-1].get_alpha() == 0.3
+
+
+def test_jointplot_returns_grid(data):
+    g = jointplot(x="x", y="y", data=data, kind="hex")
+    assert g.fig is g.figure and g.ax_joint.get_xlabel() == "x"
+    assert g.set_axis_labels("leg", "arm") is g and g.ax_joint.get_ylabel() == "arm"
+    assert g.ax_marg_x.get_shared_x_axes().joined(g.ax_marg_x, g.ax_joint)
+
+
+def test_facetplot_panels(data):
+    fig = facetplot(data, "x", "y", col="g")
+    assert [ax.get_title() for ax in fig.axes] == ["g = a", "g = b"]
+
+
+def test_facetplot_slices_each_stratum(data):
+    data = data.assign(h=np.where(data.x > 0, "pos", "neg"))
+    fig = facetplot(data, "x", "y", col="g", row="h", bins=20)
+    for ax in fig.axes:
+        h, g = [part.split(" = ")[1] for part in ax.get_title().split(" | ")]
+        counts = ax.collections[0].get_array()
+        assert counts.sum() == ((data.g == g) & (data.h == h)).sum()
+
+
+def test_facetplot_without_complete_pairs():
+    data = pd.DataFrame({"x": [1.0, np.nan, 3.0], "y": [np.nan, 2.0, np.nan], "g": ["a", "b", "a"]})
+    fig = facetplot(data, "x", "y", col="g")
+    assert fig.axes[0].get_xlim() == pytest.approx((0.9, 3.1))
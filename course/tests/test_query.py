@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import query
+from nhanes.loader import load
+from nhanes.query import Query, col
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load()
+
+
+@pytest.fixture(params=["dataset", "frame"])
+def q(request, da, monkeypatch):
+    # Small blocks, so every plan runs over several of them
+    monkeypatch.setattr(query, "BLOCK_ROWS", 1000)
+    return Query() if request.param == "dataset" else Query.from_frame(da)
+
+
+def test_filtered_corr(da, q):
+    got = q.filter(col("RIAGENDR") == "Female").select("BMXLEG", "BMXARML").dropna().corr()
+    expected = da.loc[da.RIAGENDR == "Female", ["BMXLEG", "BMXARML"]].dropna().astype(np.float64).corr()
+    pd.testing.assert_frame_equal(got, expected, rtol=1e-10)
+
+
+def test_head_and_collect(da, q):
+    plan = q.filter(col("BMXWAIST") > 98.3, col("BMXLEG") < 32).select("BMXBMI", "BMXARML")
+    expected = da[(da.BMXWAIST > 98.3) & (da.BMXLEG < 32)][["BMXBMI", "BMXARML"]]
+    pd.testing.assert_frame_equal(plan.head(), expected.head(), check_index_type=False)
+    got = plan.collect()
+    np.testing.assert_array_equal(got.index, expected.index)
+    np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy())
+    assert plan.count() == len(expected)
+
+
+def test_combined_predicates(da, q):
+    cases = [
+        (col("RIDAGEYR").between(40, 49) | (col("DMDEDUC2") == "College"),
+         da.RIDAGEYR.between(40, 49) | (da.DMDEDUC2 == "College")),
+        (~col("RIDRETH1").isin(["Mexican American", "Other Hispanic"]),
+         ~da.RIDRETH1.isin(["Mexican American", "Other Hispanic"])),
+        (col("DMDMARTL") != "Married", (da.DMDMARTL != "Married") & da.DMDMARTL.notna()),
+        (col("BPXSY1").notna() & (col("BPXSY1") >= 140), da.BPXSY1 >= 140),
+    ]
+    for predicate, mask in cases:
+        assert q.filter(predicate).count() == int(mask.sum())
+
+
+def test_groupby_matches_pandas(da, q):
+    grouped = da.groupby(["RIAGENDR", "DMDEDUC2"], observed=True)
+    size = q.groupby("RIAGENDR", "DMDEDUC2").size()
+    np.testing.assert_array_equal(size.to_numpy(), grouped.size().to_numpy())
+    assert list(size.index) == list(grouped.size().index)
+
+    got = q.filter(col("RIDAGEYR") >= 40).groupby("RIAGENDR").agg({"BPXSY1": ["mean", "count"], "BMXBMI": "sum"})
+    sub = da[da.RIDAGEYR >= 40].astype({"BPXSY1": np.float64, "BMXBMI": np.float64})
+    expected = sub.groupby("RIAGENDR", observed=True).agg({"BPXSY1": ["mean", "count"], "BMXBMI": "sum"})
+    np.testing.assert_allclose(got[("BPXSY1", "mean")], expected[("BPXSY1", "mean")], rtol=1e-12)
+    np.testing.assert_array_equal(got[("BPXSY1", "count")], expected[("BPXSY1", "count")])
+    np.testing.assert_allclose(got["BMXBMI"], expected[("BMXBMI", "sum")], rtol=1e-12)
+
+
+def test_needs_groupby(q):
+    with pytest.raises(ValueError):
+        q.size()
+
+
+def test_corr_defaults_to_numeric_columns(da, q):
+    got = q.filter(col("RIDAGEYR") >= 60).corr()
+    sub = da[da.RIDAGEYR >= 60].drop(columns="SEQN")
+    expected = sub.select_dtypes("number").astype(np.float64).corr()
+    pd.testing.assert_frame_equal(got, expected, rtol=1e-10)
+
+
+def test_corr_rejects_empty_and_non_numeric(q):
+    with pytest.raises(ValueError, match="empty selection"):
+        q.filter(col("RIDAGEYR") > 200).select("BMXLEG", "BMXARML").corr()
+    with pytest.raises(ValueError, match="RIAGENDR is not"):
+        q.select("BMXLEG", "RIAGENDR").corr()
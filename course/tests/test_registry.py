@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.registry import Registry, SeqnIndex, join, stack
+
+
+@pytest.fixture
+def files(tmp_path):
+    rng = np.random.default_rng(0)
+    demo = pd.DataFrame({"SEQN": np.arange(100, 140), "RIAGENDR": rng.integers(1, 3, 40),
+                         "RIDAGEYR": rng.integers(18, 80, 40)})
+    # Unsorted, with participants missing from the examination file and some not in the demographics
+    lab = pd.DataFrame({"SEQN": rng.permutation(np.r_[np.arange(110, 130), np.arange(500, 505)]),
+                        "LBXGLU": rng.normal(100, 10, 25).round(1), "RIDAGEYR": rng.integers(18, 80, 25)})
+    other = pd.DataFrame({"SEQN": np.arange(900, 910), "RIAGENDR": rng.integers(1, 3, 10),
+                          "BPXSY1": rng.normal(120, 15, 10).round()})
+    paths = {}
+    for name, frame in [("demo", demo), ("lab", lab), ("other", other)]:
+        paths[name] = str(tmp_path / ("%s.csv" % name))
+        frame.to_csv(paths[name], index=False)
+    return paths
+
+
+def listed(series):
+    '''Values as a list with None for every kind of missing value, so dtypes do not matter.'''
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def test_seqn_index():
+    index = SeqnIndex([30, 10, 20])
+    np.testing.assert_array_equal(index.positions([20, 99, 30, 10, 5]), [2, -1, 0, 1, -1])
+    with pytest.raises(ValueError):
+        SeqnIndex([1, 2, 1])
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+def test_join_matches_merge(files, how):
+    reg = Registry().register("A", "demo", files["demo"]).register("A", "lab", files["lab"])
+    got = reg.join("A", how=how)
+    demo, lab = pd.read_csv(files["demo"]), pd.read_csv(files["lab"])
+    expected = demo.merge(lab, on="SEQN", how=how, suffixes=("", "_lab"))
+    # The loader labels the coded columns
+    expected["RIAGENDR"] = expected.RIAGENDR.map({1: "Male", 2: "Female"})
+    assert list(got.columns) == list(expected.columns)
+    for c in expected.columns:
+        assert listed(got[c]) == listed(expected[c]), c
+
+
+def test_join_needs_a_suffix_for_clashing_columns(files):
+    left, right = pd.read_csv(files["demo"]), pd.read_csv(files["lab"])
+    with pytest.raises(ValueError):
+        join(left, right, SeqnIndex(right.SEQN))
+
+
+def test_stack_harmonizes_schemas(files):
+    reg = (Registry().register("A", "demo", files["demo"]).register("A", "lab", files["lab"])
+           .register("B", "demo", files["other"]))
+    got = reg.dataset(components=[])
+    assert list(got.columns) == ["cycle", "SEQN", "RIAGENDR", "RIDAGEYR", "BPXSY1"]
+    assert got.cycle.tolist() == ["A"] * 40 + ["B"] * 10
+    assert got.RIAGENDR.dtype == "category" and set(got.RIAGENDR.cat.categories) == {"Male", "Female"}
+    assert got.RIDAGEYR[:40].notna().all() and got.RIDAGEYR[40:].isna().all()
+    assert got.BPXSY1[:40].isna().all() and got.BPXSY1[40:].notna().all()
+
+    a = pd.DataFrame({"x": np.array([1, 2], dtype=np.int8)})
+    b = pd.DataFrame({"x": [0.5]})
+    assert stack([a, b]).x.tolist() == [1.0, 2.0, 0.5]
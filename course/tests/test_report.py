@@ -0,0 +1,45 @@
+import os
+
+from nhanes import report
+
+SCRIPT = '''
+import matplotlib.pyplot as plt
+import pandas as pd
+
+print("printed")
+pd.Series([1, 2, 3], name="expression").describe()
+None
+plt.plot([1, 2], [3, 4])
+plt.show()
+'''
+
+
+def test_relative_output_dir(tmp_path, monkeypatch):
+    script = tmp_path / "task.py"
+    script.write_text(SCRIPT)
+    monkeypatch.chdir(tmp_path)
+
+    assert report.main(["-o", "relout", "-j", "1", str(script)]) == 0
+    name = report.register(str(script)).name
+    out = tmp_path / "relout" / name
+    text = (out / "output.txt").read_text()
+    assert "printed" in text
+    assert "Name: expression" in text and "count    3.0" in text
+    assert "Line2D" not in text and "None" not in text
+    assert (out / "figure-01.png").exists()
+    assert os.path.exists(out / report.HASH_FILE)
+
+    # Nothing changed, so the second run skips the task
+    results = report.run([name], "relout", workers=1)
+    assert [r.status for r in results] == ["skipped"]
+
+
+def test_input_hash_follows_data_contents(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_text("SEQN\n1\n")
+    task = report.Task("t", report.__file__)
+    before = report.input_hash(task, str(data))
+    stat = os.stat(data)
+    data.write_text("SEQN\n2\n")
+    os.utime(data, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert report.input_hash(task, str(data)) != before
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from nhanes import sampler
+from nhanes.sampler import draw, sample_indices, sample_means, sample_statistic
+
+
+@pytest.mark.parametrize("replace", [False, True])
+def test_indices(replace):
+    idx = sample_indices(30, 20, 5000, replace=replace, rng=0)
+    assert idx.shape == (5000, 20) and idx.min() >= 0 and idx.max() < 30
+    distinct = [len(set(row)) for row in idx[:200].tolist()]
+    if replace:
+        assert min(distinct) < 20
+    else:
+        assert min(distinct) == 20
+    counts = np.bincount(idx.ravel(), minlength=30)
+    expected = 5000 * 20 / 30
+    assert np.abs(counts - expected).max() < 5 * np.sqrt(expected)
+
+
+def test_draw_returns_population_values():
+    population = np.arange(100) * 1.5
+    samples = draw(population, 10, 4, rng=1)
+    assert samples.shape == (4, 10)
+    assert np.isin(samples, population).all()
+
+
+def test_sample_means_spread():
+    # Standard error of the mean, with the finite population correction when sampling without replacement
+    rng = np.random.default_rng(2)
+    population = rng.normal(10, 3, 2000)
+    sd = population.std()
+    for replace, fpc in [(True, 1.0), (False, (2000 - 500) / (2000 - 1))]:
+        means = sample_means(population, 500, 4000, replace=replace, rng=3)
+        assert abs(means.mean() - population.mean()) < 4 * sd / np.sqrt(500 * 4000)
+        assert abs(means.std() / (sd * np.sqrt(fpc / 500)) - 1) < 0.06
+
+
+def test_seeded_statistic_is_reproducible():
+    population = np.arange(1000.0)
+    a = sample_statistic(population, 50, 100, np.median, rng=4, block_size=7)
+    b = sample_statistic(population, 50, 100, np.median, rng=4, block_size=7)
+    np.testing.assert_array_equal(a, b)
+    assert a.shape == (100,) and (a >= 0).all() and (a <= 999).all()
+
+
+def test_blocks_count_the_keys_of_dense_draws(monkeypatch):
+    # Drawing 60 of 100 without replacement holds 100 keys per sample, so 1000 values fit 10 samples per block
+    monkeypatch.setattr(sampler, "BLOCK_ELEMENTS", 1000)
+    blocks = []
+    monkeypatch.setattr(sampler, "draw", lambda population, size, samples, *args: blocks.append(samples)
+                        or np.zeros((samples, size)))
+    sample_means(np.arange(100.0), 60, 35)
+    assert blocks == [10, 10, 10, 5]
+    blocks.clear()
+    sample_means(np.arange(100.0), 60, 35, replace=True)
+    assert blocks == [16, 16, 3]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.codebook import CODEBOOK
+from nhanes.loader import DATA_PATH, load
+from nhanes.schema import SCHEMA, decode, encode
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return pd.read_csv(DATA_PATH)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return load()
+
+
+def test_types_follow_the_schema(frame):
+    for col, spec in SCHEMA.items():
+        if spec == "category":
+            assert isinstance(frame[col].dtype, pd.CategoricalDtype)
+        else:
+            assert str(frame[col].dtype) == spec, col
+
+
+def test_values_survive_the_compact_types(raw, frame):
+    for col, spec in SCHEMA.items():
+        if spec == "category":
+            continue
+        expected = raw[col].to_numpy(dtype=np.float64)
+        got = frame[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        # float32 keeps the recorded decimals; everything else is exact
+        np.testing.assert_allclose(got, expected, rtol=1e-6 if spec == "float32" else 0, equal_nan=True)
+
+
+def test_categories_carry_the_codebook_labels(raw, frame):
+    for col, spec in SCHEMA.items():
+        if spec != "category":
+            continue
+        labels = raw[col].map(CODEBOOK[col])
+        np.testing.assert_array_equal(frame[col].astype(object).isna(), labels.isna())
+        assert (frame[col].astype(object)[labels.notna()] == labels[labels.notna()]).all()
+
+
+def test_frame_is_smaller(raw, frame):
+    assert raw.memory_usage(deep=True).sum() / frame.memory_usage(deep=True).sum() > 2.7
+
+
+def test_nullable_round_trip():
+    s = pd.Series([1.0, None, 120.0], name="X")
+    parts, meta = encode(s, "Int8")
+    out = decode(parts, meta)
+    assert out.dtype == "Int8" and out.isna().tolist() == [False, True, False] and out[2] == 120
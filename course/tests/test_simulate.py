@@ -0,0 +1,36 @@
+import random
+
+import numpy as np
+
+from nhanes.simulate import StdlibCompat, normal, streams, uniform
+
+
+def test_stdlib_compat_reproduces_random():
+    for seed in (1738, 0, 99):
+        ref = random.Random(seed)
+        rng = StdlibCompat(seed)
+        expected = [ref.normalvariate(7, 1.7) for _ in range(20000)]
+        np.testing.assert_array_equal(rng.normalvariate(7, 1.7, 20000), expected)
+        expected = [ref.uniform(0, 10) for _ in range(1000)]
+        np.testing.assert_array_equal(rng.uniform(0, 10, 1000), expected)
+        assert rng.random() == ref.random()
+        assert rng.normalvariate(0, 1) == ref.normalvariate(0, 1)
+        assert rng.getstate()[1] == ref.getstate()[1]
+
+
+def test_stdlib_compat_hands_over_to_random():
+    rng = StdlibCompat(5)
+    rng.normalvariate(0, 1, 1001)
+    ref = random.Random()
+    ref.setstate(rng.getstate())
+    assert ref.random() == rng.random()
+
+
+def test_seeded_draws():
+    np.testing.assert_array_equal(normal(0, 1, 100, rng=3), np.random.default_rng(3).normal(0, 1, 100))
+    rng = np.random.default_rng(4)
+    x = uniform(2, 5, 10000, rng=rng)
+    assert x.dtype == np.float64 and x.flags.c_contiguous and 2 <= x.min() and x.max() < 5
+    a, b = streams(1, 2)
+    assert not np.array_equal(a.random(10), b.random(10))
+    np.testing.assert_array_equal(streams(1, 2)[1].random(10), streams(1, 2)[1].random(10))
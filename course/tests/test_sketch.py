@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.sketch import QuantileSketch
+
+
+def rank_errors(sketch, x):
+    xs = np.sort(x)
+    points = np.quantile(x, np.linspace(0.001, 0.999, 999))
+    cdf_error = np.abs(sketch.cdf(points) - np.searchsorted(xs, points, side="right") / x.shape[0]).max()
+    q = np.linspace(0.01, 0.99, 99)
+    quantile_error = np.abs(np.searchsorted(xs, sketch.quantile(q), side="right") / x.shape[0] - q).max()
+    return cdf_error, quantile_error
+
+
+@pytest.mark.parametrize("k", [100, 200, 400])
+def test_rank_error_is_about_one_over_k(k):
+    rng = np.random.default_rng(k)
+    x = rng.lognormal(0, 1, 200000)
+    sketch = QuantileSketch(k=k, seed=0)
+    for chunk in np.array_split(x, 50):
+        sketch.update(chunk)
+    assert max(rank_errors(sketch, x)) < 1.6 / k
+    # Memory is a few k items, not the stream
+    assert sum(level.shape[0] for level in sketch.levels) < 4 * k
+
+
+def test_merged_sketches_are_as_accurate():
+    rng = np.random.default_rng(1)
+    parts = [rng.normal(i, 1, 30000) for i in range(8)]
+    sketch = QuantileSketch(seed=0)
+    for part in parts:
+        sketch.merge(QuantileSketch(seed=1).update(part))
+    x = np.concatenate(parts)
+    assert sketch.n == x.shape[0]
+    assert max(rank_errors(sketch, x)) < 1.6 / sketch.k
+
+
+def test_small_input_is_exact():
+    x = np.array([5.0, 1.0, np.nan, 3.0, 3.0, 9.0])
+    sketch = QuantileSketch().update(x)
+    np.testing.assert_array_equal(sketch.x, [-np.inf, 1, 3, 3, 5, 9])
+    np.testing.assert_allclose(sketch.y, [0, 0.2, 0.4, 0.6, 0.8, 1.0])
+    np.testing.assert_allclose(sketch([0, 3, 7, 9]), [0, 0.6, 0.8, 1.0])
+
+
+def test_describe_like_pandas():
+    rng = np.random.default_rng(2)
+    x = rng.gamma(2.0, 10.0, 50000)
+    got = QuantileSketch(seed=0).update(x).describe()
+    expected = pd.Series(x).describe()
+    assert list(got.index) == list(expected.index)
+    exact = ["count", "mean", "std", "min", "max"]
+    np.testing.assert_allclose(got[exact], expected[exact], rtol=1e-10)
+    sketched = ["25%", "50%", "75%"]
+    ranks = np.searchsorted(np.sort(x), got[sketched].to_numpy(), side="right") / x.shape[0]
+    np.testing.assert_allclose(ranks, [0.25, 0.5, 0.75], atol=1.6 / 200)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.loader import load
+from nhanes.stratified import band_codes, proportions, table
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load(["RIDAGEYR", "RIAGENDR", "DMDEDUC2", "DMDMARTL"])
+
+
+def chain(frame, keys, outcome):
+    # The scripts' groupby / unstack / apply chain
+    counts = frame.groupby(keys + [outcome], observed=True).size().unstack().fillna(0)
+    return counts, counts.apply(lambda x: x / x.sum(), axis=1)
+
+
+def test_matches_groupby_chain(da):
+    counts, props = chain(da, ["RIAGENDR", "DMDEDUC2"], "DMDMARTL")
+    got = table(da, ["RIAGENDR", "DMDEDUC2"], "DMDMARTL")
+    np.testing.assert_array_equal(got.counts.to_numpy(), counts.to_numpy())
+    np.testing.assert_allclose(got.proportions.to_numpy(), props.to_numpy())
+    assert list(got.proportions.index) == list(props.index)
+    assert list(got.proportions.columns) == list(props.columns)
+
+
+def test_age_bands_match_cut(da):
+    edges = [30, 40, 50, 60]
+    dx = da.assign(band=pd.cut(da.RIDAGEYR, edges, right=False))
+    _, props = chain(dx, ["band", "RIAGENDR"], "DMDMARTL")
+    got = proportions(da, "RIAGENDR", "DMDMARTL", bins={"RIDAGEYR": edges})
+    np.testing.assert_allclose(got.to_numpy(), props.to_numpy())
+    assert got.index.get_level_values(0).unique().tolist() == ["[30, 40)", "[40, 50)", "[50, 60)"]
+
+
+def test_unobserved_cells_are_kept_on_request(da):
+    got = table(da, "RIAGENDR", "DMDMARTL", observed=False)
+    assert got.counts.shape == (2, 8)
+    assert got.counts.to_numpy().sum() == da.DMDMARTL.notna().sum()
+
+
+def test_band_codes():
+    code, labels = band_codes(pd.Series([17.0, 18, 29.9, 30, 80, np.nan]), [18, 30, 80])
+    assert code.tolist() == [-1, 0, 0, 1, -1, -1]
+    assert labels == ["[18, 30)", "[30, 80)"]
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes.subsampling import (correlation_difference, mean_difference, nanmean_rows, pearson_rows,
+                                subsample_indices, subsample_means)
+
+
+def population(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.gamma(4.0, 30.0, n)
+    x[rng.random(n) < 0.1] = np.nan
+    return x
+
+
+@pytest.mark.parametrize("n, size", [(50, 10), (50, 40), (7, 7)])
+def test_indices_are_distinct_and_uniform(n, size):
+    idx = subsample_indices(n, size, 20000, rng=1)
+    assert idx.shape == (20000, size)
+    assert all(len(set(row)) == size for row in idx[:500].tolist())
+    assert idx.min() >= 0 and idx.max() < n
+    # Every unit is equally likely at every position, in particular in either half of a split
+    expected = 20000 / n
+    for column in (idx[:, 0], idx[:, -1]):
+        counts = np.bincount(column, minlength=n)
+        assert np.abs(counts - expected).max() < 5 * np.sqrt(expected)
+
+
+def test_too_large_sample():
+    with pytest.raises(ValueError):
+        subsample_indices(5, 6, 1)
+
+
+def test_nanmean_rows_matches_pandas():
+    x = population(400).reshape(20, 20)
+    x[3] = np.nan
+    expected = pd.DataFrame(x).mean(axis=1).to_numpy()
+    np.testing.assert_allclose(nanmean_rows(x), expected, rtol=1e-12)
+    assert np.isnan(nanmean_rows(x)[3])
+
+
+def test_mean_difference_matches_the_pandas_loop():
+    x = population()
+    da = pd.DataFrame({"BPXSY1": x, "other": np.arange(x.shape[0])})
+    m, replicates = 100, 2000
+    loop = []
+    for i in range(replicates):
+        dx = da.sample(2 * m, random_state=i)
+        loop.append(dx.iloc[:m].BPXSY1.mean() - dx.iloc[m:].BPXSY1.mean())
+    fast = mean_difference(x, m, replicates, seed=0)
+    # Same distribution: centred on 0 with the same spread (sd of an sd estimate from 2000 draws is ~1.6%)
+    assert abs(fast.mean()) < 4 * np.std(loop) / np.sqrt(replicates)
+    assert abs(np.std(fast) / np.std(loop) - 1) < 0.08
+
+
+def test_blocks_and_seed():
+    x = population()
+    a = mean_difference(x, 50, 300, seed=4, block_size=7)
+    b = mean_difference(x, 50, 300, seed=4, block_size=7)
+    assert a.shape == (300,) and not np.isnan(a).any()
+    np.testing.assert_array_equal(a, b)
+    # Blocking only bounds memory; the distribution is the same
+    c = mean_difference(x, 50, 3000, seed=5)
+    d = mean_difference(x, 50, 3000, seed=6, block_size=7)
+    assert abs(np.std(c) / np.std(d) - 1) < 0.08
+
+
+def test_subsample_means():
+    x = population()
+    c = subsample_means(x, 50, 4000, seed=2)
+    assert abs(c.mean() - np.nanmean(x)) < 4 * np.nanstd(x) / np.sqrt(50 * 4000)
+
+
+def pairs(n=3000, rho=0.6, seed=0):
+    rng = np.random.default_rng(seed)
+    x, y = rng.multivariate_normal([120, 70], [[1, rho], [rho, 1]], n).T * [[15], [10]]
+    x[rng.random(n) < 0.05] = np.nan
+    y[rng.random(n) < 0.05] = np.nan
+    return x, y
+
+
+def test_pearson_rows_matches_corrcoef_after_dropna():
+    x, y = pairs(600)
+    x, y = x.reshape(30, 20), y.reshape(30, 20)
+    expected = []
+    for a, b in zip(x, y):
+        dx = pd.DataFrame({"a": a, "b": b}).dropna()
+        expected.append(np.corrcoef(dx.a, dx.b)[0, 1])
+    np.testing.assert_allclose(pearson_rows(x, y), expected, rtol=1e-10)
+
+
+def test_correlation_difference_matches_the_pandas_loop():
+    x, y = pairs()
+    da = pd.DataFrame({"BPXSY1": x, "BPXDI1": y})
+    m, replicates = 100, 1000
+    loop = []
+    for i in range(replicates):
+        dx = da.sample(2 * m, random_state=i)
+        r1 = np.corrcoef(dx.iloc[:m].dropna().T)[0, 1]
+        r2 = np.corrcoef(dx.iloc[m:].dropna().T)[0, 1]
+        loop.append(r1 - r2)
+    # The loop is slow, so fewer replicates and a wider margin (sd estimates within ~2.2% each)
+    fast = correlation_difference(x, y, m, replicates, seed=0)
+    assert abs(fast.mean()) < 4 * np.std(loop) / np.sqrt(replicates)
+    assert abs(np.std(fast) / np.std(loop) - 1) < 0.1
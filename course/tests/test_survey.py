@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from nhanes import survey
+from nhanes.loader import load
+
+
+@pytest.fixture(scope="module")
+def da():
+    return load(["WTINT2YR", "SDMVSTRA", "SDMVPSU", "BPXSY1", "BMXBMI", "RIAGENDR", "DMDEDUC2"])
+
+
+@pytest.fixture(scope="module")
+def des(da):
+    return survey.design(da)
+
+
+def test_weighted_means(da, des):
+    got = survey.mean(des, da, ["BPXSY1", "BMXBMI"])
+    for col in ("BPXSY1", "BMXBMI"):
+        x = da[col].to_numpy(dtype=np.float64)
+        keep = ~np.isnan(x)
+        assert np.isclose(got.estimate[col], np.average(x[keep], weights=da.WTINT2YR[keep]))
+
+
+@pytest.mark.parametrize("method", ["jackknife", "brr"])
+def test_taylor_agrees_with_replicates(da, des, method):
+    taylor = survey.mean(des, da, ["BPXSY1", "BMXBMI"])
+    rep = survey.replicate_mean(des, da, ["BPXSY1", "BMXBMI"], method=method)
+    np.testing.assert_allclose(rep.estimate, taylor.estimate)
+    # Different variance estimators of the same quantity: close, not identical
+    np.testing.assert_allclose(rep.se, taylor.se, rtol=0.1)
+
+
+def test_jackknife_matches_deleting_each_psu(da, des):
+    # Explicit delete-one-PSU loop: drop a PSU, reweight the rest of its stratum, recompute the weighted mean
+    x = da.BPXSY1.to_numpy(dtype=np.float64)
+    keep = ~np.isnan(x)
+    w = da.WTINT2YR.to_numpy()
+    stratum, psu = da.SDMVSTRA.to_numpy(), da.SDMVPSU.to_numpy()
+    full = np.average(x[keep], weights=w[keep])
+    total = 0.0
+    for h in np.unique(stratum):
+        psus = np.unique(psu[stratum == h])
+        n_h = len(psus)
+        for p in psus:
+            wr = np.where(stratum == h, w * n_h / (n_h - 1), w)
+            wr[(stratum == h) & (psu == p)] = 0.0
+            total += (n_h - 1) / n_h * (np.average(x[keep], weights=wr[keep]) - full) ** 2
+    rep = survey.replicate_mean(des, da, "BPXSY1")
+    assert np.isclose(rep.se["BPXSY1"], np.sqrt(total))
+
+
+def test_proportions_and_crosstab(da, des):
+    p = survey.proportion(des, da, "DMDEDUC2")
+    present = da.DMDEDUC2.notna()
+    expected = da[present].groupby("DMDEDUC2", observed=False).WTINT2YR.sum() / da.WTINT2YR[present].sum()
+    np.testing.assert_allclose(p.estimate.to_numpy(), expected.to_numpy())
+    assert (p.se[p.estimate > 0] > 0).all() and (p.se[p.estimate == 0] == 0).all()
+
+    ct = survey.crosstab(des, da, "RIAGENDR", "DMDEDUC2")
+    expected = pd.crosstab(da.RIAGENDR, da.DMDEDUC2, values=da.WTINT2YR, aggfunc="sum", normalize=True,
+                           dropna=False)
+    np.testing.assert_allclose(ct.estimate.to_numpy(), expected.to_numpy())
+    assert ct.se.shape == ct.estimate.shape
+
+
+def test_correlation_se_agrees_with_jackknife(da, des):
+    r = survey.correlation(des, da, "BPXSY1", "BMXBMI")
+    both = da.BPXSY1.notna() & da.BMXBMI.notna()
+    x, y, w = da.BPXSY1[both].to_numpy(float), da.BMXBMI[both].to_numpy(float), da.WTINT2YR[both].to_numpy()
+    c = np.cov(x, y, aweights=w)
+    assert np.isclose(r.estimate, c[0, 1] / np.sqrt(c[0, 0] * c[1, 1]))
+
+    rw, scale = survey.replicate_weights(des)
+    reps = []
+    for k in range(rw.shape[1]):
+        c = np.cov(x, y, aweights=rw[both.to_numpy(), k])
+        reps.append(c[0, 1] / np.sqrt(c[0, 0] * c[1, 1]))
+    assert np.isclose(r.se, np.sqrt(scale @ (np.array(reps) - r.estimate) ** 2), rtol=0.15)
+
+
+def test_design_rejects_missing_values(da):
+    frame = da.copy()
+    frame.loc[0, "WTINT2YR"] = np.nan
+    with pytest.raises(ValueError):
+        survey.design(frame)
@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from nhanes import trace
+from nhanes.loader import load
+from nhanes.stratified import table
+
+
+@pytest.fixture
+def tracing():
+    trace.reset()
+    trace.enable()
+    yield trace
+    trace.disable()
+    trace.reset()
+
+
+def test_disabled_spans_record_nothing():
+    trace.reset()
+    with trace.span("idle") as s:
+        s.rows_out = 3
+    assert trace.records() == []
+
+
+def test_nested_spans(tracing):
+    with trace.span("outer", rows_in=10, script="x") as outer:
+        with trace.span("inner"):
+            np.ones(1000).sum()
+        outer.rows_out = 4
+    inner_rec, = [r for r in trace.records() if r["name"] == "inner"]
+    outer_rec, = [r for r in trace.records() if r["name"] == "outer"]
+    assert outer_rec["depth"] == 0 and inner_rec["depth"] == 1
+    assert outer_rec["rows_in"] == 10 and outer_rec["rows_out"] == 4 and outer_rec["args"] == {"script": "x"}
+    assert outer_rec["start"] <= inner_rec["start"]
+    assert outer_rec["wall"] >= inner_rec["wall"] >= 0
+    assert [r["name"] for r in trace.records()] == ["outer", "inner"]
+
+
+def test_traced_functions_count_rows(tracing):
+    da = load(["RIAGENDR", "DMDMARTL"])
+    table(da, "RIAGENDR", "DMDMARTL")
+    totals = trace.summary()
+    assert totals["crosstab"]["calls"] == 1 and totals["crosstab"]["rows_in"] == len(da)
+    crosstab, = [r for r in trace.records() if r["name"] == "crosstab"]
+    assert crosstab["rows_out"] is None  # a namedtuple of frames has no row count
+
+
+def test_memory_peak(tracing):
+    trace.disable()
+    trace.enable(trace_memory=True)
+    with trace.span("allocate"):
+        x = np.ones(1 << 20)
+        del x
+    rec, = trace.records()
+    assert rec["mem_peak"] >= 8 << 20
+
+
+def test_exports(tracing, tmp_path):
+    with trace.span("stage"):
+        pass
+    trace.save_json(str(tmp_path / "trace.json"))
+    trace.save_chrome(str(tmp_path / "trace.chrome.json"))
+    with open(tmp_path / "trace.json") as f:
+        saved = json.load(f)
+    assert saved["summary"]["stage"]["calls"] == 1
+    with open(tmp_path / "trace.chrome.json") as f:
+        event, = json.load(f)["traceEvents"]
+    assert event["name"] == "stage" and event["ph"] == "X" and event["dur"] >= 0
@@ -1,12 +1,21 @@
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import statsmodels.api as sm
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.derived import DerivedFrame
+from nhanes.index import TableIndex
+from nhanes.loader import load
+from nhanes.stratified import proportions
+
 pd.set_option('display.max_columns', None)
 
-da = pd.read_csv("../nhanes_2015_2016.csv")
+# agegrp is the pd.cut age band of nhanes.derived, (18, 30], (30, 40], ...
+da = DerivedFrame(load()).with_columns("agegrp")
 
 '''
 ###
@@ -15,18 +24,22 @@ Then construct a frequency table of these values for all people, then for women
 Then construct these three frequency tables using only people whose age is between 30 and 40.
 '''
 
-da["marital_status"] = da.DMDMARTL.replace({1: "Unmarried", 2: "Married", 3: "Widow", 4: "Divorced",
-                                            5: "Separated", 6: "Registered partner", 7: "Separated partner"})
-da["Education"] = da.DMDEDUC2.replace({1: "<9", 2: "9-11", 3: "HS/GED", 4: "Some college/AA", 5: "College",
-                                       7: "Refused", 9: "Don't know"})
+# The loader already labels the coded variables with the labels of nhanes.codebook
+da["marital_status"] = da.DMDMARTL
+da["Education"] = da.DMDEDUC2
+
+da["gender"] = da.RIAGENDR
 
-da["gender"] = da.RIAGENDR.replace({1: 'Male', 2: 'Female'})
-da["agegrp"] = pd.cut(da.RIDAGEYR, [18, 30, 40, 50, 60, 70, 80])
+# Bitmap index on gender and sorted index on age: each selection is a bitmap intersection, not a full scan
+ix = TableIndex(da)
+male = ix['gender'] == 'Male'
+female = ix['gender'] == 'Female'
+age_30_40 = ix['RIDAGEYR'].isin([30, 40])
 
-da_male_all = da.loc[(da.gender == 'Male')]
-da_female_all = da.loc[(da.gender == 'Female')]
-da_male_30_40 = da.loc[(da.gender == 'Male') & da.RIDAGEYR.isin([30, 40])]
-da_female_30_40 = da.loc[(da.gender == 'Female') & da.RIDAGEYR.isin([30, 40])]
+da_male_all = da.iloc[male.positions()]
+da_female_all = da.iloc[female.positions()]
+da_male_30_40 = da.iloc[(male & age_30_40).positions()]
+da_female_30_40 = da.iloc[(female & age_30_40).positions()]
 
 print("All:")
 print(da.marital_status.value_counts())
@@ -50,18 +63,16 @@ and construct the distribution of marital status within each age band.
 Within each age band, present the distribution in terms of proportions that must sum to 1.
 '''
 print("\n Females marital status grouped by age:")
-dx = da_female_all.loc[~da_female_all.DMDMARTL.isin(['77.0'])]
-print(dx.groupby('agegrp').marital_status.value_counts().unstack().apply(lambda x: x / x.sum() * 100, axis=1).to_string(
-    float_format="%.2f"))
+dx = da_female_all.loc[~da_female_all.DMDMARTL.isin(['Refused'])]
+print((proportions(dx, 'agegrp', 'marital_status') * 100).to_string(float_format="%.2f"))
 
 '''
 ###
 Repeat the construction for males.
 '''
 print("\n Males marital status grouped by age:")
-dx = da_male_all.loc[~da_male_all.DMDMARTL.isin(['77.0'])]
-print(dx.groupby('agegrp').marital_status.value_counts().unstack().apply(lambda x: x / x.sum() * 100, axis=1).to_string(
-    float_format="%.2f"))
+dx = da_male_all.loc[~da_male_all.DMDMARTL.isin(['Refused'])]
+print((proportions(dx, 'agegrp', 'marital_status') * 100).to_string(float_format="%.2f"))
 
 '''
 ###
@@ -85,8 +96,7 @@ plt.show()
 '''
 print('frequency table of household sizes for people within each educational attainment category')
 
-print(da.groupby('Education').DMDHHSIZ.value_counts().unstack().apply(lambda x: x / x.sum() * 100, axis=1).to_string(
-    float_format="%.2f"))
+print((proportions(da, 'Education', 'DMDHHSIZ') * 100).to_string(float_format="%.2f"))
 
 '''
 ###
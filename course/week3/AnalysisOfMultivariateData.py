@@ -1,10 +1,22 @@
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 # import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.correlation import correlation_store
+from nhanes.cube import build as build_cube
+from nhanes.derived import DerivedFrame
+from nhanes.loader import load
+from nhanes.plotting import facetplot, jointplot, regplot
+from nhanes.stratified import proportions
+
 pd.set_option('display.max_columns', 100)
 
-da = pd.read_csv("../nhanes_2015_2016.csv")
+# RIAGENDRx, DMDEDUC2x and DMDMARTLx are derived columns (see nhanes.derived): aliases of the labelled columns
+da = DerivedFrame(load()).with_columns("RIAGENDRx", "DMDEDUC2x", "DMDMARTLx")
 '''
 Bivariate data arise when every "unit of analysis" (e.g. a person in the NHANES dataset) is assessed with respect to two traits 
 (the NHANES subjects were assessed for many more than two traits, but we can consider two traits at a time here).
@@ -18,7 +30,7 @@ In a scatterplot with more than around 100 points, "overplotting" becomes an iss
 of each other in the plot, which obscures relationships in the middle of the distribution and over-emphasizes the extremes. 
 One way to mitigate overplotting is to use an "alpha" channel to make the points semi-transparent, as we have done below.
 '''
-sns.regplot(x="BMXLEG", y="BMXARML", data=da, fit_reg=False, scatter_kws={"alpha": 0.2})
+regplot(x="BMXLEG", y="BMXARML", data=da, fit_reg=False, scatter_kws={"alpha": 0.2})
 # plt.show()
 
 '''
@@ -30,7 +42,7 @@ This plot also shows the Pearson correlation coefficient between the arm length
 the course, the Pearson correlation coefficient ranges from -1 to 1, with values approaching 1 indicating a more perfect positive 
 dependence. In many settings, a correlation of 0.62 would be considered a moderately strong positive dependence.
 '''
-sns.jointplot(x="BMXLEG", y="BMXARML", kind='kde', data=da)
+jointplot(x="BMXLEG", y="BMXARML", kind='kde', data=da)
 # plt.show()
 
 '''
@@ -39,14 +51,14 @@ As another example with slightly different behavior, we see that systolic and di
   correlation coefficient of 0.32. This weaker correlation indicates that some people have unusually high systolic blood pressure
    but have average diastolic blood pressure, and vice versa.
 '''
-sns.jointplot(x="BPXSY1", y="BPXDI1", kind='kde', data=da)
+jointplot(x="BPXSY1", y="BPXDI1", kind='kde', data=da)
 # plt.show()
 
 '''
 Next we look at two repeated measures of systolic blood pressure, taken a few minutes apart on the same person. These values are 
 very highly correlated, with a correlation coefficient of around 0.96.
 '''
-jp = sns.jointplot(x="BPXSY1", y="BPXSY2", kind='kde', data=da)
+jp = jointplot(x="BPXSY1", y="BPXSY2", kind='kde', data=da)
 # plt.show()
 
 '''
@@ -60,8 +72,7 @@ ethnicity. The gender-stratified plot indicates that men tend to have somewhat l
 in the fact that the cloud of points on the left is shifted slightly up and to the right relative to the cloud of points on the right.
  In addition, the correlation between arm length and leg length appears to be somewhat weaker in women than in men.
 '''
-da["RIAGENDRx"] = da.RIAGENDR.replace({1: "Male", 2: "Female"})
-sns.FacetGrid(da, col="RIAGENDRx").map(plt.scatter, "BMXLEG", "BMXARML", alpha=0.4).add_legend()
+facetplot(da, "BMXLEG", "BMXARML", col="RIAGENDRx")
 # plt.show()
 
 '''
@@ -77,8 +88,11 @@ with itself. The correlation matrix is also symmetric around this diagonal, sinc
 In the results below, we see that the correlation between leg length and arm length in men is 0.50, while in women the 
 correlation is 0.43.
 '''
-print(da.loc[da.RIAGENDRx=="Female", ["BMXLEG", "BMXARML"]].dropna().corr())
-print(da.loc[da.RIAGENDRx=="Male", ["BMXLEG", "BMXARML"]].dropna().corr())
+# The correlations of all numeric columns within each gender are computed once and cached with the data set;
+# each matrix below is then just a lookup
+store = correlation_store(by="RIAGENDR")
+print(store.corr(["BMXLEG", "BMXARML"], stratum="Female"))
+print(store.corr(["BMXLEG", "BMXARML"], stratum="Male"))
 
 '''
 Next we look to stratifying the data by both gender and ethnicity.  This results in 2 x 5 = 10 total strata, since there are 
@@ -92,9 +106,14 @@ not treated as a separate group (due to small sample size), the correlation betw
 especially for men.  This is not surprising, as greater heterogeneity can allow correlations to emerge that are indiscernible 
 in more homogeneous data. 
 '''
-_ = sns.FacetGrid(da, col="RIDRETH1",  row="RIAGENDRx").map(plt.scatter, "BMXLEG", "BMXARML", alpha=0.5).add_legend()
+_ = facetplot(da, "BMXLEG", "BMXARML", col="RIDRETH1", row="RIAGENDRx")
 # plt.show()
 
+# The correlation within each of the 10 strata, from a statistics cube built in one pass over the data
+# (rather than filtering the whole data set once per stratum)
+cube = build_cube(da, ["BMXLEG", "BMXARML"])
+print(cube.corr("BMXLEG", "BMXARML", keep=["RIAGENDR", "RIDRETH1"]).unstack())
+
 '''
 Categorical bivariate data
 In this section we discuss some methods for working with bivariate data that are categorical. We can start with a contingency 
@@ -104,10 +123,7 @@ table, which counts the number of people having each combination of two factors.
 First, we create new versions of these two variables using text labels instead of numbers to represent the categories. We also
  create a new data set that omits people who responded "Don't know" or who refused to answer these questions.
 '''
-da["DMDEDUC2x"] = da.DMDEDUC2.replace({1: "<9", 2: "9-11", 3: "HS/GED", 4: "Some college/AA", 5: "College",
-                                       7: "Refused", 9: "Don't know"})
-da["DMDMARTLx"] = da.DMDMARTL.replace({1: "Married", 2: "Widowed", 3: "Divorced", 4: "Separated", 5: "Never married",
-                                      6: "Living w/partner", 77: "Refused"})
+# The loader already turns the codes into the labels of nhanes.codebook, the single mapping shared by all scripts
 db = da.loc[(da.DMDEDUC2x != "Don't know") & (da.DMDMARTLx != "Refused"), :]
 
 '''
@@ -117,7 +133,7 @@ and marital status.
 x = pd.crosstab(db.DMDEDUC2x, da.DMDMARTLx)
 print("\n", x)
 print("\n")
-db.groupby(["RIAGENDRx", "DMDEDUC2x", "DMDMARTLx"]).size().unstack().fillna(0).apply(lambda x: x/x.sum(), axis=1)
+proportions(db, ["RIAGENDRx", "DMDEDUC2x"], "DMDMARTLx")
 
 '''
 One factor behind the greater number of women who are divorced and widowed could be that women live longer than men. 
@@ -133,11 +149,10 @@ a number of possible explanations for this, for example, that remarriage after d
 graduates.
 '''
 print('\n')
-dx = db.loc[(db.RIDAGEYR >= 40) & (db.RIDAGEYR < 50)]
-a = dx.groupby(["RIAGENDRx", "DMDEDUC2x", "DMDMARTLx"]).size().unstack().fillna(0).apply(lambda x: x/x.sum(), axis=1)
-
-dx = db.loc[(db.RIDAGEYR >= 50) & (db.RIDAGEYR < 60)]
-b = dx.groupby(["RIAGENDRx", "DMDEDUC2x", "DMDMARTLx"]).size().unstack().fillna(0).apply(lambda x: x/x.sum(), axis=1)
+# Both age bands [40, 50) and [50, 60) are tabulated together in a single counting pass
+by_age = proportions(db, ["RIAGENDRx", "DMDEDUC2x"], "DMDMARTLx", bins={"RIDAGEYR": [40, 50, 60]})
+a = by_age.xs("[40, 50)", level="RIDAGEYR")
+b = by_age.xs("[50, 60)", level="RIDAGEYR")
 
 print(a.loc[:, ["Married"]].unstack())
 print("")
@@ -1,11 +1,18 @@
 
 # import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import sys
 import pandas as pd
 # import statsmodels.api as sm
-import numpy as np
 
-da = pd.read_csv("../nhanes_2015_2016.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.correlation import correlation_store
+from nhanes.derived import DerivedFrame
+from nhanes.loader import load
+from nhanes.plotting import regplot
+from nhanes.query import Query
+
+da = load()
 
 '''
 Question 1
@@ -13,16 +20,14 @@ Make a scatterplot showing the relationship between the first and second measure
 (BPXDI1 and BPXDI2). Also obtain the 4x4 matrix of correlation coefficients among the first two systolic and the first 
 two diastolic blood pressure measures.
 '''
-sns.regplot(x='BPXDI1', y='BPXDI2', data=da, fit_reg=False, scatter_kws={"alpha": 0.2})
-print(da.loc[:, ['BPXSY1', 'BPXSY2']].dropna().corr())
-print(da.loc[:, ['BPXSY1', 'BPXSY2', 'BPXDI1', 'BPXDI2']].dropna().corr())
+regplot(x='BPXDI1', y='BPXDI2', data=da, fit_reg=False, scatter_kws={"alpha": 0.2})
+print(correlation_store().corr(['BPXSY1', 'BPXSY2']))  # precomputed, same as .dropna().corr() for two columns
+print(Query().select('BPXSY1', 'BPXSY2', 'BPXDI1', 'BPXDI2').dropna().corr())  # one fused pass, no dropna copy
 
 '''
 Question 2
 Log transform the four blood pressure variables and repeat question 1.
 '''
-da['sys1log'] = np.log(da.BPXSY1.dropna())
-da['sys2log'] = np.log(da.BPXSY2.dropna())
-da['dis1log'] = np.log(da.BPXDI1.dropna())
-da['dis2log'] = np.log(da.BPXDI2.dropna())
-print(da.loc[:, ['sys1log', 'sys2log', 'dis1log', 'dis2log']].corr())
\ No newline at end of file
+# The log columns are defined once in nhanes.derived and computed on first access, NaN kept in place
+dv = DerivedFrame(da)
+print(dv.frame(['sys1log', 'sys2log', 'dis1log', 'dis2log']).corr())
\ No newline at end of file
@@ -1,9 +1,15 @@
+import os
+import sys
 import numpy as np
 import seaborn as sns
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.index import TableIndex
+from nhanes.loader import load
+
 # Download NHANES 2015-2016 data
-df = pd.read_csv("../nhanes_2015_2016.csv")
+df = load()
 
 # get columns names
 col_names = df.columns
@@ -23,20 +29,24 @@ df_BMX = df[keep]
 index_bool = np.isin(df.columns, keep)
 print(index_bool)
 
+# Index the columns once; every condition below is then answered from the index instead of scanning the column
+ix = TableIndex(df_BMX)
+
 # Lets only look at rows who 'BMXWAIST' is larger than the median
-waist_median = pd.Series.median(df_BMX['BMXWAIST']) # get the median of 'BMXWAIST'
+waist_median = ix['BMXWAIST'].median() # get the median of 'BMXWAIST' (read off the sorted index)
 
 # Lets add another condition, that 'BMXLEG' must be less than 32
-condition1 = df_BMX['BMXWAIST'] > waist_median
-condition2 = df_BMX['BMXLEG'] < 32
-df_BMX[condition1 & condition2].head() # Using [] method
+condition1 = ix['BMXWAIST'] > waist_median
+condition2 = ix['BMXLEG'] < 32
+rows = (condition1 & condition2).positions() # positions of the rows meeting both conditions
+df_BMX.iloc[rows].head() # Using [] method
 # Note: can't use 'and' instead of '&'
 
-df_BMX.loc[condition1 & condition2, ['BMXBMI','BMXARML']].head() # Using df.loc[] method
+df_BMX.loc[df_BMX.index[rows], ['BMXBMI','BMXARML']].head() # Using df.loc[] method
 # note that the conditiona are describing the rows to keep
 
 # Lets make a small dataframe and give it a new index so can more clearly see the differences between .loc and .iloc
-tmp = df_BMX.loc[condition1 & condition2, :].head()
+tmp = df_BMX.iloc[rows].head()
 tmp.index = ['a', 'b', 'c', 'd', 'e'] # If you use different years than 2015-2016, this my give an error. Why?
 tmp
 
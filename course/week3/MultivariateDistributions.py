@@ -1,8 +1,13 @@
 # import the packages we are going to be using
+import os
+import sys
 import numpy as np # for getting our distribution
 import matplotlib.pyplot as plt # for plotting
 import seaborn as sns; sns.set() # For a different plotting theme
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.mvnormal import equicorrelation, multivariate_normal
+
 # Don't worry so much about what rho is doing here
 # Just know if we have a rho of 1 then we will get a perfectly
 # upward sloping line, and if we have a rho of -1, we will get 
@@ -13,8 +18,11 @@ r = 1
 # Don't worry so much about the following three lines of code for now
 # this is just getting the data for us to plot
 mean = [15, 5]
-cov = [[1, r], [r, 1]]
-x, y = x, y = np.random.multivariate_normal(mean, cov, 400).T
+cov = equicorrelation(r)  # [[1, r], [r, 1]]; r = 1 is singular and handled exactly, all points on one line
+x, y = multivariate_normal(mean, cov, 400).T
+
+# The same call takes a whole grid of correlations and returns one (len(rhos), 400, 2) array, e.g.
+# draws = multivariate_normal(mean, equicorrelation(np.linspace(-1, 1, 201)), 400)
 
 # Adjust the figure size
 plt.figure(figsize=(20,9))
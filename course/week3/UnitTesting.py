@@ -1,11 +1,17 @@
+import os
+import sys
 import numpy as np
 import seaborn as sns
 import pandas as pd
 import matplotlib as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.loader import load
+
 pd.set_option('display.max_columns', 100) # Show all columns when looking at dataframe
 
 # Download NHANES 2015-2016 data
-df = pd.read_csv("../nhanes_2015_2016.csv")
+df = load()
 df.index = range(1,df.shape[0]+1)
 print(df.head())
 
@@ -1,20 +1,26 @@
 import warnings
 warnings.filterwarnings('ignore')
-import random
+import os
+import sys
 import numpy as np
 import seaborn as sns
 import pandas as pd
 import matplotlib.pyplot as plt
-from statsmodels.distributions.empirical_distribution import ECDF
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.sampler import draw
+from nhanes.simulate import StdlibCompat
+from nhanes.sketch import QuantileSketch
 
-random.seed(1738)
+
+# Same values as random.seed(1738) followed by random.normalvariate calls, generated as one array
+rng = StdlibCompat(1738)
 
 mu = 7
 
 sigma = 1.7
 
-Observations = [random.normalvariate(mu, sigma) for _ in range(100000)]
+Observations = rng.normalvariate(mu, sigma, 100000)
 
 sns.distplot(Observations)
 
@@ -24,11 +30,12 @@ plt.axvline(np.mean(Observations) - np.std(Observations), color = "g")
 plt.axvline(np.mean(Observations) + (np.std(Observations) * 2), color = "y")
 plt.axvline(np.mean(Observations) - (np.std(Observations) * 2), color = "y")
 
-pd.Series(Observations).describe()
+# Quantile sketch of the observations: the same summary as pd.Series(Observations).describe() without
+# keeping or sorting all of them; it also serves as the ECDF below
+ecdf = QuantileSketch().update(Observations)
+ecdf.describe()
 
-SampleA = random.sample(Observations, 100)
-SampleB = random.sample(Observations, 100)
-SampleC = random.sample(Observations, 100)
+SampleA, SampleB, SampleC = draw(Observations, 100, 3, rng=1738)
 
 fig, ax = plt.subplots()
 
@@ -38,8 +45,6 @@ sns.distplot(SampleC, ax = ax)
 
 ###
 
-ecdf = ECDF(Observations)
-
 plt.plot(ecdf.x, ecdf.y)
 
 plt.axhline(y = 0.025, color = 'y', linestyle='-')
@@ -1,11 +1,19 @@
 
 
+import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
 
-da = pd.read_csv("../nhanes_2015_2016.csv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.bootstrap import subsample
+from nhanes.loader import load
+from nhanes.montecarlo import run
+from nhanes.subsampling import correlation_difference, mean_difference, nanmean_rows
+
+da = load(["BPXSY1", "BPXDI1"])
 
 '''
 Sampling distributions
@@ -38,13 +46,12 @@ NHANES population tend to differ in terms of their mean systolic blood pressure.
 '''
 
 m = 100 # Subsample size
-sbp_diff = [] # Storage for our subsample mean differences
 
-for i in range(1000):
-    dx = da.sample(2*m)  # We need two subsamples of size m
-    dx1 = dx.iloc[0:m, :]  # First subsample
-    dx2 = dx.iloc[m:, :]  # Second subsample
-    sbp_diff.append(dx1.BPXSY1.mean() - dx2.BPXSY1.mean())  # The difference of mean BPXSY1 values
+# All 1000 pairs of subsamples are drawn at once as a (1000 x 2m) index matrix over the BPXSY1 column only;
+# the first m positions of each row form the first subsample and the remaining m the second one.
+# This is equivalent to repeating da.sample(2*m) and comparing dx.iloc[0:m].BPXSY1.mean() to dx.iloc[m:].BPXSY1.mean()
+sbp = da.BPXSY1.to_numpy()
+sbp_diff = mean_difference(sbp, m, replicates=1000)  # The differences of mean BPXSY1 values
 
 '''
 Next we look at the histogram of the 1000 mean differences generated above. We see that they typically fall between 
@@ -63,13 +70,7 @@ The sample size is a major determinant of the chance fluctuations in any statist
 below we perform the same analysis using samples of size 400.
 '''
 m = 400  # Change the sample size, everything else below is unchanged from the cells above
-sbp_diff = []
-
-for i in range(1000):
-    dx = da.sample(2 * m)
-    dx1 = dx.iloc[0:m, :]
-    dx2 = dx.iloc[m:, :]
-    sbp_diff.append(dx1.BPXSY1.mean() - dx2.BPXSY1.mean())
+sbp_diff = mean_difference(sbp, m, replicates=1000)
 
 sns.distplot(sbp_diff)
 pd.Series(sbp_diff).describe()
@@ -95,19 +96,19 @@ terms of their sampling behavior. Below we modify the subsampling analysis from
 correlation coefficient between systolic and diastolic blood pressure. Note that the standard deviation still drops by 
 approximately a factor of 2 when the sample size increases by a factor of four (from 100 to 400).
 
-This short Python program uses nested for loops. The outer loop manages the sample size, and the inner loop obtains 1000 
-subsamples at a given sample size, calculates correlation coefficients for two subsamples, and records their difference.
+This short Python program loops over the sample size. For each sample size it draws pairs of subsamples in batches, 
+calculates correlation coefficients for the two subsamples of each pair, and records their difference. It keeps drawing 
+batches until the standard deviation of the differences is known to within 3%, which takes several hundred pairs.
 '''
+dbp = da.BPXDI1.to_numpy()
 for m in 100, 400:  # m is the subsample size
-    sbp_diff = [] # calculate correlation coefficients from independent samples of size m
-    for i in range(1000):
-        dx = da.sample(2*m)
-        dx1 = dx.iloc[0:m, :]
-        dx2 = dx.iloc[m:, :]
-        r1 = np.corrcoef(dx1.loc[:, ["BPXSY1", "BPXDI1"]].dropna().T)
-        r2 = np.corrcoef(dx2.loc[:, ["BPXSY1", "BPXDI1"]].dropna().T)
-        sbp_diff.append(r1 - r2)
-    print("m=%d" % m, np.std(sbp_diff), np.sqrt(2 / m))
+    # calculate correlation coefficients from pairs of independent samples of size m, a batch at a time;
+    # incomplete (NaN) pairs are masked out within each subsample, like .dropna() on the two columns.
+    # Batches stop once the standard deviation is known to 3%, which takes about 0.5 / 0.03**2 pairs
+    res = run(lambda n, rng: correlation_difference(sbp, dbp, m, replicates=n, seed=rng),
+              target="sd", rtol=0.03)
+    sbp_diff = res.values
+    print("m=%d" % m, res.estimate, np.sqrt(2 / m), "(%d replicates)" % res.replicates)
 
 '''
 The simulation above shows that when the subsample size increases from 100 to 400 (a factor of 4), the standard 
@@ -132,16 +133,12 @@ sns.distplot(da.BPXSY1.dropna())
 Next we calculate 1000 sample means from 1000 subsamples of size 50 and inspect their distribution.
 '''
 m = 50
-sbp_mean = []
-for i in range(1000):
-    dx = da.sample(m)
-    sbp_mean.append(dx.BPXSY1.dropna().mean())
+sbp_mean = subsample(da, nanmean_rows, m, columns=["BPXSY1"], replicates=1000, vectorized=True).replicates
 sns.distplot(sbp_mean)
 
 # The lines below plot the density of a normal approximation to the data generated above
 x = np.linspace(np.min(sbp_mean), np.max(sbp_mean), 100)
 from scipy.stats.distributions import norm
-v = dx.BPXSY1.dropna()
 y = norm.pdf(x, np.mean(sbp_mean), np.std(sbp_mean))
 plt.plot(x, y, color='orange')
 '''
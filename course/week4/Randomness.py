@@ -1,23 +1,29 @@
-import random
+import os
+import sys
 import numpy as np
 
-random.seed(1234)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.sampler import draw, sample_means
+from nhanes.simulate import StdlibCompat
 
-print(random.random())
-print(random.uniform(25,50))
+# StdlibCompat draws exactly the numbers random.seed(1234) would give, but a whole array per call
+rng = StdlibCompat(1234)
+
+print(rng.random())
+print(rng.uniform(25,50))
 
 #Uniform
-unifNumbers = [random.uniform(0,1) for _ in range(1000)]
+unifNumbers = rng.uniform(0, 1, 1000)
 print(unifNumbers)
 
 #Normal
 mu = 0
 sigma = 1
-print(random.normalvariate(mu, sigma))
+print(rng.normalvariate(mu, sigma))
 
 mu = 0
 sigma = 1
-[random.normalvariate(mu, sigma) for _ in range(10000)]
+rng.normalvariate(mu, sigma, 10000)
 
 '''
 Random Sampling from a Population
@@ -32,15 +38,17 @@ on average)
 
 mu = 0
 sigma = 1
-Population = [random.normalvariate(mu, sigma) for _ in range(10000)]
+Population = rng.normalvariate(mu, sigma, 10000)
 
-SampleA = random.sample(Population, 500)
-SampleB = random.sample(Population, 500)
+# Two independent simple random samples of 500 units, drawn in one call
+srs = np.random.default_rng(1234)
+SampleA, SampleB = draw(Population, 500, 2, rng=srs)
 
 np.mean(SampleA)
 np.std(SampleA)
 np.mean(SampleB)
 np.std(SampleB)
 
-means = [np.mean(random.sample(Population, 1000)) for _ in range(100)]
+# The means of 100 samples of size 1000, drawn as one 100 x 1000 matrix and averaged row by row
+means = sample_means(Population, 1000, 100, rng=srs)
 np.mean(means)
\ No newline at end of file
@@ -1,8 +1,14 @@
 # Import the packages that we will be using for the tutorial
+import os
+import sys
 import numpy as np # for sampling for the distributions
 import matplotlib.pyplot as plt # for basic plotting
 import seaborn as sns; sns.set() # for plotting of the histograms
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from nhanes.mixture import Component, MixturePopulation
+from nhanes.montecarlo import run
+
 # Recreate the simulations from the video
 mean_uofm = 155
 sd_uofm = 5
@@ -11,12 +17,15 @@ sd_gym = 5
 gymperc = .3
 totalPopSize = 40000
 
-# Create the two subgroups
-uofm_students = np.random.normal(mean_uofm, sd_uofm, int(totalPopSize * (1 - gymperc)))
-students_at_gym = np.random.normal(mean_gym, sd_gym, int(totalPopSize * (gymperc)))
+# Describe the population as a mixture of the two subgroups; values are generated lazily, chunk by chunk,
+# so the same code works for populations far too large to hold in memory
+students = MixturePopulation([Component("UofM", 1 - gymperc, "normal", (mean_uofm, sd_uofm)),
+                              Component("Gym", gymperc, "normal", (mean_gym, sd_gym))], totalPopSize)
 
-# Create the population from the subgroups
-population = np.append(uofm_students, students_at_gym)
+# This population is small, so the two subgroups and the whole population can be materialized for plotting
+uofm_students = students.materialize("UofM")
+students_at_gym = students.materialize("Gym")
+population = students.materialize()
 
 # Set up the figure for plotting
 plt.figure(figsize=(10,12))
@@ -45,14 +54,15 @@ plt.show()
 ####
 
 # Simulation parameters
-numberSamps = 5000
+precision = 0.1  # Monte Carlo standard error wanted for the mean of the sampling distribution
 sampSize = 50
 
 # Get the sampling distribution of the mean from only the gym
-mean_distribution = np.empty(numberSamps)
-for i in range(numberSamps):
-    random_students = np.random.choice(population, sampSize)
-    mean_distribution[i] = np.mean(random_students)
+# Samples are drawn in batches (with replacement, like np.random.choice) and reduced to their means until the
+# mean of the distribution is known to `precision`; sigma / sqrt(n) sizes the first batch
+res = run(lambda n, rng: students.sample_means(sampSize, n, rng=rng), target="mean", tol=precision,
+          guess=np.std(population) / np.sqrt(sampSize))
+mean_distribution = res.values
 
 # Plot the population and the biased sampling distribution
 plt.figure(figsize=(10, 8))
@@ -77,14 +87,18 @@ plt.show()
 ###
 
 # Simulation parameters
-numberSamps = 5000
+precision = 0.1
 sampSize = 3
 
 # Get the sampling distribution of the mean from only the gym
-mean_distribution = np.empty(numberSamps)
-for i in range(numberSamps):
-    random_students = np.random.choice(students_at_gym, sampSize)
-    mean_distribution[i] = np.mean(random_students)
+# The sampling frame only contains the gym goers; sampling stops once the bias is known to `precision`
+res = run(lambda n, rng: students.sample_means(sampSize, n, frame=["Gym"], rng=rng), target="bias",
+          truth=students.mean(), tol=precision, guess=np.std(students_at_gym) / np.sqrt(sampSize))
+mean_distribution = res.values
+
+# Analytic bias of this frame (185 - 164 = 21) against the bias seen in the simulation
+print("bias %.2f +- %.2f from %d samples, analytic %.2f"
+      % (res.estimate, res.se, res.replicates, students.analytic_mean(["Gym"]) - students.analytic_mean()))
 
 # Plot the population and the biased sampling distribution
 plt.figure(figsize=(10, 8))